@@ -1,7 +1,13 @@
 from .api import BizAdvancedClient, BizBasicClient, Client
 from .api_async import AsyncClient, BizAdvancedAsyncClient, BizBasicAsyncClient
+from .archive import MessageArchive
+from .batch import RoomResult
+from .cache import ResponseCache
+from .circuit_breaker import CircuitBreaker
 from .exceptions import (
     BadRequestError,
+    CircuitOpenError,
+    DeadlineExceededError,
     EmoPlatformError,
     NoRoomError,
     NotFoundError,
@@ -10,8 +16,12 @@ from .exceptions import (
     UnauthorizedError,
     UnavailableError,
     UnknownError,
+    ValidationError,
     WebhookCallbackError,
     WebhookRequestError,
 )
 from .models import AccountInfo, BroadcastMsg, Color, Head, Tokens, WebHook
+from .motion import MotionRegistry, MotionTimeline
+from .ratelimit import RateLimiter
 from .response import parse_webhook_body
+from .retry import RetryPolicy
@@ -1,14 +1,38 @@
 import json
-import os
+import threading
+import time
 from collections import deque
-from contextlib import contextmanager
+from contextlib import nullcontext
 from dataclasses import asdict
 from functools import partial
-from typing import Callable, Dict, List, NoReturn, Optional, Tuple, Union
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    NoReturn,
+    Optional,
+    Tuple,
+    Type,
+    TypeVar,
+    Union,
+)
 
 import requests
-
+from requests.adapters import HTTPAdapter
+
+from emo_platform.auth import TokenManager
+from emo_platform.batch import RoomResult, _fan_out
+from emo_platform.cache import ResponseCache, _ValidatorCache
+from emo_platform.circuit_breaker import CircuitBreaker
+from emo_platform.coalesce import _Coalescer
+from emo_platform.download import _CHUNK_SIZE, _download_all, _MediaStore
 from emo_platform.exceptions import (
+    DeadlineExceededError,
+    EmoHttpError,
+    EmoPlatformError,
     NoRoomError,
     TokenError,
     UnauthorizedError,
@@ -17,7 +41,11 @@ from emo_platform.exceptions import (
     WebhookRequestError,
     _http_error_handler,
 )
+from emo_platform.image import _compress_image
 from emo_platform.models import AccountInfo, BroadcastMsg, Color, Head, Tokens, WebHook
+from emo_platform.motion import MotionRegistry
+from emo_platform.pagination import _iter_msgs, _tail_msgs
+from emo_platform.ratelimit import RateLimiter
 from emo_platform.response import (
     EmoAccountInfo,
     EmoBizAccountInfo,
@@ -36,104 +64,22 @@ from emo_platform.response import (
     EmoWebhookBody,
     EmoWebhookInfo,
     EmoPostConversation,
+    PrintModel,
 )
+from emo_platform.retry import RetryPolicy
+from emo_platform.transport import (
+    PostContentType,
+    _build_headers,
+    _cap_timeout,
+    _channel_user,
+    _channel_user_context,
+    _deadline_context,
+    _get_remaining_time,
+)
+from emo_platform.upload import _MediaData, _open_media
+from emo_platform.validation import _validate_motion, _validate_text
 
-EMO_PLATFORM_PATH = os.path.abspath(os.path.dirname(__file__))
-
-
-class PostContentType:
-    APPLICATION_JSON = "application/json"
-    MULTIPART_FORMDATA = None
-
-
-class TokenManager:
-    _TOKEN_FILE = f"{EMO_PLATFORM_PATH}/tokens/emo-platform-api.json"
-    _PREVIOUS_TOKEN_FILE = f"{EMO_PLATFORM_PATH}/tokens/emo-platform-api_previous.json"
-    _INITIAL_TOKENS = {"access_token": "", "refresh_token": ""}
-    _INITIAL_SET_TOKENS = {"os": _INITIAL_TOKENS, "args": _INITIAL_TOKENS}
-
-    def __init__(
-        self,
-        tokens: Optional[Tokens] = None,
-        token_file_path: Optional[str] = None,
-        use_cached_credentials=False,
-    ):
-        self._use_cached_credentials = use_cached_credentials
-        if not self._use_cached_credentials:
-            self._set_token_file_path(token_file_path)
-            self._previous_set_tokens_dict = self._load_previous_set_tokens_file()
-            self._current_set_tokens = self._get_current_set_tokens(tokens)
-            self._update_previous_set_tokens_file(tokens)
-            self.tokens = self._get_latest_tokens()
-            self.save_tokens()
-        else:
-            if tokens:
-                self.tokens = tokens
-            else:
-                raise TokenError(
-                    "Please give tokens as an argument using 'emo_platform.Tokens'"
-                )
-
-    def _set_token_file_path(self, token_file_path) -> None:
-        if token_file_path:
-            self._TOKEN_FILE = f"{token_file_path}/emo-platform-api.json"
-            self._PREVIOUS_TOKEN_FILE = (
-                f"{token_file_path}/emo-platform-api_previous.json"
-            )
-
-    def _get_current_set_tokens(self, tokens: Optional[Tokens]) -> Tokens:
-        if tokens:
-            return tokens
-        else:
-            return self._get_current_os_env_tokens()
-
-    def _get_current_os_env_tokens(self) -> Tokens:
-        access_token = self._get_currnet_os_env_access_token()
-        refresh_token = self._get_currnet_os_env_refresh_token()
-        return Tokens(**{"refresh_token": refresh_token, "access_token": access_token})  # type: ignore
-
-    def _get_currnet_os_env_access_token(self) -> str:
-        try:
-            return os.environ["EMO_PLATFORM_API_ACCESS_TOKEN"]
-        except KeyError:
-            return self._previous_set_tokens_dict["os"]["access_token"]
-
-    def _get_currnet_os_env_refresh_token(self) -> str:
-        try:
-            return os.environ["EMO_PLATFORM_API_REFRESH_TOKEN"]
-        except KeyError:
-            return self._previous_set_tokens_dict["os"]["refresh_token"]
-
-    def _load_previous_set_tokens_file(self) -> dict:
-        try:
-            with open(self._PREVIOUS_TOKEN_FILE) as f:
-                return json.load(f)
-        except FileNotFoundError:
-            return self._INITIAL_SET_TOKENS
-
-    def _update_previous_set_tokens_file(self, tokens) -> None:
-        how2set = "os" if tokens is None else "args"
-        self._previous_set_tokens = Tokens(**self._previous_set_tokens_dict[how2set])  # type: ignore
-        self._previous_set_tokens_dict[how2set] = asdict(self._current_set_tokens)
-
-        with open(self._PREVIOUS_TOKEN_FILE, "w") as f:
-            json.dump(self._previous_set_tokens_dict, f)
-
-    def _get_latest_tokens(self) -> Tokens:
-        # compare new set tokens with old ones
-        if self._current_set_tokens == self._previous_set_tokens:
-            try:
-                with open(self._TOKEN_FILE) as f:
-                    return Tokens(**json.load(f))  # type: ignore
-            except FileNotFoundError:
-                return self._current_set_tokens
-        else:  # reset json file when set tokens updated
-            return self._current_set_tokens
-
-    def save_tokens(self) -> None:
-        if not self._use_cached_credentials:
-            with open(self._TOKEN_FILE, "w") as f:
-                json.dump(asdict(self.tokens), f)
+_Model = TypeVar("_Model", bound=PrintModel)
 
 
 class Client:
@@ -168,6 +114,66 @@ class Client:
 
         この引数をTrueにするのは、サーバーサイドのwebアプリにこのライブラリを使用する際などを想定しています。
 
+    access_token_ttl : Optional[float], default None
+        access tokenの有効期間(秒)。
+
+        access tokenがJWTの場合はexp claimから有効期限を取得するため、指定する必要はありません。
+        JWTでないaccess tokenを使用する場合に、有効期限の計算に使用されます。
+
+    token_refresh_margin : float, default 60
+        access tokenの有効期限の何秒前に、access tokenを更新するか。
+
+        有効期限が分かる場合は、期限が切れる前のAPI呼び出し時に自動でaccess tokenが更新されます。
+
+    pool_connections : int, default 10
+        コネクションプールを保持するホストの数。
+
+    pool_maxsize : int, default 10
+        1つのホストに対して保持するコネクションの最大数。
+
+        複数のスレッドから同時にAPIを呼び出す場合は、スレッド数以上の値を指定してください。
+
+    keep_alive : bool, default True
+        Falseにした場合、リクエスト毎にコネクションを閉じます。
+
+    rate_limiter : Optional[RateLimiter], default None
+        API呼び出し頻度の制限に使用する :class:`~emo_platform.ratelimit.RateLimiter` 。
+
+        指定した場合、1分あたりのAPI呼び出し回数が上限を超えないように、送信前に待機します。
+
+    retry_policy : Optional[RetryPolicy], default None
+        一時的なエラーでAPI呼び出しが失敗した場合の再試行の設定。
+
+        指定しない場合は、 :class:`~emo_platform.retry.RetryPolicy` の初期値で再試行します。
+        再試行しない場合は、RetryPolicy(max_attempts=1)を指定してください。
+
+    connect_timeout : Optional[float], default 10
+        サーバーとの接続を確立するまでの待機時間の上限(秒)。Noneの場合は無期限に待機します。
+
+    read_timeout : Optional[float], default 30
+        サーバーからのレスポンスを待機する時間の上限(秒)。Noneの場合は無期限に待機します。
+
+    circuit_breaker : Optional[CircuitBreaker], default None
+        サーバー障害時にAPI呼び出しを遮断する :class:`~emo_platform.circuit_breaker.CircuitBreaker` 。
+
+        指定した場合、サーバーエラーや通信エラーが続くと、API呼び出しを行わずにCircuitOpenErrorを出します。
+
+    response_cache : Optional[ResponseCache], default None
+        読み取り専用のAPIのレスポンスを保存する :class:`~emo_platform.cache.ResponseCache` 。
+
+        指定した場合、保存されている間は同じAPIを呼び出してもAPI呼び出しを行いません。
+
+    validate : bool, default True
+        Trueの場合、ファイルやメッセージの送信前に、APIの制限を満たしているかをローカルで確認します。
+
+        制限を満たしていない場合は、API呼び出しを行わずにValidationErrorを出します。
+        送信するデータが正しいことが分かっている場合は、Falseにすると確認を省略できます。
+
+    motion_registry : Optional[MotionRegistry], default None
+        モーションファイルの読み込み結果を保存する :class:`~emo_platform.motion.MotionRegistry` 。
+
+        指定した場合、send_original_motionで同じファイルを送信する際に、2回目以降はファイルを読み込まずに送信します。
+
     Raises
     ----------
     TokenError
@@ -180,6 +186,26 @@ class Client:
         emo-platform-api.jsonに保存されているrefresh tokenを使用して自動的にaccess tokenが更新されます。
         その際にAPI呼び出しが1回行われます。
 
+    一時的なエラーでAPI呼び出しが失敗した場合
+        引数retry_policyの設定に従って再試行されます。
+        その際に再試行した回数だけ、API呼び出しが追加で行われます。
+
+    API呼び出し全体の期限について
+        :func:`deadline` を使用すると、access tokenの更新や再試行も含めた、API呼び出し全体の期限を設定できます。
+
+    一覧を取得するAPIの条件付きリクエストについて
+        部屋・スタンプ・モーション・一斉配信メッセージの一覧の取得時に、サーバーがETagあるいはLast-Modifiedを返した場合は、
+        次回の取得時にそれらを使用した条件付きリクエストを行います。
+        一覧が更新されていなければ、前回取得した結果をそのまま返します。
+
+    コネクションの再利用について
+        clientは内部で1つのセッションを保持し、API呼び出し間でコネクションを再利用します。
+
+        使用後は :func:`close` を呼び出すか、with文を使用してセッションを閉じてください::
+
+            with emo_platform.Client() as client:
+                print(client.get_account_info())
+
     Business版をお使いの方へ
         このクラスは使用せずに、継承先である :class:`BizBasicClient` あるいは :class:`BizAdvancedClient` をお使いください。
 
@@ -196,26 +222,112 @@ class Client:
         tokens: Optional[Tokens] = None,
         token_file_path: Optional[str] = None,
         use_cached_credentials: bool = False,
+        access_token_ttl: Optional[float] = None,
+        token_refresh_margin: float = 60,
+        pool_connections: int = 10,
+        pool_maxsize: int = 10,
+        keep_alive: bool = True,
+        rate_limiter: Optional[RateLimiter] = None,
+        retry_policy: Optional[RetryPolicy] = None,
+        connect_timeout: Optional[float] = 10,
+        read_timeout: Optional[float] = 30,
+        circuit_breaker: Optional[CircuitBreaker] = None,
+        response_cache: Optional[ResponseCache] = None,
+        validate: bool = True,
+        motion_registry: Optional[MotionRegistry] = None,
     ):
         self._tm = TokenManager(
             tokens=tokens,
             token_file_path=token_file_path,
             use_cached_credentials=use_cached_credentials,
+            access_token_ttl=access_token_ttl,
         )
+        self._token_refresh_margin = token_refresh_margin
         self._endpoint_url = endpoint_url if endpoint_url else self._BASE_URL
-        self._headers: Dict[str, Optional[str]] = {
-            "accept": "*/*",
-            "Content-Type": PostContentType.APPLICATION_JSON,
-            "Authorization": "Bearer " + self._tm.tokens.access_token,
-        }
         self._webhook_events_cb: Dict[str, Dict[str, Callable]] = {}
         self._request_id_deque: deque = deque([], self._MAX_SAVED_REQUEST_ID)
+        self._session = self._create_session(pool_connections, pool_maxsize, keep_alive)
+        self._rate_limiter = rate_limiter
+        self._retry_policy = retry_policy if retry_policy else RetryPolicy()
+        self._connect_timeout = connect_timeout
+        self._read_timeout = read_timeout
+        self._circuit_breaker = circuit_breaker
+        self._response_cache = response_cache
+        self._validate = validate
+        self._motion_registry = motion_registry
+        self._validator_cache = _ValidatorCache()
+        self._coalescer = _Coalescer()
+        self._token_lock = threading.Lock()
+        self._refresh_count = 0
+        self._refresh_error: Optional[EmoPlatformError] = None
+
+    def _create_session(
+        self, pool_connections: int, pool_maxsize: int, keep_alive: bool
+    ) -> requests.Session:
+        session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=pool_connections, pool_maxsize=pool_maxsize
+        )
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        if not keep_alive:
+            session.headers["Connection"] = "close"
+        return session
+
+    def close(self) -> None:
+        """セッションの終了
+
+            clientが保持しているコネクションを全て閉じます。
+
+        Note
+        ----
+        API呼び出し回数
+            0回
+
+        """
+
+        self._session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    def deadline(self, seconds: float):
+        """API呼び出しの期限の設定
+
+            with文の中で行うAPI呼び出しを、指定した時間内に終わらせます。
+            access tokenの更新や再試行、呼び出し頻度の制限による待機も含めて、期限を過ぎるとDeadlineExceededErrorが出ます::
+
+                with client.deadline(5):
+                    room_client.send_msg("こんにちは")
+
+            with文を入れ子にした場合は、より早い方の期限が使用されます。
+
+        Parameters
+        ----------
+        seconds : float
+            API呼び出しの期限(秒)。
+
+        Note
+        ----
+        API呼び出し回数
+            0回
+
+        """
+
+        return _deadline_context(seconds)
+
+    def _track_circuit(self):
+        if self._circuit_breaker is None:
+            return nullcontext(lambda status: None)
+        return self._circuit_breaker._track(
+            (requests.ConnectionError, requests.Timeout)
+        )
 
-    @contextmanager
     def _add_apikey2header(self, api_key: str):
-        self._headers["X-Channel-User"] = api_key
-        yield
-        self._headers.pop("X-Channel-User")
+        return _channel_user_context(api_key)
 
     def _update_tokens(self) -> None:
         """トークンの更新と保存
@@ -246,40 +358,202 @@ class Client:
                 "Please set refresh_token as environment variable 'EMO_PLATFORM_API_REFRESH_TOKEN' or give args to client using emo_platform.Tokens"
             ) from e
         else:
-            self._tm.tokens.access_token = res_tokens.access_token
-            self._tm.tokens.refresh_token = res_tokens.refresh_token
-            self._headers["Authorization"] = "Bearer " + self._tm.tokens.access_token
+            self._tm.set_tokens(res_tokens.access_token, res_tokens.refresh_token)
             self._tm.save_tokens()
             return
 
-    def _check_http_error(self, request: Callable, _update_tokens: bool = True) -> dict:
-        response = request()
-        try:
-            with _http_error_handler():
-                response.raise_for_status()
-        except UnauthorizedError:
-            if not _update_tokens:
+    def _refresh_tokens(self, stale_access_token: str) -> None:
+        # Only one thread refreshes the tokens at a time.
+        # The other threads waiting for the lock reuse its result.
+        refresh_count = self._refresh_count
+        with self._token_lock:
+            if self._tm.tokens.access_token != stale_access_token:
+                return
+            if self._refresh_count != refresh_count:
+                if self._refresh_error is not None:
+                    raise self._refresh_error
+                return
+            self._refresh_count += 1
+            try:
+                self._update_tokens()
+            except EmoPlatformError as e:
+                self._refresh_error = e
                 raise
-        else:
-            if len(response.content) == 0:
-                return {}
+            else:
+                self._refresh_error = None
 
-            return response.json()
+    def _renew_expiring_tokens(self) -> None:
+        if self._tm.is_expiring(self._token_refresh_margin):
+            try:
+                self._refresh_tokens(self._tm.tokens.access_token)
+            except EmoPlatformError:
+                # The current access token may still be valid, so the request is sent anyway.
+                pass
 
-        self._update_tokens()
-        response = request()
-        with _http_error_handler():
-            response.raise_for_status()
-        return response.json()
+    def _check_http_error(
+        self,
+        request: Callable,
+        _update_tokens: bool = True,
+        _idempotent: bool = True,
+    ) -> dict:
+        if _update_tokens:
+            self._renew_expiring_tokens()
+        tokens_refreshed = False
+        attempt = 1
+        while True:
+            access_token = self._tm.tokens.access_token
+            try:
+                response = request()
+            except (requests.ConnectionError, requests.Timeout):
+                # raises DeadlineExceededError if the deadline has caused the timeout
+                _get_remaining_time()
+                delay = self._retry_policy.get_delay(attempt, idempotent=_idempotent)
+                if delay is None:
+                    raise
+            else:
+                try:
+                    with _http_error_handler():
+                        response.raise_for_status()
+                except UnauthorizedError:
+                    if not _update_tokens or tokens_refreshed:
+                        raise
+                    self._refresh_tokens(access_token)
+                    tokens_refreshed = True
+                    continue
+                except EmoHttpError as e:
+                    delay = self._retry_policy.get_delay(
+                        attempt,
+                        status=e.status,
+                        idempotent=_idempotent,
+                        retry_after=response.headers.get("Retry-After"),
+                    )
+                    if delay is None:
+                        raise
+                else:
+                    if len(response.content) == 0:
+                        return {}
+
+                    return response.json()
+            self._wait_before_retry(delay)
+            attempt += 1
+
+    def _wait_before_retry(self, delay: float) -> None:
+        remaining = _get_remaining_time()
+        if remaining is not None and delay >= remaining:
+            raise DeadlineExceededError(
+                "The deadline for the API call will pass before the retry."
+            )
+        time.sleep(delay)
 
-    def _get(self, path: str, params: dict = {}) -> dict:
-        request = partial(
-            requests.get,
-            self._endpoint_url + path,
-            params=params,
-            headers=self._headers,
+    def _request(
+        self,
+        method: str,
+        path: str,
+        params: Optional[dict] = None,
+        data: str = "",
+        files: Optional[dict] = None,
+        content_type: Optional[str] = PostContentType.APPLICATION_JSON,
+        accept: Optional[str] = "*/*",
+        extra_headers: Optional[Dict[str, str]] = None,
+    ) -> requests.Response:
+        # The open circuit rejects the call before it waits for the rate limiter.
+        with self._track_circuit() as record_status:
+            if self._rate_limiter is not None:
+                if not self._rate_limiter.acquire(
+                    _channel_user.get(), _get_remaining_time()
+                ):
+                    raise DeadlineExceededError(
+                        "The deadline for the API call will pass before the rate limit allows it."
+                    )
+            if files is not None:
+                # rewind the files, so that the replayed request sends the whole data
+                for file in files.values():
+                    if isinstance(file, tuple):
+                        file = file[1]
+                    if hasattr(file, "seek"):
+                        file.seek(0)
+            # headers are built on every call, so that the replayed request uses the refreshed token
+            headers = _build_headers(self._tm.tokens.access_token, content_type, accept)
+            if extra_headers is not None:
+                headers.update(extra_headers)
+            remaining = _get_remaining_time()
+            timeout = (
+                _cap_timeout(self._connect_timeout, remaining),
+                _cap_timeout(self._read_timeout, remaining),
+            )
+            response = self._session.request(
+                method,
+                self._endpoint_url + path,
+                params=params,
+                data=data,
+                files=files,
+                headers=headers,
+                timeout=timeout,
+            )
+            record_status(response.status_code)
+        return response
+
+    def _get(
+        self, path: str, params: dict = {}, _cache_group: Optional[str] = None
+    ) -> dict:
+        api_key = _channel_user.get()
+        cache = self._response_cache if _cache_group is not None else None
+        if cache is not None:
+            cached = cache._lookup(_cache_group, api_key, path, params)
+            if cached is not None:
+                return cached
+        request = partial(self._request, "GET", path, params=params)
+        # identical GETs in flight share one API call
+        key = ("GET", api_key, path, tuple(sorted(params.items())))
+        response = self._coalescer.run(key, partial(self._check_http_error, request))
+        if cache is not None:
+            cache._store(_cache_group, api_key, path, params, response)
+        return response
+
+    def _get_model(
+        self, path: str, model: Type[_Model], _cache_group: Optional[str] = None
+    ) -> _Model:
+        api_key = _channel_user.get()
+        cache = self._response_cache if _cache_group is not None else None
+        if cache is not None:
+            cached = cache._lookup(_cache_group, api_key, path, None)
+            if cached is not None:
+                return model(**cached)
+        # identical GETs in flight share one API call and one parsed model
+        key = ("GET_MODEL", api_key, path)
+        body, parsed = self._coalescer.run(
+            key, partial(self._fetch_model, api_key, path, model)
         )
-        return self._check_http_error(request)
+        if cache is not None:
+            cache._store(_cache_group, api_key, path, None, body)
+        return parsed
+
+    def _fetch_model(
+        self, api_key: Optional[str], path: str, model: Type[_Model]
+    ) -> Tuple[dict, _Model]:
+        # Sends a conditional GET with the validators of the previous response,
+        # and reuses its parsed model if the server answers 304 Not Modified.
+        validated = self._validator_cache.get(api_key, path)
+        responses: List[requests.Response] = []
+
+        def request() -> requests.Response:
+            response = self._request(
+                "GET", path, extra_headers=validated.headers() if validated else None
+            )
+            responses.append(response)
+            return response
+
+        body = self._check_http_error(request)
+        response = responses[-1]
+        if response.status_code == 304 and validated is not None:
+            return validated.body, validated.model
+        parsed = model(**body)
+        self._validator_cache.store(api_key, path, response.headers, body, parsed)
+        return body, parsed
+
+    def _invalidate_cache(self, group: Optional[str] = None) -> None:
+        if self._response_cache is not None:
+            self._response_cache.invalidate(group, _channel_user.get())
 
     def _post(
         self,
@@ -289,15 +563,17 @@ class Client:
         content_type: Optional[str] = PostContentType.APPLICATION_JSON,
         _update_tokens: bool = True,
     ) -> dict:
-        self._headers["Content-Type"] = content_type
         request = partial(
-            requests.post,
-            self._endpoint_url + path,
+            self._request,
+            "POST",
+            path,
             data=data,
             files=files,
-            headers=self._headers,
+            content_type=content_type,
+        )
+        return self._check_http_error(
+            request, _update_tokens=_update_tokens, _idempotent=False
         )
-        return self._check_http_error(request, _update_tokens=_update_tokens)
 
     def _put(
         self,
@@ -307,22 +583,19 @@ class Client:
         content_type: Optional[str] = PostContentType.APPLICATION_JSON,
         accept: Optional[str] = "*/*",
     ) -> dict:
-        self._headers["Content-Type"] = content_type
-        self._headers["accept"] = accept
-
         request = partial(
-            requests.put,
-            self._endpoint_url + path,
+            self._request,
+            "PUT",
+            path,
             data=data,
             files=files,
-            headers=self._headers,
+            content_type=content_type,
+            accept=accept,
         )
         return self._check_http_error(request)
 
     def _delete(self, path: str) -> dict:
-        request = partial(
-            requests.delete, self._endpoint_url + path, headers=self._headers
-        )
+        request = partial(self._request, "DELETE", path)
         return self._check_http_error(request)
 
     def get_access_token(self, refresh_token: str) -> EmoTokens:
@@ -365,7 +638,7 @@ class Client:
         return EmoTokens(**response)
 
     def _get_account_info(self) -> dict:
-        return self._get("/v1/me")
+        return self._get("/v1/me", _cache_group="me")
 
     def get_account_info(
         self,
@@ -421,6 +694,7 @@ class Client:
         """
 
         response = self._delete("/v1/me")
+        self._invalidate_cache()
         return EmoAccountInfo(**response)
 
     def get_rooms_list(self) -> EmoRoomInfo:
@@ -445,8 +719,7 @@ class Client:
 
         """
 
-        response = self._get("/v1/rooms")
-        return EmoRoomInfo(**response)
+        return self._get_model("/v1/rooms", EmoRoomInfo, _cache_group="rooms")
 
     def get_rooms_id(self) -> List[str]:
         """ユーザーが参加している全ての部屋のidの取得
@@ -509,6 +782,131 @@ class Client:
 
         return Room(self, room_id)
 
+    def send_to_rooms(
+        self,
+        room_ids: Iterable[str],
+        action: Callable[["Room"], Any],
+        max_workers: int = 10,
+        ordered: bool = False,
+    ) -> Iterator[RoomResult]:
+        """複数の部屋に対する処理の並列実行
+
+            部屋毎に作成した :class:`Room` を引数として、スレッドプール上でactionを並列に呼び出します。
+            各スレッドは、clientが保持しているセッションを共有します。
+
+            例えば、全ての部屋のセンサの一覧を取得する場合は以下のようにします::
+
+                room_ids = client.get_rooms_id()
+                for room_result in client.send_to_rooms(
+                    room_ids, lambda room: room.get_sensors_list()
+                ):
+                    print(room_result.room_id, room_result.result)
+
+        Parameters
+        ----------
+        room_ids : Iterable[str]
+            処理を行う部屋のidのリスト。
+
+        action : Callable[[Room], Any]
+            部屋のclientを受け取り、その部屋に対する処理を行う関数。
+
+        max_workers : int, default 10
+            同時に処理を実行するスレッドの最大数。
+
+            clientの引数pool_maxsizeよりも大きい値を指定した場合、コネクションの再利用が行われない場合があります。
+
+        ordered : bool, default False
+            Trueにした場合、room_idsの順番で結果を返します。
+            Falseの場合は、処理が終わった部屋から順に結果を返します。
+
+        Yields
+        -------
+        room_result : RoomResult
+            部屋毎の処理結果。処理が失敗した場合も例外は出さず、RoomResult.exceptionに格納されます。
+
+        Raises
+        ----------
+        ValueError
+            max_workersが1未満の場合。
+
+        Note
+        ----
+        API呼び出し回数
+            actionが行うAPI呼び出し回数 × 部屋数
+
+            引数rate_limiterを指定したclientの場合は、その呼び出し頻度の制限に従います。
+
+        """
+
+        rooms = [self.create_room_client(room_id) for room_id in room_ids]
+        return _fan_out(rooms, action, max_workers, ordered)
+
+    def download_media(
+        self, urls: Iterable[str], directory: str, max_workers: int = 4
+    ) -> Dict[str, str]:
+        """音声・画像ファイルのダウンロード
+
+            EmoMessageInfoのaudio_urlやimage_urlのファイルをスレッドプール上で並列にダウンロードし、directoryに保存します。
+            ダウンロードには、clientが保持しているセッションを使用します::
+
+                msgs = room_client.get_msgs()
+                urls = [msg.audio_url for msg in msgs.messages if msg.media == "audio"]
+                paths = client.download_media(urls, "media")
+
+            ファイルは一定のサイズ毎に分割して受信しながら保存するため、大きなファイルでもメモリ使用量は増えません。
+
+            ファイル名はファイルの内容のハッシュ値(SHA-256)になり、同じ内容のファイルは1つだけ保存されます。
+            以前に同じURLからダウンロードしたファイルが保存されている場合は、ダウンロードを行いません。
+
+        Parameters
+        ----------
+        urls : Iterable[str]
+            ダウンロードするファイルのURLのリスト。重複したURLは1回のみダウンロードします。
+
+        directory : str
+            ファイルを保存するディレクトリ。存在しない場合は作成されます。
+
+        max_workers : int, default 4
+            同時にダウンロードを行うスレッドの最大数。
+
+        Returns
+        -------
+        paths : Dict[str, str]
+            URLと、保存したファイルのパスの対応。
+
+        Raises
+        ----------
+        EmoPlatformError
+            ダウンロードが失敗した場合。その場合、まだ開始していない他のダウンロードは行われません。
+
+        ValueError
+            max_workersが1未満の場合。
+
+        Note
+        ----
+        API呼び出し回数
+            0回(ダウンロードしたファイルのURLへのリクエストのみ)
+
+        """
+
+        store = _MediaStore(directory)
+        return _download_all(urls, partial(self._download_media, store), max_workers)
+
+    def _download_media(self, store: _MediaStore, url: str) -> str:
+        path = store.lookup(url)
+        if path is not None:
+            return path
+        remaining = _get_remaining_time()
+        timeout = (
+            _cap_timeout(self._connect_timeout, remaining),
+            _cap_timeout(self._read_timeout, remaining),
+        )
+        # The media is not served by the api, so the access token is not sent.
+        with self._session.get(url, stream=True, timeout=timeout) as response:
+            with _http_error_handler():
+                response.raise_for_status()
+            return store.save(url, response.iter_content(_CHUNK_SIZE))
+
     def get_stamps_list(
         self,
     ) -> EmoStampsInfo:
@@ -533,8 +931,7 @@ class Client:
 
         """
 
-        response = self._get("/v1/stamps")
-        return EmoStampsInfo(**response)
+        return self._get_model("/v1/stamps", EmoStampsInfo, _cache_group="stamps")
 
     def get_motions_list(
         self,
@@ -560,8 +957,7 @@ class Client:
 
         """
 
-        response = self._get("/v1/motions")
-        return EmoMotionsInfo(**response)
+        return self._get_model("/v1/motions", EmoMotionsInfo, _cache_group="motions")
 
     def get_webhook_setting(
         self,
@@ -588,7 +984,7 @@ class Client:
 
         """
 
-        response = self._get("/v1/webhook")
+        response = self._get("/v1/webhook", _cache_group="webhook")
         return EmoWebhookInfo(**response)
 
     def change_webhook_setting(self, webhook: WebHook) -> EmoWebhookInfo:
@@ -622,6 +1018,7 @@ class Client:
 
         payload = {"description": webhook.description, "url": webhook.url}
         response = self._put("/v1/webhook", json.dumps(payload))
+        self._invalidate_cache("webhook")
         return EmoWebhookInfo(**response)
 
     def register_webhook_event(self, events: List[str]) -> EmoWebhookInfo:
@@ -659,6 +1056,7 @@ class Client:
 
         payload = {"events": events}
         response = self._put("/v1/webhook/events", json.dumps(payload))
+        self._invalidate_cache("webhook")
         return EmoWebhookInfo(**response)
 
     def create_webhook_setting(self, webhook: WebHook) -> EmoWebhookInfo:
@@ -691,6 +1089,7 @@ class Client:
 
         payload = {"description": webhook.description, "url": webhook.url}
         response = self._post("/v1/webhook", json.dumps(payload))
+        self._invalidate_cache("webhook")
         return EmoWebhookInfo(**response)
 
     def delete_webhook_setting(
@@ -720,6 +1119,7 @@ class Client:
         """
 
         response = self._delete("/v1/webhook")
+        self._invalidate_cache("webhook")
         return EmoWebhookInfo(**response)
 
     def event(
@@ -996,6 +1396,7 @@ class BizClient(Client):
 
         payload = asdict(acount)
         response = self._put("/v1/me", json.dumps(payload))
+        self._invalidate_cache("me")
         return EmoBizAccountInfo(**response)
 
     def get_rooms_list(self, api_key: str) -> EmoRoomInfo:  # type: ignore[override]
@@ -1122,8 +1523,7 @@ class BizClient(Client):
 
         """
 
-        response = self._get("/v1/broadcast_messages")
-        return EmoBroadcastInfoList(**response)
+        return self._get_model("/v1/broadcast_messages", EmoBroadcastInfoList)
 
     def get_broadcast_msg_details(self, message_id: int) -> EmoBroadcastInfo:
         """配信メッセージの詳細の取得
@@ -1199,6 +1599,65 @@ class BizClient(Client):
             response = self._post("/v1/broadcast_messages", json.dumps(payload))
         return EmoBroadcastMessage(**response)
 
+    def send_to_rooms(  # type: ignore[override]
+        self,
+        api_key: str,
+        room_ids: Iterable[str],
+        action: Callable[[Any], Any],
+        max_workers: int = 10,
+        ordered: bool = False,
+    ) -> Iterator[RoomResult]:
+        """複数の部屋に対する処理の並列実行
+
+            部屋毎に作成した部屋のclientを引数として、スレッドプール上でactionを並列に呼び出します。
+            各スレッドは、clientが保持しているセッションを共有します。
+
+        Parameters
+        ----------
+        api_key : str
+            法人向けAPIキー
+
+        room_ids : Iterable[str]
+            処理を行う部屋のidのリスト。
+
+        action : Callable[[Any], Any]
+            部屋のclientを受け取り、その部屋に対する処理を行う関数。
+
+        max_workers : int, default 10
+            同時に処理を実行するスレッドの最大数。
+
+            clientの引数pool_maxsizeよりも大きい値を指定した場合、コネクションの再利用が行われない場合があります。
+
+        ordered : bool, default False
+            Trueにした場合、room_idsの順番で結果を返します。
+            Falseの場合は、処理が終わった部屋から順に結果を返します。
+
+        Yields
+        -------
+        room_result : RoomResult
+            部屋毎の処理結果。処理が失敗した場合も例外は出さず、RoomResult.exceptionに格納されます。
+
+        Raises
+        ----------
+        ValueError
+            max_workersが1未満の場合。
+
+        Note
+        ----
+        API呼び出し回数
+            actionが行うAPI呼び出し回数 × 部屋数
+
+            引数rate_limiterを指定したclientの場合は、その呼び出し頻度の制限に従います。
+
+        """
+
+        # create_room_client of BizBasicClient and BizAdvancedClient takes api_key
+        rooms = [
+            self.create_room_client(api_key, room_id)  # type: ignore[call-arg]
+            for room_id in room_ids
+        ]
+        return _fan_out(rooms, action, max_workers, ordered)
+
 
 class BizBasicClient(BizClient):
     """各種apiを呼び出す同期版のclient(Business Basic版)
@@ -1778,7 +2237,7 @@ class Room:
         self._base_client = base_client
         self.room_id = room_id
 
-    def get_msgs(self, ts: int = None) -> EmoMsgsInfo:
+    def get_msgs(self, ts: Optional[int] = None) -> EmoMsgsInfo:
         """部屋に投稿されたメッセージの取得
 
         Parameters
@@ -1814,6 +2273,99 @@ class Room:
         )
         return EmoMsgsInfo(**response)
 
+    def iter_msgs(
+        self, since: Optional[int] = None, until: Optional[int] = None
+    ) -> Iterator[EmoMessageInfo]:
+        """部屋に投稿されたメッセージの順次取得
+
+            部屋に投稿されたメッセージを新しいものから順に1件ずつ返します。
+            ページの境界は自動で処理され、現在のページを処理している間に次のページを別のスレッドで取得します。
+            保持するのは最大2ページ分のみのため、長期間の履歴を読む場合もメモリ使用量は増えません::
+
+                for msg in room_client.iter_msgs(since=20210701000000000):
+                    print(msg.sequence, msg.message)
+
+        Parameters
+        ----------
+        since : int or None
+            指定した場合は、その時刻以降のメッセージのみを取得します。
+
+                指定方法：2021/07/01 12:30:45以降なら、20210701123045000
+
+        until : int or None
+            指定した場合は、その時刻より前のメッセージのみを取得します。指定方法はsinceと同じです。
+
+        Yields
+        -------
+        msg : EmoMessageInfo
+            投稿されたメッセージの情報。
+
+        Raises
+        ----------
+        EmoPlatformError
+            関数内部で行っているAPI呼び出しが失敗した場合。
+
+        Note
+        ----
+        API呼び出し回数
+            取得したページ数 + 1回(access tokenが切れていた場合)
+
+        """
+
+        return _iter_msgs(self.get_msgs, since, until)
+
+    def tail_msgs(
+        self,
+        after: Optional[int] = None,
+        min_interval: float = 1,
+        max_interval: float = 30,
+    ) -> Iterator[EmoMessageInfo]:
+        """部屋に新しく投稿されたメッセージの順次取得
+
+            定期的に :func:`get_msgs` を呼び出し、最後に取得したメッセージより新しいものだけを古いものから順に1件ずつ返します。
+            webhookを受信できない環境で、新しいメッセージを監視する場合に使用します::
+
+                for msg in room_client.tail_msgs():
+                    print(msg.sequence, msg.message)
+
+            新しいメッセージがない間は呼び出し間隔をmax_intervalまで2倍ずつ延ばし、新しいメッセージを取得するとmin_intervalに戻します。
+            呼び出し間隔の間はスレッドをブロックして待機します。
+
+            1回の呼び出しで取得したメッセージが全て新しいものだった場合は、取得できていないメッセージがあるとみなし、
+            最後に取得したメッセージまで遡って自動で取得します。
+
+        Parameters
+        ----------
+        after : int or None
+            最後に取得したメッセージのsequence。指定した場合は、それより新しいメッセージから取得します。
+
+            指定しない場合は、呼び出した時点の最新のメッセージより新しいもののみを取得します。
+
+        min_interval : float, default 1
+            API呼び出しの最短の間隔(秒)。
+
+        max_interval : float, default 30
+            API呼び出しの最長の間隔(秒)。
+
+        Yields
+        -------
+        msg : EmoMessageInfo
+            新しく投稿されたメッセージの情報。
+
+        Raises
+        ----------
+        EmoPlatformError
+            関数内部で行っているAPI呼び出しが失敗した場合。
+
+        Note
+        ----
+        API呼び出し回数
+            呼び出し間隔毎に1回 + 遡って取得したページ数 + 1回(access tokenが切れていた場合)
+
+        """
+
+        return _tail_msgs(self.get_msgs, after, min_interval, max_interval)
+
     def get_sensors_list(
         self,
     ) -> EmoSensorsInfo:
@@ -1843,7 +2395,9 @@ class Room:
 
         """
 
-        response = self._base_client._get("/v1/rooms/" + self.room_id + "/sensors")
+        response = self._base_client._get(
+            "/v1/rooms/" + self.room_id + "/sensors", _cache_group="sensors"
+        )
         return EmoSensorsInfo(**response)
 
     def get_sensor_values(self, sensor_id: str) -> EmoRoomSensorInfo:
@@ -1882,7 +2436,7 @@ class Room:
         )
         return EmoRoomSensorInfo(**response)
 
-    def send_audio_msg(self, audio_data_path: str) -> EmoMessageInfo:
+    def send_audio_msg(self, audio_data_path: _MediaData) -> EmoMessageInfo:
         """音声ファイルの部屋への投稿
 
         Attention
@@ -1894,9 +2448,12 @@ class Room:
 
         Parameters
         ----------
-        audio_data_path : str
+        audio_data_path : str or bytes or bytearray or memoryview or BinaryIO
             投稿する音声ファイルの絶対パス。
 
+            あるいは、音声ファイルの内容。bytes, bytearray, memoryviewの場合は、送信前にbytesへの変換(コピー)を行わずにそのまま渡します。
+            読み込み可能なバイナリストリームの場合は、先頭から末尾までを送信します。
+
         Returns
         -------
         response : EmoMessageInfo
@@ -1907,6 +2464,9 @@ class Room:
         EmoPlatformError
             関数内部で行っているAPI呼び出しが失敗した場合。
 
+        ValidationError
+            ファイルが1MBを超えている場合、あるいはMP3, M4Aでない場合。(clientの引数validateがTrueの場合のみ)
+
         Note
         ----
         呼び出しているAPI
@@ -1917,8 +2477,11 @@ class Room:
 
         """
 
-        with open(audio_data_path, "rb") as audio_data:
-            files = {"audio": audio_data}
+        with _open_media(audio_data_path, "audio", self._base_client._validate) as (
+            filename,
+            audio_data,
+        ):
+            files = {"audio": (filename, audio_data)}
             response = self._base_client._post(
                 "/v1/rooms/" + self.room_id + "/messages/audio",
                 files=files,
@@ -1926,7 +2489,9 @@ class Room:
             )
             return EmoMessageInfo(**response)
 
-    def send_image(self, image_data_path: str) -> EmoMessageInfo:
+    def send_image(
+        self, image_data_path: _MediaData, compress: bool = False
+    ) -> EmoMessageInfo:
         """画像ファイルの部屋への投稿
 
         Attention
@@ -1938,9 +2503,18 @@ class Room:
 
         Parameters
         ----------
-        image_data_path : str
+        image_data_path : str or bytes or bytearray or memoryview or BinaryIO
             投稿する画像ファイルの絶対パス。
 
+            あるいは、画像ファイルの内容。bytes, bytearray, memoryviewの場合は、送信前にbytesへの変換(コピー)を行わずにそのまま渡します。
+            読み込み可能なバイナリストリームの場合は、先頭から末尾までを送信します。
+
+        compress : bool, default False
+            Trueにした場合、1MBを超える画像を1MB以下になるまで再圧縮してから送信します。
+
+            JPGは画質を段階的に(最低50まで)下げ、それでも超える場合は縦横比を保ったまま縮小します。PNGは縮小のみ行います。
+            使用するには、Pillowをインストールしてください。( pip install emo-platform-api-sdk[image] )
+
         Returns
         -------
         response : EmoMessageInfo
@@ -1951,6 +2525,9 @@ class Room:
         EmoPlatformError
             関数内部で行っているAPI呼び出しが失敗した場合。
 
+        ValidationError
+            ファイルが1MBを超えている場合、あるいはJPG, PNGでない場合。(clientの引数validateがTrueの場合のみ)
+
         Note
         ----
         呼び出しているAPI
@@ -1961,8 +2538,13 @@ class Room:
 
         """
 
-        with open(image_data_path, "rb") as image_data:
-            files = {"image": image_data}
+        if compress:
+            image_data_path = _compress_image(image_data_path)
+        with _open_media(image_data_path, "image", self._base_client._validate) as (
+            filename,
+            image_data,
+        ):
+            files = {"image": (filename, image_data)}
             response = self._base_client._post(
                 "/v1/rooms/" + self.room_id + "/messages/image",
                 files=files,
@@ -2072,6 +2654,9 @@ class Room:
             関数内部で行っているAPI呼び出しが失敗した場合。
             (モーションのデータ形式が誤っている場合も含みます)
 
+        ValidationError
+            モーションのデータ形式が誤っている場合。(clientの引数validateがTrueの場合のみ)
+
         Note
         ----
         呼び出しているAPI
@@ -2082,13 +2667,21 @@ class Room:
 
         """
 
-        if type(motion_data) == str:
-            with open(motion_data) as f:
-                payload = json.load(f)
+        registry = self._base_client._motion_registry
+        if isinstance(motion_data, str) and registry is not None:
+            # the request body is reused while the file is not modified
+            body = registry._get_body(motion_data, self._base_client._validate)
         else:
-            payload = motion_data
+            if isinstance(motion_data, str):
+                with open(motion_data) as f:
+                    payload = json.load(f)
+            else:
+                payload = motion_data
+            if self._base_client._validate:
+                _validate_motion(payload)
+            body = json.dumps(payload)
         response = self._base_client._post(
-            "/v1/rooms/" + self.room_id + "/motions", json.dumps(payload)
+            "/v1/rooms/" + self.room_id + "/motions", body
         )
         return EmoMessageInfo(**response)
 
@@ -2225,7 +2818,9 @@ class Room:
 
         """
 
-        response = self._base_client._get("/v1/rooms/" + self.room_id + "/emo/settings")
+        response = self._base_client._get(
+            "/v1/rooms/" + self.room_id + "/emo/settings", _cache_group="emo_settings"
+        )
         return EmoSettingsInfo(**response)
 
 
@@ -2252,11 +2847,11 @@ class BizRoom(Room):
         super().__init__(base_client=base_client, room_id=room_id)
         self.api_key = api_key
 
-    def get_msgs(self, ts: int = None) -> EmoMsgsInfo:
+    def get_msgs(self, ts: Optional[int] = None) -> EmoMsgsInfo:
         with self._base_client._add_apikey2header(self.api_key):
             return super().get_msgs(ts)
 
-    def get_channel_msgs(self, ts: int = None) -> EmoMsgsInfo:
+    def get_channel_msgs(self, ts: Optional[int] = None) -> EmoMsgsInfo:
         """チャンネルから部屋に投稿されたメッセージの取得
 
         Parameters
@@ -2290,19 +2885,62 @@ class BizRoom(Room):
             )
             return EmoMsgsInfo(**response)
 
+    def iter_channel_msgs(
+        self, since: Optional[int] = None, until: Optional[int] = None
+    ) -> Iterator[EmoMessageInfo]:
+        """チャンネルから部屋に投稿されたメッセージの順次取得
+
+            チャンネルから部屋に投稿されたメッセージを新しいものから順に1件ずつ返します。
+            ページの境界は自動で処理され、現在のページを処理している間に次のページを別のスレッドで取得します。
+            保持するのは最大2ページ分のみのため、長期間の履歴を読む場合もメモリ使用量は増えません::
+
+                for msg in room_client.iter_channel_msgs(since=20210701000000000):
+                    print(msg.sequence, msg.message)
+
+        Parameters
+        ----------
+        since : int or None
+            指定した場合は、その時刻以降のメッセージのみを取得します。
+
+                指定方法：2021/07/01 12:30:45以降なら、20210701123045000
+
+        until : int or None
+            指定した場合は、その時刻より前のメッセージのみを取得します。指定方法はsinceと同じです。
+
+        Yields
+        -------
+        msg : EmoMessageInfo
+            投稿されたメッセージの情報。
+
+        Raises
+        ----------
+        EmoPlatformError
+            関数内部で行っているAPI呼び出しが失敗した場合。
+
+        Note
+        ----
+        API呼び出し回数
+            取得したページ数 + 1回(access tokenが切れていた場合)
+
+        """
+
+        return _iter_msgs(self.get_channel_msgs, since, until)
+
     def get_sensors_list(
         self,
     ) -> EmoSensorsInfo:
         with self._base_client._add_apikey2header(self.api_key):
             return super().get_sensors_list()
 
-    def send_audio_msg(self, audio_data_path: str) -> EmoMessageInfo:
+    def send_audio_msg(self, audio_data_path: _MediaData) -> EmoMessageInfo:
         with self._base_client._add_apikey2header(self.api_key):
             return super().send_audio_msg(audio_data_path)
 
-    def send_image(self, image_data_path: str) -> EmoMessageInfo:
+    def send_image(
+        self, image_data_path: _MediaData, compress: bool = False
+    ) -> EmoMessageInfo:
         with self._base_client._add_apikey2header(self.api_key):
-            return super().send_image(image_data_path)
+            return super().send_image(image_data_path, compress)
 
     def send_msg(self, msg: str) -> EmoMessageInfo:
         with self._base_client._add_apikey2header(self.api_key):
@@ -2546,6 +3184,9 @@ class BizAdvancedRoom(BizRoom):
         EmoPlatformError
             関数内部で行っているAPI呼び出しが失敗した場合。
 
+        ValidationError
+            textが1-250文字でない場合。(clientの引数validateがTrueの場合のみ)
+
         Note
         ----
         呼び出しているAPI
@@ -2556,6 +3197,8 @@ class BizAdvancedRoom(BizRoom):
 
         """
         with self._base_client._add_apikey2header(self.api_key):
+            if self._base_client._validate:
+                _validate_text(text)
             payload = {"text": text, "display": display}
             response = self._base_client._post("/v1/rooms/" + self.room_id + "/conversations/" + session_id + "/text", json.dumps(payload))
             return EmoPostConversation(**response)
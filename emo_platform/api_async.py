@@ -1,24 +1,50 @@
+import asyncio
 import json
+from collections import deque
+from contextlib import asynccontextmanager, nullcontext
 from dataclasses import asdict
 from functools import partial
-from typing import Callable, List, NoReturn, Optional, Tuple, Union
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    NoReturn,
+    Optional,
+    Tuple,
+    Type,
+    TypeVar,
+    Union,
+)
 
 import aiohttp
 
-from emo_platform.api import (
-    BizAdvancedClient,
-    BizBasicClient,
-    BizClient,
-    Client,
-    PostContentType,
-)
+from emo_platform.auth import AsyncTokenManager
+from emo_platform.batch import RoomResult, _async_fan_out
+from emo_platform.cache import ResponseCache, _ValidatorCache
+from emo_platform.circuit_breaker import CircuitBreaker
+from emo_platform.coalesce import _AsyncCoalescer
+from emo_platform.download import _CHUNK_SIZE, _async_download_all, _MediaStore
 from emo_platform.exceptions import (
+    DeadlineExceededError,
+    EmoHttpError,
+    EmoPlatformError,
+    NoRoomError,
     TokenError,
     UnauthorizedError,
     UnavailableError,
+    WebhookCallbackError,
+    WebhookRequestError,
     _aiohttp_error_handler,
 )
+from emo_platform.image import _compress_image
 from emo_platform.models import AccountInfo, BroadcastMsg, Color, Head, Tokens, WebHook
+from emo_platform.motion import MotionRegistry
+from emo_platform.pagination import _async_iter_msgs, _async_tail_msgs
+from emo_platform.ratelimit import RateLimiter
 from emo_platform.response import (
     EmoAccountInfo,
     EmoBizAccountInfo,
@@ -37,7 +63,28 @@ from emo_platform.response import (
     EmoTokens,
     EmoWebhookBody,
     EmoWebhookInfo,
+    PrintModel,
+)
+from emo_platform.retry import RetryPolicy
+from emo_platform.transport import (
+    PostContentType,
+    _build_headers,
+    _channel_user,
+    _channel_user_context,
+    _deadline_context,
+    _get_remaining_time,
 )
+from emo_platform.upload import (
+    _async_open_media,
+    _attempt_data,
+    _load_json,
+    _MediaData,
+    _UploadData,
+)
+from emo_platform.validation import _validate_motion, _validate_text
+
+_Model = TypeVar("_Model", bound=PrintModel)
+_FormDataFactory = Callable[[], aiohttp.FormData]
 
 
 class AsyncClient:
@@ -72,6 +119,67 @@ class AsyncClient:
 
         この引数をTrueにするのは、サーバーサイドのwebアプリにこのライブラリを使用する際などを想定しています。
 
+    access_token_ttl : Optional[float], default None
+        access tokenの有効期間(秒)。
+
+        access tokenがJWTの場合はexp claimから有効期限を取得するため、指定する必要はありません。
+        JWTでないaccess tokenを使用する場合に、有効期限の計算に使用されます。
+
+    token_refresh_margin : float, default 60
+        access tokenの有効期限の何秒前に、access tokenを更新するか。
+
+        有効期限が分かる場合は、期限が切れる前のAPI呼び出し時に自動でaccess tokenが更新されます。
+
+    connection_limit : int, default 100
+        同時に保持するコネクションの最大数。0の場合は無制限になります。
+
+    connection_limit_per_host : int, default 0
+        1つのホストに対して同時に保持するコネクションの最大数。0の場合は無制限になります。
+
+    keepalive_timeout : float, default 15
+        使用されていないコネクションを保持しておく時間(秒)。
+
+    ttl_dns_cache : Optional[int], default 10
+        DNSの名前解決の結果をキャッシュしておく時間(秒)。Noneの場合は無期限にキャッシュします。
+
+    rate_limiter : Optional[RateLimiter], default None
+        API呼び出し頻度の制限に使用する :class:`~emo_platform.ratelimit.RateLimiter` 。
+
+        指定した場合、1分あたりのAPI呼び出し回数が上限を超えないように、送信前に待機します。
+
+    retry_policy : Optional[RetryPolicy], default None
+        一時的なエラーでAPI呼び出しが失敗した場合の再試行の設定。
+
+        指定しない場合は、 :class:`~emo_platform.retry.RetryPolicy` の初期値で再試行します。
+        再試行しない場合は、RetryPolicy(max_attempts=1)を指定してください。
+
+    connect_timeout : Optional[float], default 10
+        サーバーとの接続を確立するまでの待機時間の上限(秒)。Noneの場合は無期限に待機します。
+
+    read_timeout : Optional[float], default 30
+        サーバーからのレスポンスを待機する時間の上限(秒)。Noneの場合は無期限に待機します。
+
+    circuit_breaker : Optional[CircuitBreaker], default None
+        サーバー障害時にAPI呼び出しを遮断する :class:`~emo_platform.circuit_breaker.CircuitBreaker` 。
+
+        指定した場合、サーバーエラーや通信エラーが続くと、API呼び出しを行わずにCircuitOpenErrorを出します。
+
+    response_cache : Optional[ResponseCache], default None
+        読み取り専用のAPIのレスポンスを保存する :class:`~emo_platform.cache.ResponseCache` 。
+
+        指定した場合、保存されている間は同じAPIを呼び出してもAPI呼び出しを行いません。
+
+    validate : bool, default True
+        Trueの場合、ファイルやメッセージの送信前に、APIの制限を満たしているかをローカルで確認します。
+
+        制限を満たしていない場合は、API呼び出しを行わずにValidationErrorを出します。
+        送信するデータが正しいことが分かっている場合は、Falseにすると確認を省略できます。
+
+    motion_registry : Optional[MotionRegistry], default None
+        モーションファイルの読み込み結果を保存する :class:`~emo_platform.motion.MotionRegistry` 。
+
+        指定した場合、send_original_motionで同じファイルを送信する際に、2回目以降はファイルを読み込まずに送信します。
+
     Raises
     ----------
     TokenError
@@ -84,14 +192,40 @@ class AsyncClient:
         emo-platform-api.jsonに保存されているrefresh tokenを使用して自動的にaccess tokenが更新されます。
         その際にAPI呼び出しが1回行われます。
 
+    一時的なエラーでAPI呼び出しが失敗した場合
+        引数retry_policyの設定に従って再試行されます。
+        その際に再試行した回数だけ、API呼び出しが追加で行われます。
+
+    API呼び出し全体の期限について
+        :func:`deadline` を使用すると、access tokenの更新や再試行も含めた、API呼び出し全体の期限を設定できます。
+
+    一覧を取得するAPIの条件付きリクエストについて
+        部屋・スタンプ・モーション・一斉配信メッセージの一覧の取得時に、サーバーがETagあるいはLast-Modifiedを返した場合は、
+        次回の取得時にそれらを使用した条件付きリクエストを行います。
+        一覧が更新されていなければ、前回取得した結果をそのまま返します。
+
+    トークンファイルの読み書きについて
+        イベントループをブロックしないよう、上述した2つのファイルの読み書きは別スレッドで行われます。
+
+        ファイルの読み込みはclientの作成時ではなく、最初のAPI呼び出し時に行われます。
+
+    コネクションの再利用について
+        clientは最初のAPI呼び出し時にセッションを作成し、以降のAPI呼び出しではそのセッションを再利用します。
+
+        使用後は :func:`close` を呼び出すか、async with文を使用してセッションを閉じてください::
+
+            async with emo_platform.AsyncClient() as client:
+                print(await client.get_account_info())
+
     Business版をお使いの方へ
         このクラスは使用せずに、継承先である :class:`BizBasicAsyncClient` あるいは :class:`BizAdvancedAsyncClient` をお使いください。
 
     """
 
-    _DEFAULT_ROOM_ID = Client._DEFAULT_ROOM_ID
-    _MAX_SAVED_REQUEST_ID = Client._MAX_SAVED_REQUEST_ID
-    _PLAN = Client._PLAN
+    _BASE_URL = "https://platform-api.bocco.me"
+    _DEFAULT_ROOM_ID = ""
+    _MAX_SAVED_REQUEST_ID = 10
+    _PLAN = "Personal"
 
     def __init__(
         self,
@@ -99,10 +233,131 @@ class AsyncClient:
         tokens: Optional[Tokens] = None,
         token_file_path: Optional[str] = None,
         use_cached_credentials: bool = False,
+        access_token_ttl: Optional[float] = None,
+        token_refresh_margin: float = 60,
+        connection_limit: int = 100,
+        connection_limit_per_host: int = 0,
+        keepalive_timeout: float = 15,
+        ttl_dns_cache: Optional[int] = 10,
+        rate_limiter: Optional[RateLimiter] = None,
+        retry_policy: Optional[RetryPolicy] = None,
+        connect_timeout: Optional[float] = 10,
+        read_timeout: Optional[float] = 30,
+        circuit_breaker: Optional[CircuitBreaker] = None,
+        response_cache: Optional[ResponseCache] = None,
+        validate: bool = True,
+        motion_registry: Optional[MotionRegistry] = None,
     ):
-        self._client = Client(
-            endpoint_url, tokens, token_file_path, use_cached_credentials
+        self._tm = AsyncTokenManager(
+            tokens=tokens,
+            token_file_path=token_file_path,
+            use_cached_credentials=use_cached_credentials,
+            access_token_ttl=access_token_ttl,
         )
+        self._token_refresh_margin = token_refresh_margin
+        self._endpoint_url = endpoint_url if endpoint_url else self._BASE_URL
+        self._webhook_events_cb: Dict[str, Dict[str, Callable]] = {}
+        self._request_id_deque: deque = deque([], self._MAX_SAVED_REQUEST_ID)
+        self._connector_settings: Dict[str, Any] = {
+            "limit": connection_limit,
+            "limit_per_host": connection_limit_per_host,
+            "keepalive_timeout": keepalive_timeout,
+            "ttl_dns_cache": ttl_dns_cache,
+        }
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._rate_limiter = rate_limiter
+        self._retry_policy = retry_policy if retry_policy else RetryPolicy()
+        self._connect_timeout = connect_timeout
+        self._read_timeout = read_timeout
+        self._circuit_breaker = circuit_breaker
+        self._response_cache = response_cache
+        self._validate = validate
+        self._motion_registry = motion_registry
+        self._validator_cache = _ValidatorCache()
+        self._coalescer = _AsyncCoalescer()
+        self._token_lock: Optional[asyncio.Lock] = None
+        self._refresh_count = 0
+        self._refresh_error: Optional[EmoPlatformError] = None
+
+    def _check_loop(self) -> None:
+        # The session and the lock are bound to the event loop which created them,
+        # so they are created again when the client is used on another event loop
+        # (e.g. by calling asyncio.run twice).
+        loop = asyncio.get_event_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._session = None
+            self._token_lock = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        self._check_loop()
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(**self._connector_settings)
+            self._session = aiohttp.ClientSession(connector=connector)
+        return self._session
+
+    async def close(self) -> None:
+        """セッションの終了
+
+            clientが保持しているコネクションを全て閉じます。
+
+        Note
+        ----
+        API呼び出し回数
+            0回
+
+        """
+
+        # The session created on another event loop can not be closed on this one.
+        if self._session is not None and self._loop is asyncio.get_event_loop():
+            await self._session.close()
+        self._session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback) -> None:
+        await self.close()
+
+    def deadline(self, seconds: float):
+        """API呼び出しの期限の設定
+
+            with文の中で行うAPI呼び出しを、指定した時間内に終わらせます。
+            access tokenの更新や再試行、呼び出し頻度の制限による待機も含めて、期限を過ぎるとDeadlineExceededErrorが出ます::
+
+                with client.deadline(5):
+                    await room_client.send_msg("こんにちは")
+
+            with文を入れ子にした場合は、より早い方の期限が使用されます。
+
+        Parameters
+        ----------
+        seconds : float
+            API呼び出しの期限(秒)。
+
+        Note
+        ----
+        API呼び出し回数
+            0回
+
+        """
+
+        return _deadline_context(seconds)
+
+    def _track_circuit(self):
+        if self._circuit_breaker is None:
+            return nullcontext(lambda status: None)
+        return self._circuit_breaker._track(
+            (aiohttp.ClientConnectionError, asyncio.TimeoutError)
+        )
+
+    def _add_apikey2header(self, api_key: str):
+        return _channel_user_context(api_key)
+
+    async def _load_tokens(self) -> None:
+        if not self._tm.loaded:
+            await self._tm.load_tokens()
 
     async def _update_tokens(self) -> None:
         """トークンの更新と保存
@@ -126,78 +381,233 @@ class AsyncClient:
             1回
         """
 
+        await self._load_tokens()
         try:
-            res_tokens = await self.get_access_token(
-                self._client._tm.tokens.refresh_token
-            )
+            res_tokens = await self.get_access_token(self._tm.tokens.refresh_token)
         except UnauthorizedError as e:
             raise TokenError(
                 "Please set refresh_token as environment variable 'EMO_PLATFORM_API_REFRESH_TOKEN' or give args to client using emo_platform.Tokens"
             ) from e
         else:
-            self._client._tm.tokens.access_token = res_tokens.access_token
-            self._client._tm.tokens.refresh_token = res_tokens.refresh_token
-            self._client._headers["Authorization"] = (
-                "Bearer " + self._client._tm.tokens.access_token
-            )
-            self._client._tm.save_tokens()
+            self._tm.set_tokens(res_tokens.access_token, res_tokens.refresh_token)
+            await self._tm.save_tokens()
             return
 
+    async def _refresh_tokens(self, stale_access_token: str) -> None:
+        # Only one coroutine refreshes the tokens at a time.
+        # The other coroutines waiting for the lock reuse its result.
+        refresh_count = self._refresh_count
+        self._check_loop()
+        if self._token_lock is None:
+            self._token_lock = asyncio.Lock()
+        async with self._token_lock:
+            if self._tm.tokens.access_token != stale_access_token:
+                return
+            if self._refresh_count != refresh_count:
+                if self._refresh_error is not None:
+                    raise self._refresh_error
+                return
+            self._refresh_count += 1
+            try:
+                await self._update_tokens()
+            except EmoPlatformError as e:
+                self._refresh_error = e
+                raise
+            else:
+                self._refresh_error = None
+
+    async def _renew_expiring_tokens(self) -> None:
+        if self._tm.is_expiring(self._token_refresh_margin):
+            try:
+                await self._refresh_tokens(self._tm.tokens.access_token)
+            except EmoPlatformError:
+                # The current access token may still be valid, so the request is sent anyway.
+                pass
+
     async def _check_http_error(
-        self, request: Callable, _update_tokens: bool = True
+        self,
+        request: Callable,
+        _update_tokens: bool = True,
+        _idempotent: bool = True,
     ) -> dict:
-        async with request() as response:
+        await self._load_tokens()
+        if _update_tokens:
+            await self._renew_expiring_tokens()
+        tokens_refreshed = False
+        attempt = 1
+        while True:
+            access_token = self._tm.tokens.access_token
             try:
-                response_msg = await response.text()
-                with _aiohttp_error_handler(response_msg):
-                    response.raise_for_status()
-            except UnauthorizedError:
-                if not _update_tokens:
+                async with request() as response:
+                    try:
+                        response_msg = await response.text()
+                        with _aiohttp_error_handler(response_msg):
+                            response.raise_for_status()
+                    except UnauthorizedError:
+                        if not _update_tokens or tokens_refreshed:
+                            raise
+                        # no delay, the request is replayed after refreshing the tokens
+                        delay = None
+                    except EmoHttpError as e:
+                        delay = self._retry_policy.get_delay(
+                            attempt,
+                            status=e.status,
+                            idempotent=_idempotent,
+                            retry_after=response.headers.get("Retry-After"),
+                        )
+                        if delay is None:
+                            raise
+                    else:
+                        if len(await response.read()) == 0:
+                            return {}
+
+                        return await response.json()
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                # raises DeadlineExceededError if the deadline has caused the timeout
+                _get_remaining_time()
+                delay = self._retry_policy.get_delay(attempt, idempotent=_idempotent)
+                if delay is None:
                     raise
-            else:
-                if len(await response.read()) == 0:
-                    return {}
-
-                return await response.json()
 
-        await self._update_tokens()
-        async with request() as response:
-            response_msg = await response.text()
-            with _aiohttp_error_handler(response_msg):
-                response.raise_for_status()
-            return await response.json()
+            if delay is None:
+                await self._refresh_tokens(access_token)
+                tokens_refreshed = True
+            else:
+                await self._wait_before_retry(delay)
+                attempt += 1
+
+    async def _wait_before_retry(self, delay: float) -> None:
+        remaining = _get_remaining_time()
+        if remaining is not None and delay >= remaining:
+            raise DeadlineExceededError(
+                "The deadline for the API call will pass before the retry."
+            )
+        await asyncio.sleep(delay)
 
-    async def _get(self, path: str, params: dict = {}) -> dict:
-        async with aiohttp.ClientSession() as session:
-            request = partial(
-                session.get,
-                self._client._endpoint_url + path,
-                params=params,
-                headers=self._client._headers,
+    @asynccontextmanager
+    async def _request(
+        self,
+        method: str,
+        path: str,
+        params: Optional[dict] = None,
+        data: Union[
+            str, aiohttp.FormData, aiohttp.MultipartWriter, _FormDataFactory, None
+        ] = None,
+        content_type: Optional[str] = PostContentType.APPLICATION_JSON,
+        accept: Optional[str] = "*/*",
+        extra_headers: Optional[Dict[str, str]] = None,
+    ) -> AsyncIterator[aiohttp.ClientResponse]:
+        # The open circuit rejects the call before it waits for the rate limiter.
+        with self._track_circuit() as record_status:
+            if self._rate_limiter is not None:
+                if not await self._rate_limiter.async_acquire(
+                    _channel_user.get(), _get_remaining_time()
+                ):
+                    raise DeadlineExceededError(
+                        "The deadline for the API call will pass before the rate limit allows it."
+                    )
+            # A FormData can be sent only once,
+            # so a new one is built for each attempt (e.g. the replayed request).
+            body = data() if callable(data) else data
+            # headers are built on every call, so that the replayed request uses the refreshed token
+            headers = _build_headers(self._tm.tokens.access_token, content_type, accept)
+            if extra_headers is not None:
+                headers.update(extra_headers)
+            timeout = aiohttp.ClientTimeout(
+                total=_get_remaining_time(),
+                sock_connect=self._connect_timeout,
+                sock_read=self._read_timeout,
             )
-            return await self._check_http_error(request)
+            async with self._get_session().request(
+                method,
+                self._endpoint_url + path,
+                params=params,
+                data=body,
+                headers=headers,
+                timeout=timeout,
+            ) as response:
+                record_status(response.status)
+                yield response
+
+    async def _get(
+        self, path: str, params: dict = {}, _cache_group: Optional[str] = None
+    ) -> dict:
+        api_key = _channel_user.get()
+        cache = self._response_cache if _cache_group is not None else None
+        if cache is not None:
+            cached = cache._lookup(_cache_group, api_key, path, params)
+            if cached is not None:
+                return cached
+        request = partial(self._request, "GET", path, params=params)
+        # identical GETs in flight share one API call
+        key = ("GET", api_key, path, tuple(sorted(params.items())))
+        response = await self._coalescer.run(
+            key, partial(self._check_http_error, request)
+        )
+        if cache is not None:
+            cache._store(_cache_group, api_key, path, params, response)
+        return response
+
+    async def _get_model(
+        self, path: str, model: Type[_Model], _cache_group: Optional[str] = None
+    ) -> _Model:
+        api_key = _channel_user.get()
+        cache = self._response_cache if _cache_group is not None else None
+        if cache is not None:
+            cached = cache._lookup(_cache_group, api_key, path, None)
+            if cached is not None:
+                return model(**cached)
+        # identical GETs in flight share one API call and one parsed model
+        key = ("GET_MODEL", api_key, path)
+        body, parsed = await self._coalescer.run(
+            key, partial(self._fetch_model, api_key, path, model)
+        )
+        if cache is not None:
+            cache._store(_cache_group, api_key, path, None, body)
+        return parsed
+
+    async def _fetch_model(
+        self, api_key: Optional[str], path: str, model: Type[_Model]
+    ) -> Tuple[dict, _Model]:
+        # Sends a conditional GET with the validators of the previous response,
+        # and reuses its parsed model if the server answers 304 Not Modified.
+        validated = self._validator_cache.get(api_key, path)
+        responses: List[aiohttp.ClientResponse] = []
+
+        @asynccontextmanager
+        async def request() -> AsyncIterator[aiohttp.ClientResponse]:
+            async with self._request(
+                "GET", path, extra_headers=validated.headers() if validated else None
+            ) as response:
+                responses.append(response)
+                yield response
+
+        body = await self._check_http_error(request)
+        response = responses[-1]
+        if response.status == 304 and validated is not None:
+            return validated.body, validated.model
+        parsed = model(**body)
+        self._validator_cache.store(api_key, path, response.headers, body, parsed)
+        return body, parsed
+
+    def _invalidate_cache(self, group: Optional[str] = None) -> None:
+        if self._response_cache is not None:
+            self._response_cache.invalidate(group, _channel_user.get())
 
     async def _post(
         self,
         path: str,
-        data: Union[str, aiohttp.FormData] = "{}",
+        data: Union[str, aiohttp.FormData, _FormDataFactory] = "{}",
         files: Optional[dict] = None,
         content_type: Optional[str] = PostContentType.APPLICATION_JSON,
         _update_tokens: bool = True,
     ) -> dict:
-        if content_type is None:
-            if "Content-Type" in self._client._headers:
-                self._client._headers.pop("Content-Type")
-        else:
-            self._client._headers["Content-Type"] = content_type
-        async with aiohttp.ClientSession() as session:
-            request = partial(
-                session.post,
-                self._client._endpoint_url + path,
-                data=data,
-                headers=self._client._headers,
-            )
-            return await self._check_http_error(request, _update_tokens=_update_tokens)
+        request = partial(
+            self._request, "POST", path, data=data, content_type=content_type
+        )
+        return await self._check_http_error(
+            request, _update_tokens=_update_tokens, _idempotent=False
+        )
 
     async def _put(
         self,
@@ -206,29 +616,19 @@ class AsyncClient:
         content_type: Optional[str] = PostContentType.APPLICATION_JSON,
         accept: Optional[str] = "*/*",
     ) -> dict:
-        if content_type is None:
-            if "Content-Type" in self._client._headers:
-                self._client._headers.pop("Content-Type")
-        else:
-            self._client._headers["Content-Type"] = content_type
-        async with aiohttp.ClientSession() as session:
-            self._client._headers["accept"] = accept
-            request = partial(
-                session.put,
-                self._client._endpoint_url + path,
-                data=data,
-                headers=self._client._headers,
-            )
-            return await self._check_http_error(request)
+        request = partial(
+            self._request,
+            "PUT",
+            path,
+            data=data,
+            content_type=content_type,
+            accept=accept,
+        )
+        return await self._check_http_error(request)
 
     async def _delete(self, path: str) -> dict:
-        async with aiohttp.ClientSession() as session:
-            request = partial(
-                session.delete,
-                self._client._endpoint_url + path,
-                headers=self._client._headers,
-            )
-            return await self._check_http_error(request)
+        request = partial(self._request, "DELETE", path)
+        return await self._check_http_error(request)
 
     async def get_access_token(self, refresh_token: str) -> EmoTokens:
         """トークンの取得
@@ -270,7 +670,7 @@ class AsyncClient:
         return EmoTokens(**response)
 
     async def _get_account_info(self) -> dict:
-        return await self._get("/v1/me")
+        return await self._get("/v1/me", _cache_group="me")
 
     async def get_account_info(self) -> EmoAccountInfo:
         """アカウント情報の取得
@@ -322,6 +722,7 @@ class AsyncClient:
         """
 
         response = await self._delete("/v1/me")
+        self._invalidate_cache()
         return EmoAccountInfo(**response)
 
     async def get_rooms_list(self) -> EmoRoomInfo:
@@ -346,8 +747,7 @@ class AsyncClient:
 
         """
 
-        response = await self._get("/v1/rooms")
-        return EmoRoomInfo(**response)
+        return await self._get_model("/v1/rooms", EmoRoomInfo, _cache_group="rooms")
 
     async def get_rooms_id(self) -> List[str]:
         """ユーザーが参加している全ての部屋のidの取得
@@ -374,7 +774,17 @@ class AsyncClient:
         """
 
         rooms_info = await self.get_rooms_list()
-        return self._client._get_rooms_id(rooms_info)
+        return self._get_rooms_id(rooms_info)
+
+    def _get_rooms_id(self, rooms_info: EmoRoomInfo) -> List[str]:
+        try:
+            room_number = len(rooms_info.rooms)
+        except KeyError:
+            raise NoRoomError("Get no room id.")
+        if room_number == 0:
+            raise NoRoomError("Get no room id.")
+        rooms_id = [rooms_info.rooms[i].uuid for i in range(room_number)]
+        return rooms_id
 
     def create_room_client(self, room_id: str):
         """部屋固有の各種apiを呼び出すclientの作成
@@ -400,6 +810,131 @@ class AsyncClient:
 
         return AsyncRoom(self, room_id)
 
+    def send_to_rooms(
+        self,
+        room_ids: Iterable[str],
+        action: Callable[["AsyncRoom"], Awaitable[Any]],
+        max_concurrency: int = 10,
+    ) -> AsyncIterator[RoomResult]:
+        """複数の部屋に対する処理の並行実行
+
+            部屋毎に作成した :class:`AsyncRoom` を引数として、actionを並行して呼び出します。
+            処理が終わった部屋から順に、結果を返します。
+
+            例えば、全ての部屋にメッセージを送信する場合は以下のようにします::
+
+                room_ids = await client.get_rooms_id()
+                async for room_result in client.send_to_rooms(
+                    room_ids, lambda room: room.send_msg("こんにちは")
+                ):
+                    print(room_result.room_id, room_result.ok)
+
+        Parameters
+        ----------
+        room_ids : Iterable[str]
+            処理を行う部屋のidのリスト。
+
+        action : Callable[[AsyncRoom], Awaitable[Any]]
+            部屋のclientを受け取り、その部屋に対する処理を行うコルーチン関数。
+
+        max_concurrency : int, default 10
+            同時に実行する処理の最大数。
+
+        Yields
+        -------
+        room_result : RoomResult
+            部屋毎の処理結果。処理が失敗した場合も例外は出さず、RoomResult.exceptionに格納されます。
+
+        Raises
+        ----------
+        ValueError
+            max_concurrencyが1未満の場合。
+
+        Note
+        ----
+        API呼び出し回数
+            actionが行うAPI呼び出し回数 × 部屋数
+
+            引数rate_limiterを指定したclientの場合は、その呼び出し頻度の制限に従います。
+
+        """
+
+        rooms = (self.create_room_client(room_id) for room_id in room_ids)
+        return _async_fan_out(rooms, action, max_concurrency)
+
+    async def download_media(
+        self, urls: Iterable[str], directory: str, max_concurrency: int = 4
+    ) -> Dict[str, str]:
+        """音声・画像ファイルのダウンロード
+
+            EmoMessageInfoのaudio_urlやimage_urlのファイルを並行してダウンロードし、directoryに保存します。
+            ダウンロードには、clientが保持しているセッションを使用します::
+
+                msgs = await room_client.get_msgs()
+                urls = [msg.audio_url for msg in msgs.messages if msg.media == "audio"]
+                paths = await client.download_media(urls, "media")
+
+            ファイルは一定のサイズ毎に分割して受信しながら保存するため、大きなファイルでもメモリ使用量は増えません。
+
+            ファイル名はファイルの内容のハッシュ値(SHA-256)になり、同じ内容のファイルは1つだけ保存されます。
+            以前に同じURLからダウンロードしたファイルが保存されている場合は、ダウンロードを行いません。
+
+        Parameters
+        ----------
+        urls : Iterable[str]
+            ダウンロードするファイルのURLのリスト。重複したURLは1回のみダウンロードします。
+
+        directory : str
+            ファイルを保存するディレクトリ。存在しない場合は作成されます。
+
+        max_concurrency : int, default 4
+            同時に行うダウンロードの最大数。
+
+        Returns
+        -------
+        paths : Dict[str, str]
+            URLと、保存したファイルのパスの対応。
+
+        Raises
+        ----------
+        EmoPlatformError
+            ダウンロードが失敗した場合。その場合、実行中の他のダウンロードは中止されます。
+
+        ValueError
+            max_concurrencyが1未満の場合。
+
+        Note
+        ----
+        API呼び出し回数
+            0回(ダウンロードしたファイルのURLへのリクエストのみ)
+
+        """
+
+        # The directory is created in a worker thread, as the files are saved.
+        store = await asyncio.get_event_loop().run_in_executor(
+            None, _MediaStore, directory
+        )
+        return await _async_download_all(
+            urls, partial(self._download_media, store), max_concurrency
+        )
+
+    async def _download_media(self, store: _MediaStore, url: str) -> str:
+        path = await asyncio.get_event_loop().run_in_executor(None, store.lookup, url)
+        if path is not None:
+            return path
+        timeout = aiohttp.ClientTimeout(
+            total=_get_remaining_time(),
+            sock_connect=self._connect_timeout,
+            sock_read=self._read_timeout,
+        )
+        # The media is not served by the api, so the access token is not sent.
+        async with self._get_session().get(url, timeout=timeout) as response:
+            with _aiohttp_error_handler(response.reason):
+                response.raise_for_status()
+            return await store.async_save(
+                url, response.content.iter_chunked(_CHUNK_SIZE)
+            )
+
     async def get_stamps_list(self) -> EmoStampsInfo:
         """利用可能なスタンプ一覧の取得
 
@@ -422,8 +957,7 @@ class AsyncClient:
 
         """
 
-        response = await self._get("/v1/stamps")
-        return EmoStampsInfo(**response)
+        return await self._get_model("/v1/stamps", EmoStampsInfo, _cache_group="stamps")
 
     async def get_motions_list(self) -> EmoMotionsInfo:
         """利用可能なプリセットモーション一覧の取得
@@ -447,8 +981,9 @@ class AsyncClient:
 
         """
 
-        response = await self._get("/v1/motions")
-        return EmoMotionsInfo(**response)
+        return await self._get_model(
+            "/v1/motions", EmoMotionsInfo, _cache_group="motions"
+        )
 
     async def get_webhook_setting(self) -> EmoWebhookInfo:
         """現在設定されているWebhookの情報の取得
@@ -473,7 +1008,7 @@ class AsyncClient:
 
         """
 
-        response = await self._get("/v1/webhook")
+        response = await self._get("/v1/webhook", _cache_group="webhook")
         return EmoWebhookInfo(**response)
 
     async def change_webhook_setting(self, webhook: WebHook) -> EmoWebhookInfo:
@@ -507,6 +1042,7 @@ class AsyncClient:
 
         payload = {"description": webhook.description, "url": webhook.url}
         response = await self._put("/v1/webhook", json.dumps(payload))
+        self._invalidate_cache("webhook")
         return EmoWebhookInfo(**response)
 
     async def register_webhook_event(self, events: List[str]) -> EmoWebhookInfo:
@@ -544,6 +1080,7 @@ class AsyncClient:
 
         payload = {"events": events}
         response = await self._put("/v1/webhook/events", json.dumps(payload))
+        self._invalidate_cache("webhook")
         return EmoWebhookInfo(**response)
 
     async def create_webhook_setting(self, webhook: WebHook) -> EmoWebhookInfo:
@@ -576,6 +1113,7 @@ class AsyncClient:
 
         payload = {"description": webhook.description, "url": webhook.url}
         response = await self._post("/v1/webhook", json.dumps(payload))
+        self._invalidate_cache("webhook")
         return EmoWebhookInfo(**response)
 
     async def delete_webhook_setting(self) -> EmoWebhookInfo:
@@ -603,6 +1141,7 @@ class AsyncClient:
         """
 
         response = await self._delete("/v1/webhook")
+        self._invalidate_cache("webhook")
         return EmoWebhookInfo(**response)
 
     def event(
@@ -643,11 +1182,11 @@ class AsyncClient:
 
         def decorator(func):
 
-            if event not in self._client._webhook_events_cb:
-                self._client._webhook_events_cb[event] = {}
+            if event not in self._webhook_events_cb:
+                self._webhook_events_cb[event] = {}
 
             for room_id in room_id_list:
-                self._client._webhook_events_cb[event][room_id] = func
+                self._webhook_events_cb[event][room_id] = func
 
         return decorator
 
@@ -691,7 +1230,7 @@ class AsyncClient:
         """
 
         response = await self.register_webhook_event(
-            list(self._client._webhook_events_cb.keys())
+            list(self._webhook_events_cb.keys())
         )
         return response.secret
 
@@ -789,7 +1328,23 @@ class AsyncClient:
 
         """
 
-        return self._client.get_cb_func(body)
+        emo_webhook_body = EmoWebhookBody(**body)
+        if emo_webhook_body.request_id not in self._request_id_deque:
+            try:
+                event_cb = self._webhook_events_cb[emo_webhook_body.event]
+            except KeyError as e:
+                raise WebhookCallbackError("event") from e
+            room_id = emo_webhook_body.uuid
+            if room_id in event_cb:
+                cb_func = event_cb[room_id]
+            elif self._DEFAULT_ROOM_ID in event_cb:
+                cb_func = event_cb[self._DEFAULT_ROOM_ID]
+            else:
+                raise WebhookCallbackError("room")
+            self._request_id_deque.append(emo_webhook_body.request_id)
+            return cb_func, emo_webhook_body
+        else:
+            raise WebhookRequestError("Webhook request id is duplicated")
 
 
 class BizAsyncClient(AsyncClient):
@@ -801,7 +1356,7 @@ class BizAsyncClient(AsyncClient):
         このクラスは使用せずに、継承先である :class:`BizBasicAsyncClient` あるいは :class:`BizAdvancedAsyncClient` をお使いください。
     """
 
-    _PLAN = BizClient._PLAN
+    _PLAN = "Business"
 
     async def get_account_info(self) -> EmoBizAccountInfo:  # type: ignore[override]
         """アカウント情報の取得
@@ -879,6 +1434,7 @@ class BizAsyncClient(AsyncClient):
 
         payload = asdict(acount)
         response = await self._put("/v1/me", json.dumps(payload))
+        self._invalidate_cache("me")
         return EmoBizAccountInfo(**response)
 
     async def get_rooms_list(self, api_key: str) -> EmoRoomInfo:  # type: ignore[override]
@@ -913,7 +1469,7 @@ class BizAsyncClient(AsyncClient):
 
         """
 
-        with self._client._add_apikey2header(api_key):
+        with self._add_apikey2header(api_key):
             return await super().get_rooms_list()
 
     async def get_rooms_id(self, api_key: str) -> List[str]:  # type: ignore[override]
@@ -949,7 +1505,7 @@ class BizAsyncClient(AsyncClient):
         """
 
         rooms_info = await self.get_rooms_list(api_key)
-        return self._client._get_rooms_id(rooms_info)
+        return self._get_rooms_id(rooms_info)
 
     async def get_stamps_list(self, api_key: str) -> EmoStampsInfo:  # type: ignore[override]
         """利用可能なスタンプ一覧の取得
@@ -981,7 +1537,7 @@ class BizAsyncClient(AsyncClient):
 
         """
 
-        with self._client._add_apikey2header(api_key):
+        with self._add_apikey2header(api_key):
             return await super().get_stamps_list()
 
     async def get_broadcast_msgs_list(self) -> EmoBroadcastInfoList:
@@ -1007,8 +1563,7 @@ class BizAsyncClient(AsyncClient):
 
         """
 
-        response = await self._get("/v1/broadcast_messages")
-        return EmoBroadcastInfoList(**response)
+        return await self._get_model("/v1/broadcast_messages", EmoBroadcastInfoList)
 
     async def get_broadcast_msg_details(self, message_id: int) -> EmoBroadcastInfo:
         """配信メッセージの詳細の取得
@@ -1080,10 +1635,62 @@ class BizAsyncClient(AsyncClient):
         payload = asdict(message)
         if message.immediate:
             payload.pop("executed_at")
-        with self._client._add_apikey2header(api_key):
+        with self._add_apikey2header(api_key):
             response = await self._post("/v1/broadcast_messages", json.dumps(payload))
         return EmoBroadcastMessage(**response)
 
+    def send_to_rooms(  # type: ignore[override]
+        self,
+        api_key: str,
+        room_ids: Iterable[str],
+        action: Callable[[Any], Awaitable[Any]],
+        max_concurrency: int = 10,
+    ) -> AsyncIterator[RoomResult]:
+        """複数の部屋に対する処理の並行実行
+
+            部屋毎に作成した部屋のclientを引数として、actionを並行して呼び出します。
+            処理が終わった部屋から順に、結果を返します。
+
+        Parameters
+        ----------
+        api_key : str
+            法人向けAPIキー
+
+        room_ids : Iterable[str]
+            処理を行う部屋のidのリスト。
+
+        action : Callable[[Any], Awaitable[Any]]
+            部屋のclientを受け取り、その部屋に対する処理を行うコルーチン関数。
+
+        max_concurrency : int, default 10
+            同時に実行する処理の最大数。
+
+        Yields
+        -------
+        room_result : RoomResult
+            部屋毎の処理結果。処理が失敗した場合も例外は出さず、RoomResult.exceptionに格納されます。
+
+        Raises
+        ----------
+        ValueError
+            max_concurrencyが1未満の場合。
+
+        Note
+        ----
+        API呼び出し回数
+            actionが行うAPI呼び出し回数 × 部屋数
+
+            引数rate_limiterを指定したclientの場合は、その呼び出し頻度の制限に従います。
+
+        """
+
+        # create_room_client of BizBasicAsyncClient and BizAdvancedAsyncClient takes api_key
+        rooms = (
+            self.create_room_client(api_key, room_id)  # type: ignore[call-arg]
+            for room_id in room_ids
+        )
+        return _async_fan_out(rooms, action, max_concurrency)
+
 
 class BizBasicAsyncClient(BizAsyncClient):
     """各種apiを呼び出す非同期版のclient(Business Basic版)
@@ -1124,7 +1731,7 @@ class BizBasicAsyncClient(BizAsyncClient):
 
     """
 
-    _PLAN = BizBasicClient._PLAN
+    _PLAN = "Business Basic"
 
     def create_room_client(self, api_key: str, room_id: str):  # type: ignore[override]
         """部屋固有の各種apiを呼び出すclientの作成
@@ -1244,7 +1851,7 @@ class BizBasicAsyncClient(BizAsyncClient):
         raise UnavailableError(self._PLAN)
 
     def event(
-        self, event: str, room_id_list: List[str] = [Client._DEFAULT_ROOM_ID]
+        self, event: str, room_id_list: List[str] = [AsyncClient._DEFAULT_ROOM_ID]
     ) -> NoReturn:
         """Webhookの指定のeventが通知されたときに呼び出す関数の登録
 
@@ -1327,7 +1934,7 @@ class BizAdvancedAsyncClient(BizAsyncClient):
 
     """
 
-    _PLAN = BizAdvancedClient._PLAN
+    _PLAN = "Business Advanced"
 
     def create_room_client(self, api_key: str, room_id: str):  # type: ignore[override]
         """部屋固有の各種apiを呼び出すclientの作成
@@ -1393,7 +2000,7 @@ class BizAdvancedAsyncClient(BizAsyncClient):
 
         """
 
-        with self._client._add_apikey2header(api_key):
+        with self._add_apikey2header(api_key):
             return await super().get_webhook_setting()
 
     async def change_webhook_setting(  # type: ignore[override]
@@ -1433,7 +2040,7 @@ class BizAdvancedAsyncClient(BizAsyncClient):
 
         """
 
-        with self._client._add_apikey2header(api_key):
+        with self._add_apikey2header(api_key):
             return await super().change_webhook_setting(webhook)
 
     async def register_webhook_event(  # type: ignore[override]
@@ -1477,7 +2084,7 @@ class BizAdvancedAsyncClient(BizAsyncClient):
 
         """
 
-        with self._client._add_apikey2header(api_key):
+        with self._add_apikey2header(api_key):
             return await super().register_webhook_event(events)
 
     async def create_webhook_setting(  # type: ignore[override]
@@ -1516,7 +2123,7 @@ class BizAdvancedAsyncClient(BizAsyncClient):
 
         """
 
-        with self._client._add_apikey2header(api_key):
+        with self._add_apikey2header(api_key):
             return await super().create_webhook_setting(webhook)
 
     async def delete_webhook_setting(self, api_key: str) -> EmoWebhookInfo:  # type: ignore[override]
@@ -1551,7 +2158,7 @@ class BizAdvancedAsyncClient(BizAsyncClient):
 
         """
 
-        with self._client._add_apikey2header(api_key):
+        with self._add_apikey2header(api_key):
             return await super().delete_webhook_setting()
 
     async def start_webhook_event(self, api_key: str) -> str:  # type: ignore[override]
@@ -1602,7 +2209,7 @@ class BizAdvancedAsyncClient(BizAsyncClient):
         """
 
         response = await self.register_webhook_event(
-            api_key, list(self._client._webhook_events_cb.keys())
+            api_key, list(self._webhook_events_cb.keys())
         )
         return response.secret
 
@@ -1644,7 +2251,7 @@ class BizAdvancedAsyncClient(BizAsyncClient):
             1回 + 1回(access tokenが切れていた場合)
 
         """
-        with self._client._add_apikey2header(api_key):
+        with self._add_apikey2header(api_key):
             data = aiohttp.MultipartWriter("form-data")
             part = data.append(endpoint)
             part.set_content_disposition("form-data", name="endpoint")
@@ -1674,7 +2281,7 @@ class AsyncRoom:
         self._base_client = base_client
         self.room_id = room_id
 
-    async def get_msgs(self, ts: int = None) -> EmoMsgsInfo:
+    async def get_msgs(self, ts: Optional[int] = None) -> EmoMsgsInfo:
         """部屋に投稿されたメッセージの取得
 
         Parameters
@@ -1710,6 +2317,99 @@ class AsyncRoom:
         )
         return EmoMsgsInfo(**response)
 
+    def iter_msgs(
+        self, since: Optional[int] = None, until: Optional[int] = None
+    ) -> AsyncIterator[EmoMessageInfo]:
+        """部屋に投稿されたメッセージの順次取得
+
+            部屋に投稿されたメッセージを新しいものから順に1件ずつ返します。
+            ページの境界は自動で処理され、現在のページを処理している間に次のページを別のタスクで取得します。
+            保持するのは最大2ページ分のみのため、長期間の履歴を読む場合もメモリ使用量は増えません::
+
+                async for msg in room_client.iter_msgs(since=20210701000000000):
+                    print(msg.sequence, msg.message)
+
+        Parameters
+        ----------
+        since : int or None
+            指定した場合は、その時刻以降のメッセージのみを取得します。
+
+                指定方法：2021/07/01 12:30:45以降なら、20210701123045000
+
+        until : int or None
+            指定した場合は、その時刻より前のメッセージのみを取得します。指定方法はsinceと同じです。
+
+        Yields
+        -------
+        msg : EmoMessageInfo
+            投稿されたメッセージの情報。
+
+        Raises
+        ----------
+        EmoPlatformError
+            関数内部で行っているAPI呼び出しが失敗した場合。
+
+        Note
+        ----
+        API呼び出し回数
+            取得したページ数 + 1回(access tokenが切れていた場合)
+
+        """
+
+        return _async_iter_msgs(self.get_msgs, since, until)
+
+    def tail_msgs(
+        self,
+        after: Optional[int] = None,
+        min_interval: float = 1,
+        max_interval: float = 30,
+    ) -> AsyncIterator[EmoMessageInfo]:
+        """部屋に新しく投稿されたメッセージの順次取得
+
+            定期的に :func:`get_msgs` を呼び出し、最後に取得したメッセージより新しいものだけを古いものから順に1件ずつ返します。
+            webhookを受信できない環境で、新しいメッセージを監視する場合に使用します::
+
+                async for msg in room_client.tail_msgs():
+                    print(msg.sequence, msg.message)
+
+            新しいメッセージがない間は呼び出し間隔をmax_intervalまで2倍ずつ延ばし、新しいメッセージを取得するとmin_intervalに戻します。
+            呼び出し間隔の間はawaitで待機します。
+
+            1回の呼び出しで取得したメッセージが全て新しいものだった場合は、取得できていないメッセージがあるとみなし、
+            最後に取得したメッセージまで遡って自動で取得します。
+
+        Parameters
+        ----------
+        after : int or None
+            最後に取得したメッセージのsequence。指定した場合は、それより新しいメッセージから取得します。
+
+            指定しない場合は、呼び出した時点の最新のメッセージより新しいもののみを取得します。
+
+        min_interval : float, default 1
+            API呼び出しの最短の間隔(秒)。
+
+        max_interval : float, default 30
+            API呼び出しの最長の間隔(秒)。
+
+        Yields
+        -------
+        msg : EmoMessageInfo
+            新しく投稿されたメッセージの情報。
+
+        Raises
+        ----------
+        EmoPlatformError
+            関数内部で行っているAPI呼び出しが失敗した場合。
+
+        Note
+        ----
+        API呼び出し回数
+            呼び出し間隔毎に1回 + 遡って取得したページ数 + 1回(access tokenが切れていた場合)
+
+        """
+
+        return _async_tail_msgs(self.get_msgs, after, min_interval, max_interval)
+
     async def get_sensors_list(self) -> EmoSensorsInfo:
         """BOCCO emoとペアリングされているセンサの一覧の取得
 
@@ -1738,7 +2438,7 @@ class AsyncRoom:
         """
 
         response = await self._base_client._get(
-            "/v1/rooms/" + self.room_id + "/sensors"
+            "/v1/rooms/" + self.room_id + "/sensors", _cache_group="sensors"
         )
         return EmoSensorsInfo(**response)
 
@@ -1778,7 +2478,7 @@ class AsyncRoom:
         )
         return EmoRoomSensorInfo(**response)
 
-    async def send_audio_msg(self, audio_data_path: str) -> EmoMessageInfo:
+    async def send_audio_msg(self, audio_data_path: _MediaData) -> EmoMessageInfo:
         """音声ファイルの部屋への投稿
 
         Attention
@@ -1790,9 +2490,12 @@ class AsyncRoom:
 
         Parameters
         ----------
-        audio_data_path : str
+        audio_data_path : str or bytes or bytearray or memoryview or BinaryIO
             投稿する音声ファイルの絶対パス。
 
+            あるいは、音声ファイルの内容。bytes, bytearray, memoryviewの場合は、送信前にbytesへの変換(コピー)を行わずにそのまま渡します。
+            読み込み可能なバイナリストリームの場合は、先頭から末尾までを送信します。
+
         Returns
         -------
         response : EmoMessageInfo
@@ -1803,6 +2506,9 @@ class AsyncRoom:
         EmoPlatformError
             関数内部で行っているAPI呼び出しが失敗した場合。
 
+        ValidationError
+            ファイルが1MBを超えている場合、あるいはMP3, M4Aでない場合。(clientの引数validateがTrueの場合のみ)
+
         Note
         ----
         呼び出しているAPI
@@ -1813,17 +2519,22 @@ class AsyncRoom:
 
         """
 
-        with open(audio_data_path, "rb") as audio_data:
-            data = aiohttp.FormData()
-            data.add_field("audio", audio_data, content_type="multipart/form-data")
-            response = await self._base_client._post(
+        async with _async_open_media(
+            audio_data_path, "audio", self._base_client._validate
+        ) as (
+            filename,
+            audio_data,
+        ):
+            return await self._post_media(
                 "/v1/rooms/" + self.room_id + "/messages/audio",
-                data=data,
-                content_type=PostContentType.MULTIPART_FORMDATA,
+                "audio",
+                filename,
+                audio_data,
             )
-            return EmoMessageInfo(**response)
 
-    async def send_image(self, image_data_path: str) -> EmoMessageInfo:
+    async def send_image(
+        self, image_data_path: _MediaData, compress: bool = False
+    ) -> EmoMessageInfo:
         """画像ファイルの部屋への投稿
 
         Attention
@@ -1835,9 +2546,18 @@ class AsyncRoom:
 
         Parameters
         ----------
-        image_data_path : str
+        image_data_path : str or bytes or bytearray or memoryview or BinaryIO
             投稿する画像ファイルの絶対パス。
 
+            あるいは、画像ファイルの内容。bytes, bytearray, memoryviewの場合は、送信前にbytesへの変換(コピー)を行わずにそのまま渡します。
+            読み込み可能なバイナリストリームの場合は、先頭から末尾までを送信します。
+
+        compress : bool, default False
+            Trueにした場合、1MBを超える画像を1MB以下になるまで再圧縮してから送信します。
+
+            JPGは画質を段階的に(最低50まで)下げ、それでも超える場合は縦横比を保ったまま縮小します。PNGは縮小のみ行います。
+            使用するには、Pillowをインストールしてください。( pip install emo-platform-api-sdk[image] )
+
         Returns
         -------
         response : EmoMessageInfo
@@ -1848,6 +2568,9 @@ class AsyncRoom:
         EmoPlatformError
             関数内部で行っているAPI呼び出しが失敗した場合。
 
+        ValidationError
+            ファイルが1MBを超えている場合、あるいはJPG, PNGでない場合。(clientの引数validateがTrueの場合のみ)
+
         Note
         ----
         呼び出しているAPI
@@ -1858,15 +2581,41 @@ class AsyncRoom:
 
         """
 
-        with open(image_data_path, "rb") as image_data:
-            data = aiohttp.FormData()
-            data.add_field("image", image_data, content_type="multipart/form-data")
-            response = await self._base_client._post(
+        if compress:
+            # Pillow runs in a worker thread, so that it does not block the event loop.
+            image_data_path = await asyncio.get_event_loop().run_in_executor(
+                None, _compress_image, image_data_path
+            )
+        async with _async_open_media(
+            image_data_path, "image", self._base_client._validate
+        ) as (
+            filename,
+            image_data,
+        ):
+            return await self._post_media(
                 "/v1/rooms/" + self.room_id + "/messages/image",
-                data=data,
-                content_type=PostContentType.MULTIPART_FORMDATA,
+                "image",
+                filename,
+                image_data,
+            )
+
+    async def _post_media(
+        self, path: str, field: str, filename: str, media_data: _UploadData
+    ) -> EmoMessageInfo:
+        def form_data() -> aiohttp.FormData:
+            data = aiohttp.FormData()
+            data.add_field(
+                field,
+                _attempt_data(media_data),
+                filename=filename,
+                content_type="multipart/form-data",
             )
-            return EmoMessageInfo(**response)
+            return data
+
+        response = await self._base_client._post(
+            path, data=form_data, content_type=PostContentType.MULTIPART_FORMDATA
+        )
+        return EmoMessageInfo(**response)
 
     async def send_msg(self, msg: str) -> EmoMessageInfo:
         """テキストメッセージの部屋への投稿
@@ -1974,6 +2723,9 @@ class AsyncRoom:
             関数内部で行っているAPI呼び出しが失敗した場合。
             (モーションのデータ形式が誤っている場合も含みます)
 
+        ValidationError
+            モーションのデータ形式が誤っている場合。(clientの引数validateがTrueの場合のみ)
+
         Note
         ----
         呼び出しているAPI
@@ -1984,13 +2736,24 @@ class AsyncRoom:
 
         """
 
-        if type(motion_data) == str:
-            with open(motion_data) as f:
-                payload = json.load(f)
+        registry = self._base_client._motion_registry
+        # The file is read in a worker thread, so that it does not block the event loop.
+        loop = asyncio.get_event_loop()
+        if isinstance(motion_data, str) and registry is not None:
+            # the request body is reused while the file is not modified
+            body = await loop.run_in_executor(
+                None, registry._get_body, motion_data, self._base_client._validate
+            )
         else:
-            payload = motion_data
+            if isinstance(motion_data, str):
+                payload = await loop.run_in_executor(None, _load_json, motion_data)
+            else:
+                payload = motion_data
+            if self._base_client._validate:
+                _validate_motion(payload)
+            body = json.dumps(payload)
         response = await self._base_client._post(
-            "/v1/rooms/" + self.room_id + "/motions", json.dumps(payload)
+            "/v1/rooms/" + self.room_id + "/motions", body
         )
         return EmoMessageInfo(**response)
 
@@ -2126,7 +2889,7 @@ class AsyncRoom:
         """
 
         response = await self._base_client._get(
-            "/v1/rooms/" + self.room_id + "/emo/settings"
+            "/v1/rooms/" + self.room_id + "/emo/settings", _cache_group="emo_settings"
         )
         return EmoSettingsInfo(**response)
 
@@ -2155,11 +2918,11 @@ class BizAsyncRoom(AsyncRoom):
         super().__init__(base_client=base_client, room_id=room_id)
         self.api_key = api_key
 
-    async def get_msgs(self, ts: int = None) -> EmoMsgsInfo:
-        with self._base_client._client._add_apikey2header(self.api_key):
+    async def get_msgs(self, ts: Optional[int] = None) -> EmoMsgsInfo:
+        with self._base_client._add_apikey2header(self.api_key):
             return await super().get_msgs(ts)
 
-    async def get_channel_msgs(self, ts: int = None) -> EmoMsgsInfo:
+    async def get_channel_msgs(self, ts: Optional[int] = None) -> EmoMsgsInfo:
         """チャンネルから部屋に投稿されたメッセージの取得
 
         Parameters
@@ -2186,41 +2949,84 @@ class BizAsyncRoom(AsyncRoom):
 
         """
 
-        with self._base_client._client._add_apikey2header(self.api_key):
+        with self._base_client._add_apikey2header(self.api_key):
             params = {"before": ts} if ts else {}
             response = await self._base_client._get(
                 "/v1/rooms/" + self.room_id + "/messages/channel", params=params
             )
             return EmoMsgsInfo(**response)
 
+    def iter_channel_msgs(
+        self, since: Optional[int] = None, until: Optional[int] = None
+    ) -> AsyncIterator[EmoMessageInfo]:
+        """チャンネルから部屋に投稿されたメッセージの順次取得
+
+            チャンネルから部屋に投稿されたメッセージを新しいものから順に1件ずつ返します。
+            ページの境界は自動で処理され、現在のページを処理している間に次のページを別のタスクで取得します。
+            保持するのは最大2ページ分のみのため、長期間の履歴を読む場合もメモリ使用量は増えません::
+
+                async for msg in room_client.iter_channel_msgs(since=20210701000000000):
+                    print(msg.sequence, msg.message)
+
+        Parameters
+        ----------
+        since : int or None
+            指定した場合は、その時刻以降のメッセージのみを取得します。
+
+                指定方法：2021/07/01 12:30:45以降なら、20210701123045000
+
+        until : int or None
+            指定した場合は、その時刻より前のメッセージのみを取得します。指定方法はsinceと同じです。
+
+        Yields
+        -------
+        msg : EmoMessageInfo
+            投稿されたメッセージの情報。
+
+        Raises
+        ----------
+        EmoPlatformError
+            関数内部で行っているAPI呼び出しが失敗した場合。
+
+        Note
+        ----
+        API呼び出し回数
+            取得したページ数 + 1回(access tokenが切れていた場合)
+
+        """
+
+        return _async_iter_msgs(self.get_channel_msgs, since, until)
+
     async def get_sensors_list(
         self,
     ) -> EmoSensorsInfo:
-        with self._base_client._client._add_apikey2header(self.api_key):
+        with self._base_client._add_apikey2header(self.api_key):
             return await super().get_sensors_list()
 
-    async def send_audio_msg(self, audio_data_path: str) -> EmoMessageInfo:
-        with self._base_client._client._add_apikey2header(self.api_key):
+    async def send_audio_msg(self, audio_data_path: _MediaData) -> EmoMessageInfo:
+        with self._base_client._add_apikey2header(self.api_key):
             return await super().send_audio_msg(audio_data_path)
 
-    async def send_image(self, image_data_path: str) -> EmoMessageInfo:
-        with self._base_client._client._add_apikey2header(self.api_key):
-            return await super().send_image(image_data_path)
+    async def send_image(
+        self, image_data_path: _MediaData, compress: bool = False
+    ) -> EmoMessageInfo:
+        with self._base_client._add_apikey2header(self.api_key):
+            return await super().send_image(image_data_path, compress)
 
     async def send_msg(self, msg: str) -> EmoMessageInfo:
-        with self._base_client._client._add_apikey2header(self.api_key):
+        with self._base_client._add_apikey2header(self.api_key):
             return await super().send_msg(msg)
 
     async def send_stamp(
         self, stamp_id: str, msg: Optional[str] = None
     ) -> EmoMessageInfo:
-        with self._base_client._client._add_apikey2header(self.api_key):
+        with self._base_client._add_apikey2header(self.api_key):
             return await super().send_stamp(stamp_id, msg)
 
     async def get_emo_settings(
         self,
     ) -> EmoSettingsInfo:
-        with self._base_client._client._add_apikey2header(self.api_key):
+        with self._base_client._add_apikey2header(self.api_key):
             return await super().get_emo_settings()
 
 
@@ -2334,25 +3140,25 @@ class BizAdvancedAsyncRoom(BizAsyncRoom):
     """
 
     async def get_sensor_values(self, sensor_id: str) -> EmoRoomSensorInfo:
-        with self._base_client._client._add_apikey2header(self.api_key):
+        with self._base_client._add_apikey2header(self.api_key):
             return await super().get_sensor_values(sensor_id)
 
     async def send_original_motion(
         self, motion_data: Union[str, dict]
     ) -> EmoMessageInfo:
-        with self._base_client._client._add_apikey2header(self.api_key):
+        with self._base_client._add_apikey2header(self.api_key):
             return await super().send_original_motion(motion_data)
 
     async def change_led_color(self, color: Color) -> EmoMessageInfo:
-        with self._base_client._client._add_apikey2header(self.api_key):
+        with self._base_client._add_apikey2header(self.api_key):
             return await super().change_led_color(color)
 
     async def move_to(self, head: Head) -> EmoMessageInfo:
-        with self._base_client._client._add_apikey2header(self.api_key):
+        with self._base_client._add_apikey2header(self.api_key):
             return await super().move_to(head)
 
     async def send_motion(self, motion_id: str) -> EmoMessageInfo:
-        with self._base_client._client._add_apikey2header(self.api_key):
+        with self._base_client._add_apikey2header(self.api_key):
             return await super().send_motion(motion_id)
 
     async def create_conversation(
@@ -2379,7 +3185,7 @@ class BizAdvancedAsyncRoom(BizAsyncRoom):
             1回 + 1回(access tokenが切れていた場合)
 
         """
-        with self._base_client._client._add_apikey2header(self.api_key):
+        with self._base_client._add_apikey2header(self.api_key):
             response = await self._base_client._post("/v1/rooms/" + self.room_id + "/conversations")
             return EmoPostConversation(**response)
 
@@ -2417,7 +3223,7 @@ class BizAdvancedAsyncRoom(BizAsyncRoom):
             1回 + 1回(access tokenが切れていた場合)
 
         """
-        with self._base_client._client._add_apikey2header(self.api_key):
+        with self._base_client._add_apikey2header(self.api_key):
             payload = {"speech_to_text": speech_to_text}
             response = await self._base_client._post("/v1/rooms/" + self.room_id + "/conversations/" + session_id + "/recording", json.dumps(payload))
             return EmoPostConversation(**response)
@@ -2452,6 +3258,9 @@ class BizAdvancedAsyncRoom(BizAsyncRoom):
         EmoPlatformError
             関数内部で行っているAPI呼び出しが失敗した場合。
 
+        ValidationError
+            textが1-250文字でない場合。(clientの引数validateがTrueの場合のみ)
+
         Note
         ----
         呼び出しているAPI
@@ -2461,7 +3270,9 @@ class BizAdvancedAsyncRoom(BizAsyncRoom):
             1回 + 1回(access tokenが切れていた場合)
 
         """
-        with self._base_client._client._add_apikey2header(self.api_key):
+        with self._base_client._add_apikey2header(self.api_key):
+            if self._base_client._validate:
+                _validate_text(text)
             payload = {"text": text, "display": display}
             response = await self._base_client._post("/v1/rooms/" + self.room_id + "/conversations/" + session_id + "/text", json.dumps(payload))
             return EmoPostConversation(**response)
@@ -0,0 +1,266 @@
+import asyncio
+import json
+import sqlite3
+import threading
+from typing import Iterable, List, Optional
+
+from emo_platform.api import Room
+from emo_platform.api_async import AsyncRoom
+from emo_platform.response import EmoMessageInfo
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    room_uuid TEXT NOT NULL,
+    sequence INTEGER NOT NULL,
+    unique_id TEXT NOT NULL,
+    user_uuid TEXT NOT NULL,
+    media TEXT NOT NULL,
+    body TEXT NOT NULL,
+    PRIMARY KEY (room_uuid, sequence)
+);
+CREATE INDEX IF NOT EXISTS messages_user ON messages (room_uuid, user_uuid, sequence);
+CREATE INDEX IF NOT EXISTS messages_media ON messages (room_uuid, media, sequence);
+"""
+
+
+class MessageArchive:
+    """部屋に投稿されたメッセージのローカル保存
+
+        部屋に投稿されたメッセージを、部屋のuuidとsequenceをキーとしてSQLiteのファイルに保存します。
+
+        :func:`sync` で前回保存したメッセージより新しいものだけを取得して追加し、
+        :func:`query` で保存したメッセージをAPI呼び出しを行わずに検索します::
+
+            with MessageArchive("messages.db") as archive:
+                archive.sync(room_client)
+                for msg in archive.query(room_client.room_id, media="audio"):
+                    print(msg.sequence, msg.audio_url)
+
+    Parameters
+    ----------
+    path : str
+        SQLiteのファイルのパス。存在しない場合は作成されます。":memory:"を指定した場合はメモリ上に保存します。
+
+    Note
+    ----
+    複数のスレッドから同じインスタンスを使用できます。
+
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.executescript(_SCHEMA)
+
+    def __enter__(self) -> "MessageArchive":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """SQLiteのファイルを閉じる"""
+
+        with self._lock:
+            self._conn.close()
+
+    def latest_sequence(self, room_uuid: str) -> Optional[int]:
+        """保存されている最新のメッセージのsequenceの取得
+
+        Parameters
+        ----------
+        room_uuid : str
+            部屋のuuid。
+
+        Returns
+        -------
+        sequence : int or None
+            最新のメッセージのsequence。その部屋のメッセージが保存されていない場合はNone。
+
+        """
+
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT MAX(sequence) FROM messages WHERE room_uuid = ?", (room_uuid,)
+            ).fetchone()
+        return row[0]
+
+    def store(self, room_uuid: str, msgs: Iterable[EmoMessageInfo]) -> int:
+        """メッセージの保存
+
+            同じsequenceのメッセージが既に保存されている場合は、上書きします。
+
+        Parameters
+        ----------
+        room_uuid : str
+            部屋のuuid。
+
+        msgs : Iterable[EmoMessageInfo]
+            保存するメッセージ。
+
+        Returns
+        -------
+        count : int
+            保存したメッセージの数。
+
+        """
+
+        with self._lock, self._conn:
+            return self._insert(room_uuid, msgs)
+
+    def _insert(self, room_uuid: str, msgs: Iterable[EmoMessageInfo]) -> int:
+        count = 0
+        for msg in msgs:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO messages VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    room_uuid,
+                    msg.sequence,
+                    msg.unique_id,
+                    msg.user.uuid,
+                    msg.media,
+                    msg.json(),
+                ),
+            )
+            count += 1
+        return count
+
+    def sync(self, room: Room) -> int:
+        """新しいメッセージの取得と保存
+
+            保存されている最新のメッセージより新しいメッセージのみを :func:`Room.iter_msgs <emo_platform.api.Room.iter_msgs>` で取得し、保存します。
+
+            取得したメッセージは1つのトランザクションで保存されるため、途中でAPI呼び出しが失敗した場合は何も保存されず、
+            次回の呼び出しで改めて取得されます。
+
+        Parameters
+        ----------
+        room : Room
+            メッセージを取得する部屋のclient。
+
+        Returns
+        -------
+        count : int
+            新しく保存したメッセージの数。
+
+        Raises
+        ----------
+        EmoPlatformError
+            関数内部で行っているAPI呼び出しが失敗した場合。
+
+        Note
+        ----
+        API呼び出し回数
+            取得したページ数 + 1回(access tokenが切れていた場合)
+
+        """
+
+        since = self._since(room.room_id)
+        # The pages are fetched without holding the lock,
+        # so that the other threads can use the archive meanwhile.
+        msgs = list(room.iter_msgs(since=since))
+        return self.store(room.room_id, msgs)
+
+    async def async_sync(self, room: AsyncRoom) -> int:
+        """新しいメッセージの取得と保存
+
+            :func:`sync` の非同期版です。メッセージは :func:`AsyncRoom.iter_msgs <emo_platform.api_async.AsyncRoom.iter_msgs>` で取得します。
+
+        Parameters
+        ----------
+        room : AsyncRoom
+            メッセージを取得する部屋のclient。
+
+        Returns
+        -------
+        count : int
+            新しく保存したメッセージの数。
+
+        Raises
+        ----------
+        EmoPlatformError
+            関数内部で行っているAPI呼び出しが失敗した場合。
+
+        Note
+        ----
+        API呼び出し回数
+            取得したページ数 + 1回(access tokenが切れていた場合)
+
+        """
+
+        # SQLite is used in a worker thread, so that it does not block the event loop.
+        loop = asyncio.get_event_loop()
+        since = await loop.run_in_executor(None, self._since, room.room_id)
+        # The lock is not held while awaiting, so the messages are buffered until the end.
+        msgs = [msg async for msg in room.iter_msgs(since=since)]
+        return await loop.run_in_executor(None, self.store, room.room_id, msgs)
+
+    def _since(self, room_uuid: str) -> Optional[int]:
+        latest = self.latest_sequence(room_uuid)
+        return latest + 1 if latest is not None else None
+
+    def query(
+        self,
+        room_uuid: str,
+        since: Optional[int] = None,
+        until: Optional[int] = None,
+        user_uuid: Optional[str] = None,
+        media: Optional[str] = None,
+        limit: Optional[int] = None,
+    ) -> List[EmoMessageInfo]:
+        """保存されているメッセージの検索
+
+            API呼び出しは行いません。
+
+        Parameters
+        ----------
+        room_uuid : str
+            部屋のuuid。
+
+        since : int or None
+            指定した場合は、その時刻以降のメッセージのみを返します。
+
+                指定方法：2021/07/01 12:30:45以降なら、20210701123045000
+
+        until : int or None
+            指定した場合は、その時刻より前のメッセージのみを返します。指定方法はsinceと同じです。
+
+        user_uuid : str or None
+            指定した場合は、そのメンバーが投稿したメッセージのみを返します。
+
+        media : str or None
+            指定した場合は、そのタイプ("text", "audio", "image", "stamp"など)のメッセージのみを返します。
+
+        limit : int or None
+            返すメッセージの最大数。
+
+        Returns
+        -------
+        msgs : List[EmoMessageInfo]
+            条件に一致したメッセージ。新しいものから順に並んでいます。
+
+        """
+
+        sql = "SELECT body FROM messages WHERE room_uuid = ?"
+        params: list = [room_uuid]
+        if user_uuid is not None:
+            sql += " AND user_uuid = ?"
+            params.append(user_uuid)
+        if media is not None:
+            sql += " AND media = ?"
+            params.append(media)
+        if since is not None:
+            sql += " AND sequence >= ?"
+            params.append(since)
+        if until is not None:
+            sql += " AND sequence < ?"
+            params.append(until)
+        sql += " ORDER BY sequence DESC"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [EmoMessageInfo(**json.loads(row[0])) for row in rows]
@@ -0,0 +1,207 @@
+import asyncio
+import base64
+import binascii
+import json
+import os
+import time
+from dataclasses import asdict
+from typing import Optional, Tuple
+
+from emo_platform.exceptions import TokenError
+from emo_platform.models import Tokens
+
+EMO_PLATFORM_PATH = os.path.abspath(os.path.dirname(__file__))
+
+
+def _get_jwt_expiration(token: str) -> Optional[float]:
+    # The signature is not verified: the claim is only used to schedule renewal.
+    segments = token.split(".")
+    if len(segments) != 3:
+        return None
+    payload = segments[1] + "=" * (-len(segments[1]) % 4)
+    try:
+        claims = json.loads(base64.urlsafe_b64decode(payload))
+    except (binascii.Error, ValueError):
+        return None
+    if not isinstance(claims, dict):
+        return None
+    exp = claims.get("exp")
+    if isinstance(exp, (int, float)) and not isinstance(exp, bool):
+        return float(exp)
+    return None
+
+
+class TokenManager:
+    _TOKEN_FILE = f"{EMO_PLATFORM_PATH}/tokens/emo-platform-api.json"
+    _PREVIOUS_TOKEN_FILE = f"{EMO_PLATFORM_PATH}/tokens/emo-platform-api_previous.json"
+    _INITIAL_TOKENS = {"access_token": "", "refresh_token": ""}
+    _INITIAL_SET_TOKENS = {"os": _INITIAL_TOKENS, "args": _INITIAL_TOKENS}
+
+    def __init__(
+        self,
+        tokens: Optional[Tokens] = None,
+        token_file_path: Optional[str] = None,
+        use_cached_credentials=False,
+        access_token_ttl: Optional[float] = None,
+    ):
+        self._use_cached_credentials = use_cached_credentials
+        self._init_expiration(access_token_ttl)
+        if not self._use_cached_credentials:
+            self._set_token_file_path(token_file_path)
+            self._load_tokens(tokens)
+        else:
+            if tokens:
+                self.tokens = tokens
+            else:
+                raise TokenError(
+                    "Please give tokens as an argument using 'emo_platform.Tokens'"
+                )
+
+    def _init_expiration(self, access_token_ttl: Optional[float]) -> None:
+        self._access_token_ttl = access_token_ttl
+        self._issued_at = time.time()
+        self._expiration: Tuple[str, Optional[float]] = ("", None)
+
+    def set_tokens(self, access_token: str, refresh_token: str) -> None:
+        self.tokens.access_token = access_token
+        self.tokens.refresh_token = refresh_token
+        self._issued_at = time.time()
+
+    def get_expiration(self) -> Optional[float]:
+        """access tokenの有効期限(UNIX時間)の取得
+
+        access tokenがJWTの場合はexp claimの値を、そうでない場合は取得時刻にaccess_token_ttlを加えた値を返します。
+        どちらも分からない場合はNoneを返します。
+        """
+
+        access_token = self.tokens.access_token
+        cached_token, expiration = self._expiration
+        if access_token != cached_token:
+            expiration = _get_jwt_expiration(access_token)
+            self._expiration = (access_token, expiration)
+        if expiration is None and self._access_token_ttl is not None:
+            return self._issued_at + self._access_token_ttl
+        return expiration
+
+    def is_expiring(self, margin: float) -> bool:
+        expiration = self.get_expiration()
+        return expiration is not None and time.time() + margin >= expiration
+
+    def _load_tokens(self, tokens: Optional[Tokens]) -> None:
+        self._previous_set_tokens_dict = self._load_previous_set_tokens_file()
+        self._current_set_tokens = self._get_current_set_tokens(tokens)
+        self._update_previous_set_tokens_file(tokens)
+        self.tokens = self._get_latest_tokens()
+        self._dump_tokens(asdict(self.tokens))
+
+    def _set_token_file_path(self, token_file_path) -> None:
+        if token_file_path:
+            self._TOKEN_FILE = f"{token_file_path}/emo-platform-api.json"
+            self._PREVIOUS_TOKEN_FILE = (
+                f"{token_file_path}/emo-platform-api_previous.json"
+            )
+
+    def _get_current_set_tokens(self, tokens: Optional[Tokens]) -> Tokens:
+        if tokens:
+            return tokens
+        else:
+            return self._get_current_os_env_tokens()
+
+    def _get_current_os_env_tokens(self) -> Tokens:
+        access_token = self._get_currnet_os_env_access_token()
+        refresh_token = self._get_currnet_os_env_refresh_token()
+        return Tokens(**{"refresh_token": refresh_token, "access_token": access_token})  # type: ignore
+
+    def _get_currnet_os_env_access_token(self) -> str:
+        try:
+            return os.environ["EMO_PLATFORM_API_ACCESS_TOKEN"]
+        except KeyError:
+            return self._previous_set_tokens_dict["os"]["access_token"]
+
+    def _get_currnet_os_env_refresh_token(self) -> str:
+        try:
+            return os.environ["EMO_PLATFORM_API_REFRESH_TOKEN"]
+        except KeyError:
+            return self._previous_set_tokens_dict["os"]["refresh_token"]
+
+    def _load_previous_set_tokens_file(self) -> dict:
+        try:
+            with open(self._PREVIOUS_TOKEN_FILE) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return self._INITIAL_SET_TOKENS
+
+    def _update_previous_set_tokens_file(self, tokens) -> None:
+        how2set = "os" if tokens is None else "args"
+        self._previous_set_tokens = Tokens(**self._previous_set_tokens_dict[how2set])  # type: ignore
+        self._previous_set_tokens_dict[how2set] = asdict(self._current_set_tokens)
+
+        with open(self._PREVIOUS_TOKEN_FILE, "w") as f:
+            json.dump(self._previous_set_tokens_dict, f)
+
+    def _get_latest_tokens(self) -> Tokens:
+        # compare new set tokens with old ones
+        if self._current_set_tokens == self._previous_set_tokens:
+            try:
+                with open(self._TOKEN_FILE) as f:
+                    return Tokens(**json.load(f))  # type: ignore
+            except FileNotFoundError:
+                return self._current_set_tokens
+        else:  # reset json file when set tokens updated
+            return self._current_set_tokens
+
+    def _dump_tokens(self, tokens: dict) -> None:
+        with open(self._TOKEN_FILE, "w") as f:
+            json.dump(tokens, f)
+
+    def save_tokens(self) -> None:
+        if not self._use_cached_credentials:
+            self._dump_tokens(asdict(self.tokens))
+
+
+class AsyncTokenManager(TokenManager):
+    """非同期版のclientで使用するトークンの管理
+
+    トークンファイルの読み書きはイベントループをブロックしないよう、executor上で行います。
+    初期化時にはファイルの読み込みを行わず、最初に :func:`load_tokens` が呼ばれた時に読み込みます。
+    """
+
+    def __init__(
+        self,
+        tokens: Optional[Tokens] = None,
+        token_file_path: Optional[str] = None,
+        use_cached_credentials=False,
+        access_token_ttl: Optional[float] = None,
+    ):
+        self._use_cached_credentials = use_cached_credentials
+        self._init_expiration(access_token_ttl)
+        self._set_tokens = tokens
+        self._load_lock: Optional[asyncio.Lock] = None
+        self.loaded = False
+        if not self._use_cached_credentials:
+            self._set_token_file_path(token_file_path)
+        else:
+            if tokens:
+                self.tokens = tokens
+                self.loaded = True
+            else:
+                raise TokenError(
+                    "Please give tokens as an argument using 'emo_platform.Tokens'"
+                )
+
+    async def load_tokens(self) -> None:
+        if self.loaded:
+            return
+        if self._load_lock is None:
+            self._load_lock = asyncio.Lock()
+        async with self._load_lock:
+            if not self.loaded:
+                loop = asyncio.get_event_loop()
+                await loop.run_in_executor(None, self._load_tokens, self._set_tokens)
+                self._issued_at = time.time()
+                self.loaded = True
+
+    async def save_tokens(self) -> None:  # type: ignore[override]
+        if not self._use_cached_credentials:
+            loop = asyncio.get_event_loop()
+            await loop.run_in_executor(None, self._dump_tokens, asdict(self.tokens))
@@ -0,0 +1,108 @@
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Iterable,
+    Iterator,
+    Optional,
+)
+
+
+@dataclass
+class RoomResult:
+    """複数の部屋に対して実行した処理の、部屋毎の結果。"""
+
+    room_id: str
+    """
+    部屋のid
+    """
+
+    result: Any = None
+    """
+    処理の戻り値(send_msgの場合はEmoMessageInfo)
+    """
+
+    exception: Optional[Exception] = None
+    """
+    処理が失敗した場合に出たエラー
+    """
+
+    @property
+    def ok(self) -> bool:
+        """処理が成功したかどうか"""
+        return self.exception is None
+
+
+def _run_action(room: Any, action: Callable[[Any], Any]) -> RoomResult:
+    try:
+        result = action(room)
+    except Exception as e:
+        return RoomResult(room.room_id, exception=e)
+    return RoomResult(room.room_id, result=result)
+
+
+def _fan_out(
+    rooms: Iterable[Any],
+    action: Callable[[Any], Any],
+    max_workers: int,
+    ordered: bool,
+) -> Iterator[RoomResult]:
+    if max_workers < 1:
+        raise ValueError("max_workers must be 1 or more")
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # The caller's context (e.g. the deadline) is copied to each worker thread.
+        futures = [
+            executor.submit(contextvars.copy_context().run, _run_action, room, action)
+            for room in rooms
+        ]
+        try:
+            for future in futures if ordered else as_completed(futures):
+                yield future.result()
+        finally:
+            # Rooms which have not started yet are skipped when the iteration stops.
+            for future in futures:
+                future.cancel()
+
+
+async def _async_fan_out(
+    rooms: Iterable[Any],
+    action: Callable[[Any], Awaitable[Any]],
+    max_concurrency: int,
+) -> AsyncIterator[RoomResult]:
+    if max_concurrency < 1:
+        raise ValueError("max_concurrency must be 1 or more")
+    room_iter = iter(rooms)
+    queue: asyncio.Queue = asyncio.Queue()
+
+    async def worker() -> None:
+        # Each worker takes the next room when it finishes the previous one,
+        # so at most max_concurrency actions run at the same time.
+        try:
+            for room in room_iter:
+                try:
+                    result = await action(room)
+                except Exception as e:
+                    queue.put_nowait(RoomResult(room.room_id, exception=e))
+                else:
+                    queue.put_nowait(RoomResult(room.room_id, result=result))
+        finally:
+            queue.put_nowait(None)
+
+    workers = [asyncio.ensure_future(worker()) for _ in range(max_concurrency)]
+    try:
+        running = len(workers)
+        while running:
+            room_result = await queue.get()
+            if room_result is None:
+                running -= 1
+            else:
+                yield room_result
+    finally:
+        for task in workers:
+            task.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
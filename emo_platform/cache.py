@@ -0,0 +1,207 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Mapping, Optional, Tuple
+
+_CacheKey = Tuple[Optional[str], Optional[str], str, Hashable]
+
+
+class ResponseCache:
+    """読み取り専用のAPIのレスポンスのキャッシュ
+
+        clientの引数response_cacheに指定すると、以下のAPIの結果を一定時間保存し、
+        その間に同じAPIを呼び出した場合はAPI呼び出しを行わずに保存した結果を返します。
+
+        キャッシュの対象となるAPIと、その種類名は以下の通りです。
+
+        ============ ====================================================
+        種類名        対象のメソッド
+        ============ ====================================================
+        me           get_account_info
+        rooms        get_rooms_list, get_rooms_id
+        stamps       get_stamps_list
+        motions      get_motions_list
+        webhook      get_webhook_setting
+        sensors      Room.get_sensors_list
+        emo_settings Room.get_emo_settings
+        ============ ====================================================
+
+    Parameters
+    ----------
+    maxsize : int, default 256
+        保存するレスポンスの最大数。超えた場合は、最も長く使用されていないものから削除されます。
+
+    ttl : float, default 60
+        レスポンスを保存しておく時間(秒)。
+
+    ttls : Optional[Dict[str, float]], default None
+        APIの種類毎に保存しておく時間(秒)を指定します。例えば {"stamps": 3600, "sensors": 0} のように指定します。
+
+        指定しなかった種類には、ttlの値が使用されます。0にした種類はキャッシュしません。
+
+    Raises
+    ----------
+    ValueError
+        maxsizeが正の値でない場合。
+
+    Note
+    ----
+    Business版のAPIキーについて
+        レスポンスはAPIキー毎に別々に保存されます。
+
+    キャッシュの削除について
+        webhookの設定の変更やアカウント情報の変更など、対応する変更系のAPI呼び出しが成功した場合は、
+        その種類のキャッシュが自動で削除されます。
+
+        それ以外の方法で変更された場合(ダッシュボードから変更した場合など)は、 :func:`invalidate` を呼び出してください。
+
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 256,
+        ttl: float = 60,
+        ttls: Optional[Dict[str, float]] = None,
+    ):
+        if maxsize <= 0:
+            raise ValueError("maxsize must be positive")
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.ttls = dict(ttls) if ttls else {}
+        self._entries: "OrderedDict[_CacheKey, Tuple[float, dict]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def _get_ttl(self, group: Optional[str]) -> float:
+        return self.ttls.get(group, self.ttl) if group is not None else self.ttl
+
+    @staticmethod
+    def _make_key(
+        group: Optional[str],
+        api_key: Optional[str],
+        path: str,
+        params: Optional[dict],
+    ) -> _CacheKey:
+        return (group, api_key, path, tuple(sorted((params or {}).items())))
+
+    def _lookup(
+        self,
+        group: Optional[str],
+        api_key: Optional[str],
+        path: str,
+        params: Optional[dict],
+    ) -> Optional[dict]:
+        key = self._make_key(group, api_key, path, params)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, response = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return response
+
+    def _store(
+        self,
+        group: Optional[str],
+        api_key: Optional[str],
+        path: str,
+        params: Optional[dict],
+        response: dict,
+    ) -> None:
+        ttl = self._get_ttl(group)
+        if ttl <= 0:
+            return
+        key = self._make_key(group, api_key, path, params)
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, response)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(
+        self, group: Optional[str] = None, api_key: Optional[str] = None
+    ) -> None:
+        """キャッシュの削除
+
+        Parameters
+        ----------
+        group : Optional[str], default None
+            削除するAPIの種類名。指定しない場合は、全ての種類のキャッシュを削除します。
+
+        api_key : Optional[str], default None
+            Business版のAPIキー。指定した場合は、そのAPIキーのキャッシュのみを削除します。
+
+        """
+
+        with self._lock:
+            for key in list(self._entries):
+                if group is not None and key[0] != group:
+                    continue
+                if api_key is not None and key[1] != api_key:
+                    continue
+                del self._entries[key]
+
+
+class _Validated:
+    def __init__(
+        self,
+        etag: Optional[str],
+        last_modified: Optional[str],
+        body: dict,
+        model: Any,
+    ):
+        self.etag = etag
+        self.last_modified = last_modified
+        self.body = body
+        self.model = model
+
+    def headers(self) -> Dict[str, str]:
+        headers = {}
+        if self.etag is not None:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified is not None:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class _ValidatorCache:
+    # Keeps the validators (ETag / Last-Modified) and the parsed model of the latest response
+    # for each url, so that a conditional GET answered with 304 can reuse the model.
+
+    def __init__(self, maxsize: int = 256):
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[Tuple[Optional[str], str], _Validated]" = (
+            OrderedDict()
+        )
+        self._lock = threading.Lock()
+
+    def get(self, api_key: Optional[str], path: str) -> Optional[_Validated]:
+        with self._lock:
+            return self._entries.get((api_key, path))
+
+    def store(
+        self,
+        api_key: Optional[str],
+        path: str,
+        response_headers: Mapping[str, str],
+        body: dict,
+        model: Any,
+    ) -> None:
+        etag = response_headers.get("ETag")
+        last_modified = response_headers.get("Last-Modified")
+        key = (api_key, path)
+        with self._lock:
+            if etag is None and last_modified is None:
+                # The server does not support conditional requests for this url.
+                self._entries.pop(key, None)
+                return
+            self._entries[key] = _Validated(etag, last_modified, body, model)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
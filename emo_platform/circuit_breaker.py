@@ -0,0 +1,145 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterator, Tuple, Type
+
+from emo_platform.exceptions import CircuitOpenError
+
+
+class CircuitBreaker:
+    """サーバー障害時のAPI呼び出しの遮断
+
+        サーバーエラー(5xx)や通信エラーが続いた場合に、一定時間API呼び出しを行わずにCircuitOpenErrorを出します。
+
+        clientの引数circuit_breakerに指定すると、そのclientのAPI呼び出しに適用されます。
+
+    Parameters
+    ----------
+    failure_threshold : int, default 5
+        連続して何回失敗したら、API呼び出しを遮断するか。
+
+    recovery_timeout : float, default 30
+        遮断を開始してから、サーバーが復旧したかを確認するまでの時間(秒)。
+
+    half_open_max_calls : int, default 1
+        復旧の確認のために、同時に送信するAPI呼び出しの最大数。
+
+        確認のための呼び出しが成功した場合は遮断を解除し、失敗した場合は再びrecovery_timeoutの間遮断します。
+
+    Raises
+    ----------
+    ValueError
+        引数が正の値でない場合。
+
+    Note
+    ----
+    複数のclientで同じインスタンスを共有すると、それらのclient全体で遮断の状態が共有されます。
+
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        failure_threshold: int = 5,
+        recovery_timeout: float = 30,
+        half_open_max_calls: int = 1,
+    ):
+        if failure_threshold <= 0 or recovery_timeout <= 0 or half_open_max_calls <= 0:
+            raise ValueError(
+                "failure_threshold, recovery_timeout and half_open_max_calls must be positive"
+            )
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self._state = self.CLOSED
+        self._failure_count = 0
+        self._opened_at = 0.0
+        self._half_open_calls = 0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        """現在の状態("closed", "open", "half_open"のいずれか)"""
+
+        with self._lock:
+            if (
+                self._state == self.OPEN
+                and time.monotonic() - self._opened_at >= self.recovery_timeout
+            ):
+                return self.HALF_OPEN
+            return self._state
+
+    @contextmanager
+    def _track(
+        self, connection_errors: Tuple[Type[BaseException], ...]
+    ) -> Iterator[Callable[[int], None]]:
+        # Yields a function to record the http status of the response.
+        self._before_request()
+        recorded = False
+
+        def record_status(status: int) -> None:
+            nonlocal recorded
+            recorded = True
+            if status >= 500:
+                self._record_failure()
+            else:
+                self._record_success()
+
+        try:
+            yield record_status
+        except connection_errors:
+            if not recorded:
+                recorded = True
+                self._record_failure()
+            raise
+        finally:
+            if not recorded:
+                self._release()
+
+    def _before_request(self) -> None:
+        with self._lock:
+            if self._state == self.OPEN:
+                if time.monotonic() - self._opened_at < self.recovery_timeout:
+                    raise CircuitOpenError(
+                        "The circuit is open because the API calls have failed repeatedly."
+                    )
+                self._state = self.HALF_OPEN
+                self._half_open_calls = 0
+            if self._state == self.HALF_OPEN:
+                if self._half_open_calls >= self.half_open_max_calls:
+                    raise CircuitOpenError(
+                        "The circuit is half-open and waiting for the result of a trial call."
+                    )
+                self._half_open_calls += 1
+
+    def _record_success(self) -> None:
+        with self._lock:
+            self._failure_count = 0
+            if self._state == self.HALF_OPEN:
+                self._state = self.CLOSED
+
+    def _record_failure(self) -> None:
+        with self._lock:
+            if self._state == self.HALF_OPEN:
+                self._open()
+                return
+            self._failure_count += 1
+            if (
+                self._state == self.CLOSED
+                and self._failure_count >= self.failure_threshold
+            ):
+                self._open()
+
+    def _release(self) -> None:
+        # The call finished without telling whether the server is healthy (e.g. cancelled).
+        with self._lock:
+            if self._state == self.HALF_OPEN and self._half_open_calls > 0:
+                self._half_open_calls -= 1
+
+    def _open(self) -> None:
+        self._state = self.OPEN
+        self._opened_at = time.monotonic()
+        self._failure_count = 0
@@ -0,0 +1,93 @@
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, TypeVar
+
+from emo_platform.exceptions import DeadlineExceededError
+from emo_platform.transport import _deadline, _get_remaining_time
+
+_T = TypeVar("_T")
+
+
+class _Call:
+    def __init__(self):
+        self.event = threading.Event()
+        self.result: Any = None
+        self.exception: Optional[BaseException] = None
+
+
+class _Coalescer:
+    # Runs only one call at a time for each key.
+    # The threads calling with the same key meanwhile wait for it and share its result.
+
+    def __init__(self):
+        self._calls: Dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+
+    def run(self, key: Hashable, func: Callable[[], _T]) -> _T:
+        while True:
+            with self._lock:
+                call = self._calls.get(key)
+                is_leader = call is None
+                if call is None:
+                    call = _Call()
+                    self._calls[key] = call
+
+            if is_leader:
+                try:
+                    call.result = func()
+                except BaseException as e:
+                    call.exception = e
+                    raise
+                finally:
+                    with self._lock:
+                        del self._calls[key]
+                    call.event.set()
+                return call.result
+
+            if not call.event.wait(_get_remaining_time()):
+                raise DeadlineExceededError("The deadline for the API call has passed.")
+            if isinstance(call.exception, DeadlineExceededError):
+                # The call has been stopped by the deadline of the thread running it,
+                # which does not apply to this thread. So this thread calls again.
+                continue
+            if call.exception is not None:
+                raise call.exception
+            return call.result
+
+
+class _AsyncCoalescer:
+    # Runs only one task at a time for each key.
+    # The coroutines calling with the same key meanwhile await it and share its result.
+
+    def __init__(self):
+        self._tasks: Dict[Hashable, asyncio.Future] = {}
+
+    def _on_done(self, key: Hashable, task: asyncio.Future) -> None:
+        if self._tasks.get(key) is task:
+            del self._tasks[key]
+        if not task.cancelled():
+            # marks the exception as retrieved even if no one awaits the task anymore
+            task.exception()
+
+    async def _run_without_deadline(self, func: Callable[[], Awaitable[_T]]) -> _T:
+        # The task is shared by all the coroutines waiting for it,
+        # so it does not take over the deadline of the one which has created it.
+        # (The task runs in a copy of the context, so the creator's one is kept.)
+        _deadline.set(None)
+        return await func()
+
+    async def run(self, key: Hashable, func: Callable[[], Awaitable[_T]]) -> _T:
+        task = self._tasks.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._run_without_deadline(func))
+            self._tasks[key] = task
+            task.add_done_callback(lambda done: self._on_done(key, done))
+        # The task keeps running for the other coroutines even if this one is cancelled.
+        # Each coroutine waits for it only until its own deadline.
+        try:
+            return await asyncio.wait_for(asyncio.shield(task), _get_remaining_time())
+        except asyncio.TimeoutError:
+            if task.done():
+                # the task itself has finished (or timed out) at the same time
+                return task.result()
+            raise DeadlineExceededError("The deadline for the API call has passed.")
@@ -0,0 +1,143 @@
+import asyncio
+import contextvars
+import hashlib
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import (
+    AsyncIterator,
+    Awaitable,
+    BinaryIO,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    Optional,
+    Tuple,
+)
+from urllib.parse import urlparse
+
+_CHUNK_SIZE = 64 * 1024
+
+
+class _MediaStore:
+    # Files are saved as <directory>/<sha256 of the content><extension>,
+    # so that the same media downloaded from different urls is stored only once.
+    # <directory>/urls/<sha256 of the url> holds the name of the file of the url.
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._index_dir = os.path.join(directory, "urls")
+        os.makedirs(self._index_dir, exist_ok=True)
+
+    def _index_path(self, url: str) -> str:
+        return os.path.join(
+            self._index_dir, hashlib.sha256(url.encode("utf-8")).hexdigest()
+        )
+
+    def lookup(self, url: str) -> Optional[str]:
+        try:
+            with open(self._index_path(url), encoding="utf-8") as f:
+                path = os.path.join(self.directory, f.read().strip())
+        except FileNotFoundError:
+            return None
+        return path if os.path.exists(path) else None
+
+    def create_part(self) -> Tuple[BinaryIO, str]:
+        fd, part_path = tempfile.mkstemp(dir=self.directory, suffix=".part")
+        return os.fdopen(fd, "wb"), part_path
+
+    def commit(self, url: str, part_path: str, digest: str) -> str:
+        name = digest + os.path.splitext(urlparse(url).path)[1]
+        path = os.path.join(self.directory, name)
+        if os.path.exists(path):
+            os.remove(part_path)
+        else:
+            os.replace(part_path, path)
+        # The index is replaced atomically, so that a reader never sees a partial name.
+        fd, index_part = tempfile.mkstemp(dir=self._index_dir, suffix=".part")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(name)
+        os.replace(index_part, self._index_path(url))
+        return path
+
+    def save(self, url: str, chunks: Iterable[bytes]) -> str:
+        digest = hashlib.sha256()
+        file, part_path = self.create_part()
+        try:
+            with file:
+                for chunk in chunks:
+                    digest.update(chunk)
+                    file.write(chunk)
+        except BaseException:
+            os.remove(part_path)
+            raise
+        return self.commit(url, part_path, digest.hexdigest())
+
+    async def async_save(self, url: str, chunks: AsyncIterator[bytes]) -> str:
+        # Every disk operation runs in a worker thread,
+        # so that a slow disk does not block the event loop.
+        loop = asyncio.get_event_loop()
+        digest = hashlib.sha256()
+        file, part_path = await loop.run_in_executor(None, self.create_part)
+        try:
+            try:
+                async for chunk in chunks:
+                    digest.update(chunk)
+                    await loop.run_in_executor(None, file.write, chunk)
+            finally:
+                await loop.run_in_executor(None, file.close)
+        except BaseException:
+            await loop.run_in_executor(None, os.remove, part_path)
+            raise
+        return await loop.run_in_executor(
+            None, self.commit, url, part_path, digest.hexdigest()
+        )
+
+
+def _unique(urls: Iterable[str]) -> Iterator[str]:
+    return iter(dict.fromkeys(urls))
+
+
+def _download_all(
+    urls: Iterable[str], download: Callable[[str], str], max_workers: int
+) -> Dict[str, str]:
+    if max_workers < 1:
+        raise ValueError("max_workers must be 1 or more")
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # The caller's context (e.g. the deadline) is copied to each worker thread.
+        futures = {
+            url: executor.submit(contextvars.copy_context().run, download, url)
+            for url in _unique(urls)
+        }
+        try:
+            return {url: future.result() for url, future in futures.items()}
+        finally:
+            # The urls which have not started yet are skipped if a download fails.
+            for future in futures.values():
+                future.cancel()
+
+
+async def _async_download_all(
+    urls: Iterable[str],
+    download: Callable[[str], Awaitable[str]],
+    max_concurrency: int,
+) -> Dict[str, str]:
+    if max_concurrency < 1:
+        raise ValueError("max_concurrency must be 1 or more")
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def bounded_download(url: str) -> str:
+        async with semaphore:
+            return await download(url)
+
+    unique_urls = list(_unique(urls))
+    tasks = [asyncio.ensure_future(bounded_download(url)) for url in unique_urls]
+    try:
+        paths = await asyncio.gather(*tasks)
+    finally:
+        # The other downloads are stopped if one of them fails.
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    return dict(zip(unique_urls, paths))
@@ -97,6 +97,24 @@ class WebhookRequestError(EmoPlatformError):
     pass
 
 
+class DeadlineExceededError(EmoPlatformError):
+    """API呼び出しの期限を過ぎた場合に出るエラー"""
+
+    pass
+
+
+class CircuitOpenError(EmoPlatformError):
+    """API呼び出しの失敗が続いているため、API呼び出しを遮断している場合に出るエラー"""
+
+    pass
+
+
+class ValidationError(EmoPlatformError):
+    """送るデータがAPIの制限を満たしていないことを、API呼び出し前に検出した場合に出るエラー"""
+
+    pass
+
+
 def _http_status_to_exception(code):
     if code == 400:
         return BadRequestError
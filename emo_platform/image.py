@@ -0,0 +1,94 @@
+import io
+import os
+from typing import Iterable, Optional
+
+from emo_platform.exceptions import ValidationError
+from emo_platform.upload import _MediaData
+from emo_platform.validation import _MAX_MEDIA_SIZE
+
+# The JPEG quality is lowered step by step down to the minimum before downsizing.
+_MAX_JPEG_QUALITY = 85
+_MIN_JPEG_QUALITY = 50
+_JPEG_QUALITY_STEP = 10
+# the ratio to downsize the image when it does not fit even with the lowest quality
+_SCALE_STEP = 0.8
+
+
+def _media_size(media_data: _MediaData) -> int:
+    if isinstance(media_data, str):
+        return os.path.getsize(media_data)
+    if isinstance(media_data, (bytes, bytearray, memoryview)):
+        return memoryview(media_data).nbytes
+    if media_data.seekable():
+        size = media_data.seek(0, io.SEEK_END)
+        media_data.seek(0)
+        return size
+    return -1
+
+
+def _read_media(media_data: _MediaData) -> bytes:
+    if isinstance(media_data, str):
+        with open(media_data, "rb") as f:
+            return f.read()
+    if isinstance(media_data, (bytes, bytearray, memoryview)):
+        return bytes(media_data)
+    return media_data.read()
+
+
+def _encode(image, image_format: str, quality: Optional[int]) -> bytes:
+    output = io.BytesIO()
+    if image_format == "JPEG":
+        image.save(output, "JPEG", quality=quality, optimize=True)
+    else:
+        image.save(output, "PNG", optimize=True)
+    return output.getvalue()
+
+
+def _compress_image(media_data: _MediaData) -> _MediaData:
+    # Re-encodes (and downsizes if needed) the image to fit the limit of the api.
+    # The image which already fits is returned as it is.
+    if 0 <= _media_size(media_data) <= _MAX_MEDIA_SIZE:
+        return media_data
+    data = _read_media(media_data)
+    if len(data) <= _MAX_MEDIA_SIZE:
+        return data
+
+    try:
+        from PIL import Image, ImageOps
+    except ImportError as e:
+        raise ImportError(
+            "Pillow is required to compress images. "
+            "Please install it with 'pip install emo-platform-api-sdk[image]'."
+        ) from e
+
+    with Image.open(io.BytesIO(data)) as opened:
+        image_format = opened.format
+        if image_format not in ("JPEG", "PNG"):
+            raise ValidationError(
+                f"The image file must be JPEG or PNG, but it is {image_format}."
+            )
+        # The orientation in the exif is applied, since the exif is not kept.
+        image = ImageOps.exif_transpose(opened)
+    if image_format == "JPEG" and image.mode not in ("L", "RGB"):
+        image = image.convert("RGB")
+
+    # Image.Resampling is available since Pillow 9.1, where Image.LANCZOS is deprecated.
+    lanczos = getattr(Image, "Resampling", Image).LANCZOS
+    width, height = image.size
+    scale = 1.0
+    while True:
+        size = (max(1, int(width * scale)), max(1, int(height * scale)))
+        resized = image if scale == 1.0 else image.resize(size, lanczos)
+        qualities: Iterable[Optional[int]] = [None]
+        if image_format == "JPEG":
+            qualities = range(
+                _MAX_JPEG_QUALITY, _MIN_JPEG_QUALITY - 1, -_JPEG_QUALITY_STEP
+            )
+        for quality in qualities:
+            encoded = _encode(resized, image_format, quality)
+            if len(encoded) <= _MAX_MEDIA_SIZE:
+                return encoded
+        if size == (1, 1):
+            raise ValidationError("The image can not be compressed to 1MB or less.")
+        # The aspect ratio is kept, since both sides are scaled by the same ratio.
+        scale *= _SCALE_STEP
@@ -0,0 +1,312 @@
+import copy
+import json
+import os
+import threading
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Union
+
+from emo_platform.models import Color, Head
+from emo_platform.upload import _load_json
+from emo_platform.validation import _MOTION_TRACKS, _validate_motion
+
+_LED_TRACKS = ("led_cheek_l", "led_cheek_r", "led_play", "led_rec", "led_func")
+_CHEEK_TRACKS = ("led_cheek_l", "led_cheek_r")
+_LINEAR_EASE = [0, 0, 1, 1]
+# the values of each track before its first step
+_INITIAL_VALUES: Dict[str, Any] = {
+    "head": [None, None],
+    "antenna": {"amp": 0, "freq": 0, "pos": None},
+    **{track: [0, 0, 0, 255] for track in _LED_TRACKS},
+}
+
+
+class _LoadedMotion(NamedTuple):
+    mtime_ns: int
+    size: int
+    body: str
+    validated: bool
+
+
+class MotionRegistry:
+    """モーションファイルの読み込み結果の保存
+
+        clientの引数motion_registryに指定すると、 :func:`Room.send_original_motion <emo_platform.api.Room.send_original_motion>` にファイルのパスを指定した場合に、
+        ファイルの読み込み・確認・送信用のデータへの変換を初回のみ行い、その結果を保存します。
+
+        同じモーションを繰り返し送信する場合に、2回目以降はファイルの読み込みを行わずに送信できます::
+
+            registry = MotionRegistry()
+            client = Client(motion_registry=registry)
+            room_client = client.create_room_client(room_id)
+            for _ in range(10):
+                room_client.send_original_motion("motions/greeting.json")
+
+    Parameters
+    ----------
+    validate : bool, default True
+        Trueの場合、ファイルの読み込み時にモーションのデータ形式を確認します。
+
+        clientの引数validateがFalseの場合は、このclientからの送信時には確認を行いません。
+
+    Note
+    ----
+    ファイルの変更について
+        送信の度にファイルの更新日時とサイズを確認し、変更されていた場合は読み込み直します。
+
+    複数のclientで同じインスタンスを共有すると、それらのclient全体で読み込み結果が共有されます。
+
+    """
+
+    def __init__(self, validate: bool = True):
+        self.validate = validate
+        self._motions: Dict[str, _LoadedMotion] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._motions)
+
+    def load(self, motion_path: str) -> None:
+        """モーションファイルの事前読み込み
+
+            最初の送信時の読み込みを省くため、事前にファイルを読み込んでおきます。
+
+        Parameters
+        ----------
+        motion_path : str
+            モーションファイルのパス。
+
+        Raises
+        ----------
+        ValidationError
+            モーションのデータ形式が誤っている場合。(引数validateがTrueの場合のみ)
+
+        """
+
+        self._get_body(motion_path)
+
+    def clear(self) -> None:
+        """保存している読み込み結果の削除"""
+
+        with self._lock:
+            self._motions.clear()
+
+    def _get_body(self, motion_path: str, validate: bool = True) -> str:
+        # Returns the request body of the motion, loading the file only if it has changed.
+        # The motion is validated only if both the registry and the caller ask for it.
+        validate = validate and self.validate
+        key = os.path.abspath(motion_path)
+        stat = os.stat(key)
+        with self._lock:
+            motion = self._motions.get(key)
+        if (
+            motion is not None
+            and motion.mtime_ns == stat.st_mtime_ns
+            and motion.size == stat.st_size
+            and (motion.validated or not validate)
+        ):
+            return motion.body
+        payload = _load_json(key)
+        if validate:
+            _validate_motion(payload)
+        # If the file is modified while being loaded, the stat differs at the next call
+        # and the file is loaded again.
+        motion = _LoadedMotion(
+            stat.st_mtime_ns, stat.st_size, json.dumps(payload), validate
+        )
+        with self._lock:
+            self._motions[key] = motion
+        return motion.body
+
+
+class MotionTimeline:
+    """複数の動作をまとめた、オリジナルのモーションの作成
+
+        ほっぺたの色( :class:`~emo_platform.models.Color` )、首の角度( :class:`~emo_platform.models.Head` )、任意のキーフレームを、開始時刻と長さを指定して並べ、
+        :func:`Room.send_original_motion <emo_platform.api.Room.send_original_motion>` で送信できる1つのモーションに変換します。
+
+        change_led_colorやmove_toを続けて呼び出す代わりに使用すると、API呼び出しが1回で済みます::
+
+            timeline = (
+                MotionTimeline()
+                .add(0, 1000, Color(255, 0, 0))
+                .add(0, 1500, Head(angle=30))
+                .add(1000, 1000, Color(0, 0, 255))
+                .add(1500, 1500, Head(angle=-30, vertical_angle=10))
+            )
+            room_client.send_original_motion(timeline.compile())
+
+    Note
+    ----
+    各トラックのキーフレームについて
+        同じトラック(head, led_cheek_lなど)の動作は時間が重ならないように指定してください。
+
+        動作の間に空き時間がある場合は、直前の状態を保つキーフレームが自動で挿入されます。
+
+    """
+
+    def __init__(self):
+        self._keyframes: Dict[str, List[dict]] = {}
+        self._ends: Dict[str, int] = {}
+        self._last_values: Dict[str, Any] = {}
+
+    @property
+    def duration(self) -> int:
+        """モーション全体の長さ(ミリ秒)"""
+
+        return max(self._ends.values(), default=0)
+
+    def add(
+        self,
+        at: int,
+        duration: int,
+        step: Union[Color, Head, dict],
+        track: Optional[str] = None,
+        ease: Optional[Sequence[float]] = None,
+    ) -> "MotionTimeline":
+        """動作の追加
+
+        Parameters
+        ----------
+        at : int
+            動作を開始する時刻(ミリ秒)。モーションの開始時を0とします。
+
+        duration : int
+            動作の長さ(ミリ秒)。
+
+        step : Color or Head or dict
+            動作の内容。
+
+                Color
+                    直前の色から指定した色に変化させます。trackを指定しない場合は、両方のほっぺたの色を変えます。
+
+                Head
+                    直前の角度から指定した角度に首を動かします。
+
+                dict
+                    trackに追加するキーフレーム。形式は、assets/sample_motion.jsonの各トラックの要素と同じです。
+                    durationの値は、引数durationで上書きされます。
+
+        track : Optional[str], default None
+            動作を追加するトラック。(head, antenna, led_cheek_l, led_cheek_r, led_play, led_rec, led_func)
+
+            Colorの場合はLEDのトラックのいずれか、dictの場合は必ず指定してください。
+
+        ease : Optional[Sequence[float]], default None
+            ColorあるいはHeadの変化の仕方を表す、イージングの係数(4つの値)。指定しない場合は、一定の速さで変化します。
+
+        Returns
+        -------
+        timeline : MotionTimeline
+            このインスタンス自身。続けてaddを呼び出せます。
+
+        Raises
+        ----------
+        ValueError
+            時刻や長さが不正な場合、同じトラックの直前の動作と時間が重なる場合、あるいはtrackの指定が誤っている場合。
+
+        """
+
+        if at < 0 or duration <= 0:
+            raise ValueError("at must be 0 or more, and duration must be positive")
+        for step_track in self._step_tracks(step, track):
+            self._append(step_track, at, duration, step, ease)
+        return self
+
+    def compile(self) -> dict:
+        """モーションへの変換
+
+        Returns
+        -------
+        motion_data : dict
+            send_original_motionに指定できる、モーションを記述した辞書オブジェクト。
+
+        Raises
+        ----------
+        ValueError
+            動作が1つも追加されていない場合。
+
+        """
+
+        if not self._keyframes:
+            raise ValueError("no step has been added to the timeline")
+        return {
+            track: copy.deepcopy(self._keyframes[track])
+            for track in _MOTION_TRACKS
+            if track in self._keyframes
+        }
+
+    @staticmethod
+    def _step_tracks(
+        step: Union[Color, Head, dict], track: Optional[str]
+    ) -> Sequence[str]:
+        if isinstance(step, Color):
+            if track is None:
+                return _CHEEK_TRACKS
+            if track not in _LED_TRACKS:
+                raise ValueError(f"Color can not be added to the track '{track}'")
+        elif isinstance(step, Head):
+            if track not in (None, "head"):
+                raise ValueError(f"Head can not be added to the track '{track}'")
+            return ("head",)
+        elif isinstance(step, dict):
+            if track not in _MOTION_TRACKS:
+                raise ValueError(f"Unknown motion track '{track}'")
+        else:
+            raise ValueError("step must be Color, Head or dict")
+        return (track,)
+
+    def _append(
+        self,
+        track: str,
+        at: int,
+        duration: int,
+        step: Union[Color, Head, dict],
+        ease: Optional[Sequence[float]],
+    ) -> None:
+        end = self._ends.get(track, 0)
+        if at < end:
+            raise ValueError(
+                f"The step at {at}ms overlaps the previous step of '{track}', "
+                f"which ends at {end}ms."
+            )
+        keyframes = self._keyframes.setdefault(track, [])
+        last_value = self._last_values.get(track, _INITIAL_VALUES[track])
+        if at > end:
+            # keeps the last state until the step starts
+            keyframes.append(self._transition(track, at - end, last_value, last_value))
+        if isinstance(step, Color):
+            value: Any = [step.red, step.green, step.blue, 255]
+            keyframe = self._transition(track, duration, last_value, value, ease)
+        elif isinstance(step, Head):
+            value = [step.angle, step.vertical_angle]
+            keyframe = self._transition(track, duration, last_value, value, ease)
+        else:
+            keyframe = dict(copy.deepcopy(step), duration=duration)
+            value = keyframe.get("p3" if track == "head" else "end", last_value)
+        keyframes.append(keyframe)
+        self._ends[track] = at + duration
+        self._last_values[track] = value
+
+    @staticmethod
+    def _transition(
+        track: str,
+        duration: int,
+        start: Any,
+        end: Any,
+        ease: Optional[Sequence[float]] = None,
+    ) -> dict:
+        keyframe: Dict[str, Any] = {
+            "duration": duration,
+            "ease": list(ease) if ease is not None else list(_LINEAR_EASE),
+        }
+        if track == "head":
+            # a cubic bezier curve from the start to the end
+            keyframe.update(
+                {"p0": list(start), "p1": list(start), "p2": list(end), "p3": list(end)}
+            )
+        elif track == "antenna":
+            del keyframe["ease"]
+            keyframe.update({"start": dict(start), "end": dict(end)})
+        else:
+            keyframe.update({"start": list(start), "end": list(end)})
+        return keyframe
@@ -0,0 +1,173 @@
+import asyncio
+import contextvars
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import AsyncIterator, Awaitable, Callable, Iterator, List, Optional, Tuple
+
+from emo_platform.response import EmoMessageInfo, EmoMsgsInfo
+
+
+def _filter_page(
+    messages: List[EmoMessageInfo],
+    since: Optional[int],
+    until: Optional[int],
+    before: Optional[int],
+) -> List[EmoMessageInfo]:
+    # before is the oldest sequence of the previous page,
+    # which drops the messages already yielded if the api includes the boundary.
+    return [
+        msg
+        for msg in messages
+        if (before is None or msg.sequence < before)
+        and (until is None or msg.sequence < until)
+        and (since is None or msg.sequence >= since)
+    ]
+
+
+def _next_before(
+    messages: List[EmoMessageInfo], since: Optional[int], before: Optional[int]
+) -> Optional[int]:
+    # Returns the ts to request the next (older) page with, or None if there is no more page.
+    if not messages:
+        return None
+    oldest = min(msg.sequence for msg in messages)
+    if before is not None and oldest >= before:
+        # The api returned no older message.
+        return None
+    if since is not None and oldest <= since:
+        return None
+    return oldest
+
+
+def _iter_msgs(
+    fetch: Callable[[Optional[int]], EmoMsgsInfo],
+    since: Optional[int],
+    until: Optional[int],
+) -> Iterator[EmoMessageInfo]:
+    # The next page is fetched in a worker thread while the current page is consumed,
+    # so at most two pages are kept in memory.
+    executor = ThreadPoolExecutor(max_workers=1)
+    try:
+        before = until
+        future: Optional["Future[EmoMsgsInfo]"] = executor.submit(
+            contextvars.copy_context().run, fetch, before
+        )
+        while future is not None:
+            messages = future.result().messages
+            next_before = _next_before(messages, since, before)
+            future = None
+            if next_before is not None:
+                future = executor.submit(
+                    contextvars.copy_context().run, fetch, next_before
+                )
+            for msg in _filter_page(messages, since, until, before):
+                yield msg
+            before = next_before
+    finally:
+        if future is not None:
+            future.cancel()
+        executor.shutdown(wait=False)
+
+
+async def _async_iter_msgs(
+    fetch: Callable[[Optional[int]], Awaitable[EmoMsgsInfo]],
+    since: Optional[int],
+    until: Optional[int],
+) -> AsyncIterator[EmoMessageInfo]:
+    # The next page is fetched in another task while the current page is consumed,
+    # so at most two pages are kept in memory.
+    before = until
+    task: Optional[asyncio.Future] = asyncio.ensure_future(fetch(before))
+    try:
+        while task is not None:
+            messages = (await task).messages
+            next_before = _next_before(messages, since, before)
+            task = None
+            if next_before is not None:
+                task = asyncio.ensure_future(fetch(next_before))
+            for msg in _filter_page(messages, since, until, before):
+                yield msg
+            before = next_before
+    finally:
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+
+def _new_msgs(
+    messages: List[EmoMessageInfo], last_sequence: int
+) -> Tuple[List[EmoMessageInfo], Optional[int]]:
+    # Returns the new messages in chronological order, and the ts to backfill from
+    # if every message of the page is new (older new messages may be on the next pages).
+    new_msgs = sorted(
+        (msg for msg in messages if msg.sequence > last_sequence),
+        key=lambda msg: msg.sequence,
+    )
+    if new_msgs and len(new_msgs) == len(messages):
+        return new_msgs, new_msgs[0].sequence
+    return new_msgs, None
+
+
+def _next_interval(
+    interval: float, has_new_msgs: bool, min_interval: float, max_interval: float
+) -> float:
+    if has_new_msgs:
+        return min_interval
+    return min(interval * 2, max_interval)
+
+
+def _tail_msgs(
+    fetch: Callable[[Optional[int]], EmoMsgsInfo],
+    after: Optional[int],
+    min_interval: float,
+    max_interval: float,
+) -> Iterator[EmoMessageInfo]:
+    last_sequence = after
+    interval = min_interval
+    while True:
+        messages = fetch(None).messages
+        if last_sequence is None:
+            # starts from the latest message
+            last_sequence = max((msg.sequence for msg in messages), default=0)
+            new_msgs: List[EmoMessageInfo] = []
+        else:
+            new_msgs, gap_until = _new_msgs(messages, last_sequence)
+            if gap_until is not None:
+                backfill = list(_iter_msgs(fetch, last_sequence + 1, gap_until))
+                new_msgs = backfill[::-1] + new_msgs
+        for msg in new_msgs:
+            last_sequence = msg.sequence
+            yield msg
+        interval = _next_interval(interval, bool(new_msgs), min_interval, max_interval)
+        time.sleep(interval)
+
+
+async def _async_tail_msgs(
+    fetch: Callable[[Optional[int]], Awaitable[EmoMsgsInfo]],
+    after: Optional[int],
+    min_interval: float,
+    max_interval: float,
+) -> AsyncIterator[EmoMessageInfo]:
+    last_sequence = after
+    interval = min_interval
+    while True:
+        messages = (await fetch(None)).messages
+        if last_sequence is None:
+            # starts from the latest message
+            last_sequence = max((msg.sequence for msg in messages), default=0)
+            new_msgs: List[EmoMessageInfo] = []
+        else:
+            new_msgs, gap_until = _new_msgs(messages, last_sequence)
+            if gap_until is not None:
+                backfill = [
+                    msg
+                    async for msg in _async_iter_msgs(
+                        fetch, last_sequence + 1, gap_until
+                    )
+                ]
+                new_msgs = backfill[::-1] + new_msgs
+        for msg in new_msgs:
+            last_sequence = msg.sequence
+            yield msg
+        interval = _next_interval(interval, bool(new_msgs), min_interval, max_interval)
+        await asyncio.sleep(interval)
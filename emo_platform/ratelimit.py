@@ -0,0 +1,148 @@
+import asyncio
+import threading
+import time
+from typing import Dict, Optional
+
+
+class _TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        self._rate = rate
+        self._capacity = capacity
+        self._tokens = capacity
+        self._updated_at = time.monotonic()
+
+    def reserve(self, timeout: Optional[float] = None) -> Optional[float]:
+        # Takes one token in advance and returns how long the caller has to wait.
+        # The balance may become negative, which keeps waiting callers in order.
+        now = time.monotonic()
+        self._tokens = min(
+            self._capacity, self._tokens + (now - self._updated_at) * self._rate
+        )
+        self._updated_at = now
+        self._tokens -= 1
+        if self._tokens >= 0:
+            return 0
+        wait = -self._tokens / self._rate
+        if timeout is not None and wait > timeout:
+            self._tokens += 1
+            return None
+        return wait
+
+
+class RateLimiter:
+    """API呼び出し頻度の制限
+
+        トークンバケット方式で、1分あたりのAPI呼び出し回数を制限します。
+
+        clientの引数rate_limiterに指定すると、上限を超える呼び出しは送信可能になるまで待機してから送信されます。
+        (:class:`~emo_platform.api.Client` ではスレッドがブロックされ、 :class:`~emo_platform.api_async.AsyncClient` ではawaitで待機します。)
+
+    Parameters
+    ----------
+    requests_per_minute : float
+        1分あたりに送信するAPI呼び出しの上限回数。
+
+    burst : int, default 1
+        連続して待機せずに送信できる呼び出しの最大回数。
+
+        1の場合は、呼び出しの間隔を一定(60 / requests_per_minute 秒)以上に保つため、どの60秒間でも呼び出し回数がrequests_per_minuteを超えません。
+        2以上にすると、任意の60秒間に最大で requests_per_minute + burst - 1 回の呼び出しが行われることがあります。
+
+    per_api_key : bool, default False
+        Trueにした場合、Business版のAPIキー毎に別々に呼び出し回数を制限します。
+
+    Raises
+    ----------
+    ValueError
+        requests_per_minuteあるいはburstが正の値でない場合。
+
+    Note
+    ----
+    複数のclientで同じインスタンスを共有すると、それらのclient全体での呼び出し回数が制限されます。
+
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: float,
+        burst: int = 1,
+        per_api_key: bool = False,
+    ):
+        if requests_per_minute <= 0:
+            raise ValueError("requests_per_minute must be positive")
+        if burst <= 0:
+            raise ValueError("burst must be positive")
+        self.requests_per_minute = requests_per_minute
+        self.burst = burst
+        self.per_api_key = per_api_key
+        self._buckets: Dict[Optional[str], _TokenBucket] = {}
+        self._lock = threading.Lock()
+
+    def _reserve(
+        self, api_key: Optional[str], timeout: Optional[float] = None
+    ) -> Optional[float]:
+        key = api_key if self.per_api_key else None
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = _TokenBucket(self.requests_per_minute / 60, self.burst)
+                self._buckets[key] = bucket
+            return bucket.reserve(timeout)
+
+    def acquire(
+        self, api_key: Optional[str] = None, timeout: Optional[float] = None
+    ) -> bool:
+        """API呼び出し1回分の許可を取得
+
+            許可が得られるまで、スレッドをブロックします。
+
+        Parameters
+        ----------
+        api_key : Optional[str], default None
+            Business版のAPIキー。per_api_keyがTrueの場合のみ使用されます。
+
+        timeout : Optional[float], default None
+            待機する時間の上限(秒)。
+
+        Returns
+        -------
+        acquired : bool
+            許可を取得できた場合はTrue。timeout以内に取得できない場合は、待機せずにFalseを返します。
+
+        """
+
+        wait = self._reserve(api_key, timeout)
+        if wait is None:
+            return False
+        if wait > 0:
+            time.sleep(wait)
+        return True
+
+    async def async_acquire(
+        self, api_key: Optional[str] = None, timeout: Optional[float] = None
+    ) -> bool:
+        """API呼び出し1回分の許可を取得
+
+            許可が得られるまで、awaitで待機します。
+
+        Parameters
+        ----------
+        api_key : Optional[str], default None
+            Business版のAPIキー。per_api_keyがTrueの場合のみ使用されます。
+
+        timeout : Optional[float], default None
+            待機する時間の上限(秒)。
+
+        Returns
+        -------
+        acquired : bool
+            許可を取得できた場合はTrue。timeout以内に取得できない場合は、待機せずにFalseを返します。
+
+        """
+
+        wait = self._reserve(api_key, timeout)
+        if wait is None:
+            return False
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return True
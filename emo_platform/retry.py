@@ -0,0 +1,111 @@
+import random
+import time
+from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
+from typing import FrozenSet, Optional
+
+
+def _parse_retry_after(retry_after: Optional[str]) -> Optional[float]:
+    if retry_after is None:
+        return None
+    try:
+        return max(0.0, float(retry_after))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(retry_after)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+
+@dataclass
+class RetryPolicy:
+    """API呼び出し失敗時の再試行の設定
+
+        一時的なエラー(429, 5xx, 通信エラー)でAPI呼び出しが失敗した場合に、
+        指数バックオフで待機してから再試行します。
+
+    Parameters
+    ----------
+    max_attempts : int, default 3
+        1回のAPI呼び出しで、リクエストを送信する最大回数(初回を含む)。
+
+        1にすると再試行しません。
+
+    backoff_factor : float, default 0.5
+        再試行までの待機時間の基準(秒)。n回目の再試行では、最大でbackoff_factor * 2^(n-1)秒待機します。
+
+    max_backoff : float, default 30
+        再試行までの待機時間の上限(秒)。
+
+    jitter : bool, default True
+        Trueにした場合、待機時間を0から上記の値の間でランダムに決めます。
+        複数のclientの再試行が同時に集中するのを防ぎます。
+
+    retry_statuses : FrozenSet[int], default {429, 500, 502, 503, 504}
+        再試行するhttpステータスコード。
+
+    Note
+    ----
+    Retry-Afterヘッダについて
+        レスポンスにRetry-Afterヘッダが含まれる場合は、その値(max_backoffが上限)だけ待機します。
+
+    POSTリクエストの再試行について
+        メッセージの送信などが重複して行われないよう、POSTリクエストは429(リクエストが処理されていない)の場合のみ再試行します。
+
+    """
+
+    max_attempts: int = 3
+    backoff_factor: float = 0.5
+    max_backoff: float = 30
+    jitter: bool = True
+    retry_statuses: FrozenSet[int] = frozenset({429, 500, 502, 503, 504})
+
+    def get_delay(
+        self,
+        attempt: int,
+        status: Optional[int] = None,
+        idempotent: bool = True,
+        retry_after: Optional[str] = None,
+    ) -> Optional[float]:
+        """再試行までの待機時間の取得
+
+        Parameters
+        ----------
+        attempt : int
+            失敗したリクエストが何回目の送信か。
+
+        status : Optional[int], default None
+            失敗したリクエストのhttpステータスコード。通信エラーの場合はNone。
+
+        idempotent : bool, default True
+            リクエストが冪等かどうか。
+
+        retry_after : Optional[str], default None
+            レスポンスのRetry-Afterヘッダの値。
+
+        Returns
+        -------
+        delay : Optional[float]
+            再試行までの待機時間(秒)。再試行しない場合はNone。
+
+        """
+
+        if attempt >= self.max_attempts:
+            return None
+        if status is None:
+            # The request may have reached the server.
+            if not idempotent:
+                return None
+        elif status not in self.retry_statuses:
+            return None
+        elif not idempotent and status != 429:
+            return None
+
+        delay = _parse_retry_after(retry_after)
+        if delay is None:
+            delay = self.backoff_factor * 2 ** (attempt - 1)
+            if self.jitter:
+                delay = random.uniform(0, delay)
+        return min(delay, self.max_backoff)
@@ -0,0 +1,82 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, Optional
+
+from emo_platform.exceptions import DeadlineExceededError
+
+
+class PostContentType:
+    APPLICATION_JSON = "application/json"
+    MULTIPART_FORMDATA = None
+
+
+# The API key of Business plan is held per thread / asyncio task,
+# so that a client can be shared between threads and tasks.
+_channel_user: ContextVar[Optional[str]] = ContextVar(
+    "emo_platform_channel_user", default=None
+)
+
+
+@contextmanager
+def _channel_user_context(api_key: str) -> Iterator[None]:
+    token = _channel_user.set(api_key)
+    try:
+        yield
+    finally:
+        _channel_user.reset(token)
+
+
+# The deadline is the monotonic time until which the API call has to finish.
+_deadline: ContextVar[Optional[float]] = ContextVar(
+    "emo_platform_deadline", default=None
+)
+
+
+@contextmanager
+def _deadline_context(seconds: float) -> Iterator[None]:
+    deadline = time.monotonic() + seconds
+    outer_deadline = _deadline.get()
+    if outer_deadline is not None:
+        deadline = min(deadline, outer_deadline)
+    token = _deadline.set(deadline)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def _get_remaining_time() -> Optional[float]:
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise DeadlineExceededError("The deadline for the API call has passed.")
+    return remaining
+
+
+def _cap_timeout(
+    timeout: Optional[float], remaining: Optional[float]
+) -> Optional[float]:
+    if remaining is None:
+        return timeout
+    if timeout is None:
+        return remaining
+    return min(timeout, remaining)
+
+
+def _build_headers(
+    access_token: str,
+    content_type: Optional[str] = PostContentType.APPLICATION_JSON,
+    accept: Optional[str] = "*/*",
+) -> Dict[str, str]:
+    headers = {"Authorization": "Bearer " + access_token}
+    if accept is not None:
+        headers["accept"] = accept
+    if content_type is not None:
+        headers["Content-Type"] = content_type
+    api_key = _channel_user.get()
+    if api_key is not None:
+        headers["X-Channel-User"] = api_key
+    return headers
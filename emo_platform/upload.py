@@ -0,0 +1,153 @@
+import asyncio
+import io
+import json
+import os
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, AsyncIterator, BinaryIO, Iterator, Optional, Tuple, Union
+
+from emo_platform.validation import _check_media
+
+_MediaData = Union[str, bytes, bytearray, memoryview, BinaryIO]
+_UploadData = Union[bytes, bytearray, memoryview, BinaryIO]
+
+# the number of bytes needed to detect the file format
+_HEAD_SIZE = 12
+
+
+def _media_format(head: bytes) -> Optional[str]:
+    # Returns the extension of the file format detected by the magic bytes.
+    if head.startswith(b"\xff\xd8\xff"):
+        return "jpg"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "png"
+    if head.startswith(b"ID3") or (
+        len(head) >= 2 and head[0] == 0xFF and head[1] & 0xE0 == 0xE0
+    ):
+        return "mp3"
+    if head[4:8] == b"ftyp":
+        return "m4a"
+    return None
+
+
+def _filename(field: str, head: bytes) -> str:
+    media_format = _media_format(head)
+    return f"{field}.{media_format}" if media_format else field
+
+
+def _open_file(path: str, field: str, validate: bool) -> BinaryIO:
+    f = open(path, "rb")
+    if validate:
+        # Only the size and the head of the file are read for the validation.
+        try:
+            size = os.fstat(f.fileno()).st_size
+            head = f.read(_HEAD_SIZE)
+            f.seek(0)
+            _check_media(field, size, _media_format(head))
+        except BaseException:
+            f.close()
+            raise
+    return f
+
+
+def _prepare_stream(stream: BinaryIO) -> Tuple[bytes, int, _UploadData]:
+    # Returns the head and the size of the stream, and the data to upload.
+    if stream.seekable():
+        # The whole stream is sent, and rewound again if the request is replayed.
+        size = stream.seek(0, io.SEEK_END)
+        stream.seek(0)
+        head = stream.read(_HEAD_SIZE)
+        stream.seek(0)
+        return head, size, stream
+    # A stream which can not be rewound is read at once,
+    # so that the request can be replayed (e.g. after refreshing the access token).
+    data = stream.read()
+    return data[:_HEAD_SIZE], len(data), data
+
+
+def _attempt_data(data: _UploadData) -> _UploadData:
+    # Returns the data to send in one attempt of the async upload.
+    # aiohttp closes the stream after sending it, so it is given a new stream
+    # sharing the file or the buffer, and the original one is kept for the replay.
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        return data
+    if isinstance(data, io.BytesIO):
+        return data.getbuffer()
+    try:
+        fd = data.fileno()
+    except (AttributeError, OSError):
+        data.seek(0)
+        return data.read()
+    stream = os.fdopen(os.dup(fd), "rb")
+    stream.seek(0)
+    return stream
+
+
+def _stream_filename(stream: BinaryIO, field: str, head: bytes) -> str:
+    name = getattr(stream, "name", None)
+    if isinstance(name, str):
+        return os.path.basename(name)
+    return _filename(field, head)
+
+
+def _bytes_like_media(
+    media_data: Union[bytes, bytearray, memoryview], field: str, validate: bool
+) -> Tuple[str, memoryview]:
+    view = memoryview(media_data)
+    if view.format != "B":
+        view = view.cast("B")
+    head = bytes(view[:_HEAD_SIZE])
+    if validate:
+        _check_media(field, view.nbytes, _media_format(head))
+    return _filename(field, head), view
+
+
+def _stream_media(
+    stream: BinaryIO, field: str, validate: bool
+) -> Tuple[str, _UploadData]:
+    head, size, data = _prepare_stream(stream)
+    if validate:
+        _check_media(field, size, _media_format(head))
+    return _stream_filename(stream, field, head), data
+
+
+@contextmanager
+def _open_media(
+    media_data: _MediaData, field: str, validate: bool = False
+) -> Iterator[Tuple[str, _UploadData]]:
+    # Yields the file name and the data to upload, without reading the data
+    # into bytes beforehand (the http library may still copy it into the request body).
+    # With validate, raises ValidationError if the data exceeds the limits of the api.
+    if isinstance(media_data, str):
+        with _open_file(media_data, field, validate) as f:
+            yield os.path.basename(media_data), f
+    elif isinstance(media_data, (bytes, bytearray, memoryview)):
+        yield _bytes_like_media(media_data, field, validate)
+    else:
+        yield _stream_media(media_data, field, validate)
+
+
+@asynccontextmanager
+async def _async_open_media(
+    media_data: _MediaData, field: str, validate: bool = False
+) -> AsyncIterator[Tuple[str, _UploadData]]:
+    # Same as _open_media, but the file is opened, read and closed in a worker thread
+    # so that a slow disk does not block the event loop.
+    # (aiohttp also reads the file in a worker thread while sending it.)
+    loop = asyncio.get_event_loop()
+    if isinstance(media_data, str):
+        f = await loop.run_in_executor(None, _open_file, media_data, field, validate)
+        try:
+            yield os.path.basename(media_data), f
+        finally:
+            await loop.run_in_executor(None, f.close)
+    elif isinstance(media_data, (bytes, bytearray, memoryview)):
+        yield _bytes_like_media(media_data, field, validate)
+    else:
+        yield await loop.run_in_executor(
+            None, _stream_media, media_data, field, validate
+        )
+
+
+def _load_json(path: str) -> Any:
+    with open(path) as f:
+        return json.load(f)
@@ -0,0 +1,103 @@
+from numbers import Real
+from typing import Any, Dict, Optional, Tuple
+
+from emo_platform.exceptions import ValidationError
+
+_MAX_MEDIA_SIZE = 1024 * 1024
+_MEDIA_FORMATS: Dict[str, Tuple[str, ...]] = {
+    "audio": ("mp3", "m4a"),
+    "image": ("jpg", "png"),
+}
+_MAX_TEXT_LENGTH = 250
+
+_MOTION_TRACKS = (
+    "head",
+    "antenna",
+    "led_cheek_l",
+    "led_cheek_r",
+    "led_play",
+    "led_rec",
+    "led_func",
+)
+
+
+def _check_media(field: str, size: int, media_format: Optional[str]) -> None:
+    if size > _MAX_MEDIA_SIZE:
+        raise ValidationError(
+            f"The {field} file must be 1MB or less, but it is {size} bytes."
+        )
+    formats = _MEDIA_FORMATS[field]
+    if media_format not in formats:
+        raise ValidationError(
+            f"The {field} file must be one of {', '.join(formats)}, "
+            f"but it is {media_format or 'unknown format'}."
+        )
+
+
+def _validate_text(text: str) -> None:
+    if not 1 <= len(text) <= _MAX_TEXT_LENGTH:
+        raise ValidationError(
+            f"The text must be 1 to {_MAX_TEXT_LENGTH} characters, "
+            f"but it is {len(text)} characters."
+        )
+
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, Real) and not isinstance(value, bool)
+
+
+def _check_numbers(value: Any, length: int, where: str, nullable: bool = False) -> None:
+    if not isinstance(value, list) or len(value) != length:
+        raise ValidationError(f"{where} must be a list of {length} numbers.")
+    for item in value:
+        if not (_is_number(item) or (nullable and item is None)):
+            raise ValidationError(f"{where} must be a list of {length} numbers.")
+
+
+def _check_antenna_state(value: Any, where: str) -> None:
+    if not isinstance(value, dict):
+        raise ValidationError(f"{where} must be an object.")
+    for key in ("amp", "freq", "pos"):
+        item = value.get(key)
+        if not (item is None or _is_number(item)):
+            raise ValidationError(f"{where}['{key}'] must be a number or null.")
+
+
+def _check_keyframe(track: str, keyframe: Any, where: str) -> None:
+    if not isinstance(keyframe, dict):
+        raise ValidationError(f"{where} must be an object.")
+    duration: Any = keyframe.get("duration")
+    if not _is_number(duration) or duration <= 0:
+        raise ValidationError(f"{where}['duration'] must be a positive number.")
+    if "ease" in keyframe:
+        _check_numbers(keyframe["ease"], 4, f"{where}['ease']")
+    # The other keys are optional, and are checked only if they are given.
+    if track == "head":
+        for key in ("p0", "p1", "p2", "p3"):
+            if key in keyframe:
+                _check_numbers(keyframe[key], 2, f"{where}['{key}']", nullable=True)
+    elif track == "antenna":
+        for key in ("start", "end"):
+            if key in keyframe:
+                _check_antenna_state(keyframe[key], f"{where}['{key}']")
+    else:
+        for key in ("start", "end"):
+            if key in keyframe:
+                _check_numbers(keyframe[key], 4, f"{where}['{key}']")
+
+
+def _validate_motion(payload: Any) -> None:
+    # Checks the structure of the original motion, as in assets/sample_motion.json.
+    if not isinstance(payload, dict) or not payload:
+        raise ValidationError("The motion must be an object with at least one track.")
+    for track, keyframes in payload.items():
+        if track not in _MOTION_TRACKS:
+            raise ValidationError(
+                f"Unknown motion track '{track}'. "
+                f"The track must be one of {', '.join(_MOTION_TRACKS)}."
+            )
+        # An empty list is allowed, as in the template of examples/send_data_to_room.py.
+        if not isinstance(keyframes, list):
+            raise ValidationError(f"motion['{track}'] must be a list.")
+        for i, keyframe in enumerate(keyframes):
+            _check_keyframe(track, keyframe, f"motion['{track}'][{i}]")
@@ -10,11 +10,12 @@ client = AsyncClient()
 
 
 async def main():
-    rooms_id_list = await client.get_rooms_id()
-    room = client.create_room_client(rooms_id_list[0])
-    await no_webhook_setting()
-    await send_over_sized_msg(room)
-    # await over_rate_limit() ## After calling this method, wait 1 minute until rate limit released.
+    async with client:
+        rooms_id_list = await client.get_rooms_id()
+        room = client.create_room_client(rooms_id_list[0])
+        await no_webhook_setting()
+        await send_over_sized_msg(room)
+        # await over_rate_limit() ## After calling this method, wait 1 minute until rate limit released.
 
 
 async def no_webhook_setting():
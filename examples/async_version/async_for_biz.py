@@ -17,25 +17,26 @@ client = BizBasicAsyncClient()
 
 
 async def main():
-    await get_account_info()
-
-    await delete_account_info()
-
-    account_info = AccountInfo(
-        name="ユカイ太郎",
-        name_furigana="ゆかいたろう",
-        organization_name="ユカイ工学株式会社",
-        organization_unit_name="ソフトウェア事業部",
-        phone_number="01200001111",
-    )
-    await change_account_info(account_info)
-
-    broadcast_msg = BroadcastMsg(
-        title="テスト", text="テスト", executed_at=1819300000, immediate=True
-    )
-    await create_broadcast_msg(api_key, broadcast_msg)
-
-    await get_broadcast_msgs()
+    async with client:
+        await get_account_info()
+
+        await delete_account_info()
+
+        account_info = AccountInfo(
+            name="ユカイ太郎",
+            name_furigana="ゆかいたろう",
+            organization_name="ユカイ工学株式会社",
+            organization_unit_name="ソフトウェア事業部",
+            phone_number="01200001111",
+        )
+        await change_account_info(account_info)
+
+        broadcast_msg = BroadcastMsg(
+            title="テスト", text="テスト", executed_at=1819300000, immediate=True
+        )
+        await create_broadcast_msg(api_key, broadcast_msg)
+
+        await get_broadcast_msgs()
 
 
 async def get_account_info():
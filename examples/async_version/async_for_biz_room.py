@@ -16,15 +16,16 @@ client = BizBasicAsyncClient()
 
 
 async def main():
-    rooms_id = await client.get_rooms_id(api_key)
+    async with client:
+        rooms_id = await client.get_rooms_id(api_key)
 
-    # give api_key to room client
-    room_client = client.create_room_client(api_key, rooms_id[0])
+        # give api_key to room client
+        room_client = client.create_room_client(api_key, rooms_id[0])
 
-    # need not to give api_key to room client method
-    # if you want to change api_key, please create another room_client for each api_key
-    response = await room_client.get_msgs()
-    print(response)
+        # need not to give api_key to room client method
+        # if you want to change api_key, please create another room_client for each api_key
+        response = await room_client.get_msgs()
+        print(response)
 
 
 if __name__ == "__main__":
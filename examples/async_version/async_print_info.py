@@ -10,11 +10,12 @@ client = AsyncClient()
 
 
 async def main():
-    await get_account_info()
-    await get_rooms_list()
-    await get_stamps_list()
-    await get_motions_list()
-    # await delete_account_info() # After executing this method, you need to login web page to revive account.
+    async with client:
+        await get_account_info()
+        await get_rooms_list()
+        await get_stamps_list()
+        await get_motions_list()
+        # await delete_account_info() # After executing this method, you need to login web page to revive account.
 
 
 async def get_account_info():
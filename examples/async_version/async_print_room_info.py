@@ -10,13 +10,14 @@ client = AsyncClient()
 
 
 async def main():
-    rooms_id_list = await client.get_rooms_id()
-    # create room client
-    room = client.create_room_client(rooms_id_list[0])
-    await get_latest_msg(room)
-    await get_sensors_list(room)
-    await get_sensor_values(room)
-    await get_emo_settings(room)
+    async with client:
+        rooms_id_list = await client.get_rooms_id()
+        # create room client
+        room = client.create_room_client(rooms_id_list[0])
+        await get_latest_msg(room)
+        await get_sensors_list(room)
+        await get_sensor_values(room)
+        await get_emo_settings(room)
 
 
 async def get_latest_msg(room):
@@ -16,54 +16,55 @@ room = []
 
 async def main():
     global room
-    rooms_id_list = await client.get_rooms_id()
-    # create room client
-    room = client.create_room_client(rooms_id_list[0])
-
-    """
-    Uncomment code block you want to execute.
-    If you execute a lot, watch out for the API rate limit.
-    """
-
-    # audio_data_path = f"{THIS_FILE_PATH}/../../assets/sample_audio.mp3"
-    # await send_audio_msg(audio_data_path)
-
-    # image_data_path = f"{THIS_FILE_PATH}/../../assets/sample_image.jpg"
-    # await send_image(image_data_path)
-
-    # text = "こんにちは"
-    # await send_msg(text)
-
-    # await send_all_stamp_motions()
-
-    # motion_data_path = f"{THIS_FILE_PATH}/../../assets/sample_motion.json"
-    # await send_original_motion(motion_data_path)
-
-    # motion_data = {
-    #     "head": [
-    #     ],
-    #     "antenna": [
-    #     ],
-    #     "led_cheek_l": [
-    #     ],
-    #     "led_cheek_r": [
-    #     ],
-    #     "led_play": [
-    #     ],
-    #     "led_rec": [
-    #     ],
-    #     "led_func": [
-    #     ]
-    # }
-    # await send_original_motion(motion_data) # send original motion by dict data
-
-    # color = Color(100, 255, 155)
-    # await change_led_color(color)
-
-    # head = Head(45, 10)
-    # await move_to(head)
-
-    # await send_all_preset_motions()
+    async with client:
+        rooms_id_list = await client.get_rooms_id()
+        # create room client
+        room = client.create_room_client(rooms_id_list[0])
+
+        """
+        Uncomment code block you want to execute.
+        If you execute a lot, watch out for the API rate limit.
+        """
+
+        # audio_data_path = f"{THIS_FILE_PATH}/../../assets/sample_audio.mp3"
+        # await send_audio_msg(audio_data_path)
+
+        # image_data_path = f"{THIS_FILE_PATH}/../../assets/sample_image.jpg"
+        # await send_image(image_data_path)
+
+        # text = "こんにちは"
+        # await send_msg(text)
+
+        # await send_all_stamp_motions()
+
+        # motion_data_path = f"{THIS_FILE_PATH}/../../assets/sample_motion.json"
+        # await send_original_motion(motion_data_path)
+
+        # motion_data = {
+        #     "head": [
+        #     ],
+        #     "antenna": [
+        #     ],
+        #     "led_cheek_l": [
+        #     ],
+        #     "led_cheek_r": [
+        #     ],
+        #     "led_play": [
+        #     ],
+        #     "led_rec": [
+        #     ],
+        #     "led_func": [
+        #     ]
+        # }
+        # await send_original_motion(motion_data) # send original motion by dict data
+
+        # color = Color(100, 255, 155)
+        # await change_led_color(color)
+
+        # head = Head(45, 10)
+        # await move_to(head)
+
+        # await send_all_preset_motions()
 
 
 async def send_audio_msg(audio_data_path):
@@ -10,13 +10,14 @@ client = AsyncClient()
 
 
 async def main():
-    webhook = WebHook("http://localhost:8000", "test")
-    events = ["message.received"]
-    await create_webhook_setting(webhook)
-    await get_webhook_setting()
-    await register_webhook_event(events)
-    await get_webhook_setting()
-    await delete_webhook_setting()
+    async with client:
+        webhook = WebHook("http://localhost:8000", "test")
+        events = ["message.received"]
+        await create_webhook_setting(webhook)
+        await get_webhook_setting()
+        await register_webhook_event(events)
+        await get_webhook_setting()
+        await delete_webhook_setting()
 
 
 async def create_webhook_setting(webhook):
@@ -1,17 +1,52 @@
+import base64
+import io
 import json
 import os
+import tempfile
+import threading
 import time
 import unittest
 from functools import partial
 from threading import Thread
+from unittest import mock
 
 import requests
 import responses
 
-from emo_platform import Client
-from emo_platform.exceptions import NoRoomError, TokenError, UnauthorizedError
-from emo_platform.response import RoomInfo, EmoRoomInfo, Listing
+from emo_platform import (
+    BizAdvancedClient,
+    CircuitBreaker,
+    Client,
+    Color,
+    Head,
+    MessageArchive,
+    MotionRegistry,
+    MotionTimeline,
+    RateLimiter,
+    ResponseCache,
+    RetryPolicy,
+    WebHook,
+)
+from emo_platform.auth import TokenManager
+from emo_platform.exceptions import (
+    CircuitOpenError,
+    DeadlineExceededError,
+    NoRoomError,
+    NotFoundError,
+    RateLimitError,
+    TokenError,
+    UnauthorizedError,
+    UnknownError,
+    ValidationError,
+)
+from emo_platform.response import RoomInfo, EmoRoomInfo, EmoMessageInfo, Listing
 from emo_platform.models import Tokens
+from emo_platform.upload import _load_json
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
 
 EMO_PLATFORM_TEST_PATH = os.path.abspath(os.path.dirname(__file__))
 TOKEN_FILE = f"{EMO_PLATFORM_TEST_PATH}/../emo_platform/tokens/emo-platform-api.json"
@@ -118,6 +153,44 @@ class TestBaseClass(object):
             content_type="application/json",
         )
 
+    def msgs_init(self, sequences, page_size=3):
+        self.test_room_id = "52b0e129-2512-4696-9d06-8ddb842ba6ce"
+        self.test_sequences = sequences
+        self.msgs_requests = []
+
+        def msgs_callback(request):
+            before = request.params.get("before")
+            self.msgs_requests.append(before)
+            sequences = sorted(self.test_sequences, reverse=True)
+            if before is not None:
+                sequences = [seq for seq in sequences if seq < int(before)]
+            messages = [self.make_msg(seq) for seq in sequences[:page_size]]
+            return 200, {}, json.dumps({"messages": messages})
+
+        self.responses.add_callback(
+            responses.GET,
+            self.test_endpoint + "/v1/rooms/" + self.test_room_id + "/messages",
+            callback=msgs_callback,
+            content_type="application/json",
+        )
+
+    def make_msg(self, sequence, media="text"):
+        return {
+            "sequence": sequence,
+            "unique_id": f"msg_{sequence}",
+            "user": {
+                "uuid": "user_uuid",
+                "user_type": "emo",
+                "nickname": "BOCCO emo",
+                "profile_image": "",
+            },
+            "message": {"ja": f"message {sequence}"},
+            "media": media,
+            "audio_url": "",
+            "image_url": "",
+            "lang": "ja",
+        }
+
     def set_tokens(self):
         os.environ["EMO_PLATFORM_API_REFRESH_TOKEN"] = self.right_refresh_token
         os.environ["EMO_PLATFORM_API_ACCESS_TOKEN"] = self.right_access_token
@@ -305,14 +378,116 @@ class TestCheckHttpError(unittest.TestCase, TestBaseClass):
         os.environ["EMO_PLATFORM_API_ACCESS_TOKEN"] = self.wrong_access_token
 
         client = Client(self.test_endpoint)
-        request = partial(
-            requests.get, self.test_endpoint + "/v1/me", headers=client._headers
-        )
+        request = partial(client._request, "GET", "/v1/me")
         self.assertEqual(
             client._check_http_error(request=request), self.test_account_info
         )
 
 
+class TestRefreshTokens(unittest.TestCase, TestBaseClass):
+    def setUp(self):
+        super().init()
+        self.addCleanup(self.responses.stop)
+        self.addCleanup(self.responses.reset)
+
+    def refresh_count(self):
+        return len(
+            [
+                call
+                for call in self.responses.calls
+                if call.request.url.endswith("/oauth/token/refresh")
+            ]
+        )
+
+    def test_single_flight_refresh(self):
+        os.environ["EMO_PLATFORM_API_ACCESS_TOKEN"] = self.wrong_access_token
+        os.environ["EMO_PLATFORM_API_REFRESH_TOKEN"] = self.right_refresh_token
+        client = Client(self.test_endpoint)
+
+        results = []
+        threads = [
+            Thread(target=lambda: results.append(client.get_account_info()))
+            for _ in range(10)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results, [self.test_account_info] * 10)
+        self.assertEqual(self.refresh_count(), 1)
+
+    def test_single_flight_refresh_error(self):
+        os.environ["EMO_PLATFORM_API_ACCESS_TOKEN"] = self.wrong_access_token
+        os.environ["EMO_PLATFORM_API_REFRESH_TOKEN"] = self.wrong_refresh_token
+        client = Client(self.test_endpoint)
+
+        errors = []
+
+        def get_account_info():
+            try:
+                client.get_account_info()
+            except TokenError as e:
+                errors.append(e)
+
+        threads = [Thread(target=get_account_info) for _ in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(errors), 10)
+
+
+class TestTokenExpiration(unittest.TestCase, TestBaseClass):
+    def setUp(self):
+        super().init()
+        self.addCleanup(self.responses.stop)
+        self.addCleanup(self.responses.reset)
+
+    def create_jwt(self, exp):
+        def encode(data):
+            return base64.urlsafe_b64encode(json.dumps(data).encode()).decode().rstrip("=")
+
+        return ".".join([encode({"alg": "none"}), encode({"exp": exp}), "signature"])
+
+    def test_get_expiration(self):
+        exp = int(time.time()) + 3600
+        tokens = Tokens(access_token=self.create_jwt(exp))
+        tm = TokenManager(tokens, use_cached_credentials=True)
+        self.assertEqual(tm.get_expiration(), exp)
+        self.assertFalse(tm.is_expiring(60))
+        self.assertTrue(tm.is_expiring(3600))
+
+        tokens = Tokens(access_token=self.right_access_token)
+        tm = TokenManager(tokens, use_cached_credentials=True)
+        self.assertIsNone(tm.get_expiration())
+        self.assertFalse(tm.is_expiring(60))
+
+        tm = TokenManager(tokens, use_cached_credentials=True, access_token_ttl=100)
+        self.assertAlmostEqual(tm.get_expiration(), time.time() + 100, delta=1)
+
+    def test_renew_before_expiration(self):
+        self.right_access_token = self.create_jwt(int(time.time()) + 3600)
+        tokens = Tokens(
+            access_token=self.create_jwt(int(time.time()) + 30),
+            refresh_token=self.right_refresh_token,
+        )
+        client = Client(self.test_endpoint, tokens=tokens, use_cached_credentials=True)
+        self.assertEqual(client.get_account_info(), self.test_account_info)
+        self.assertEqual(client.get_account_info(), self.test_account_info)
+
+        urls = [call.request.url for call in self.responses.calls]
+        self.assertEqual(
+            urls,
+            [
+                self.test_endpoint + "/oauth/token/refresh",
+                self.test_endpoint + "/v1/me",
+                self.test_endpoint + "/v1/me",
+            ],
+        )
+
+
 class TestGetRoomsId(unittest.TestCase, TestBaseClass):
     def setUp(self):
         super().init()
@@ -383,3 +558,972 @@ class TestWebhookRegister(unittest.TestCase, TestBaseClass):
         self.assertEqual(
             client._webhook_events_cb["test_event"][new_room_uuid](), return_val_new
         )
+
+
+class TestSession(unittest.TestCase, TestBaseClass):
+    def setUp(self):
+        super().init()
+        super().set_tokens()
+        self.addCleanup(self.responses.stop)
+        self.addCleanup(self.responses.reset)
+
+    def test_pool_setting(self):
+        client = Client(self.test_endpoint, pool_connections=2, pool_maxsize=20)
+        adapter = client._session.get_adapter(self.test_endpoint)
+        self.assertEqual(adapter._pool_connections, 2)
+        self.assertEqual(adapter._pool_maxsize, 20)
+
+    def test_context_manager(self):
+        client = Client(self.test_endpoint)
+        with mock.patch.object(client._session, "close") as close:
+            with client:
+                self.assertEqual(client.get_account_info(), self.test_account_info)
+                close.assert_not_called()
+        close.assert_called_once()
+
+
+class TestRequestHeaders(unittest.TestCase, TestBaseClass):
+    def setUp(self):
+        super().init()
+        super().set_tokens()
+        self.addCleanup(self.responses.stop)
+        self.addCleanup(self.responses.reset)
+
+        def rooms_info_callback(request):
+            time.sleep(0.01)
+            room_info = {
+                "uuid": request.headers["X-Channel-User"],
+                "name": "test_room",
+                "room_type": "test",
+                "room_members": [],
+            }
+            body = {
+                "listing": {"offset": 0, "limit": 0, "total": 0},
+                "rooms": [room_info],
+            }
+            return 200, {}, json.dumps(body)
+
+        self.responses.add_callback(
+            responses.GET,
+            self.test_endpoint + "/v1/rooms",
+            callback=rooms_info_callback,
+            content_type="application/json",
+        )
+
+    def test_api_key_per_thread(self):
+        client = BizAdvancedClient(self.test_endpoint)
+        results = {}
+
+        def get_room_uuid(api_key):
+            results[api_key] = client.get_rooms_list(api_key).rooms[0].uuid
+
+        api_keys = [f"API_KEY_{i}" for i in range(10)]
+        threads = [Thread(target=get_room_uuid, args=(key,)) for key in api_keys]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, {key: key for key in api_keys})
+
+    def test_no_api_key_after_request(self):
+        client = BizAdvancedClient(self.test_endpoint)
+        client.get_rooms_list("API_KEY")
+        self.assertEqual(client._get_account_info(), self.test_account_info)
+        self.assertNotIn("X-Channel-User", self.responses.calls[-1].request.headers)
+
+
+class TestRateLimiter(unittest.TestCase, TestBaseClass):
+    def setUp(self):
+        super().init()
+        super().set_tokens()
+        self.addCleanup(self.responses.stop)
+        self.addCleanup(self.responses.reset)
+
+    def test_throttle_requests(self):
+        rate_limiter = RateLimiter(requests_per_minute=600, burst=1)
+        client = Client(self.test_endpoint, rate_limiter=rate_limiter)
+        start = time.monotonic()
+        for _ in range(3):
+            self.assertEqual(client.get_account_info(), self.test_account_info)
+        self.assertGreaterEqual(time.monotonic() - start, 0.18)
+
+    def test_per_api_key(self):
+        rate_limiter = RateLimiter(requests_per_minute=60, burst=1, per_api_key=True)
+        self.assertEqual(rate_limiter._reserve("API_KEY_1"), 0)
+        self.assertEqual(rate_limiter._reserve("API_KEY_2"), 0)
+        self.assertGreater(rate_limiter._reserve("API_KEY_1"), 0)
+
+        rate_limiter = RateLimiter(requests_per_minute=60, burst=1)
+        self.assertEqual(rate_limiter._reserve("API_KEY_1"), 0)
+        self.assertGreater(rate_limiter._reserve("API_KEY_2"), 0)
+
+    def test_first_minute(self):
+        # Calls as fast as the limiter allows, with a fake clock.
+        now = [1000.0]
+        with mock.patch("emo_platform.ratelimit.time.monotonic", lambda: now[0]):
+            rate_limiter = RateLimiter(requests_per_minute=60)
+            sent_at = []
+            while now[0] < 1060:
+                sent_at.append(now[0] + rate_limiter._reserve(None))
+                now[0] = sent_at[-1]
+        self.assertEqual(len([t for t in sent_at if t < 1060]), 60)
+
+
+class TestRetryPolicy(unittest.TestCase, TestBaseClass):
+    def setUp(self):
+        super().init()
+        super().set_tokens()
+        self.addCleanup(self.responses.stop)
+        self.addCleanup(self.responses.reset)
+        self.client = Client(
+            self.test_endpoint, retry_policy=RetryPolicy(backoff_factor=0)
+        )
+
+    def test_get_delay(self):
+        policy = RetryPolicy(backoff_factor=1, max_backoff=3, jitter=False)
+        self.assertEqual(policy.get_delay(1, status=503), 1)
+        self.assertEqual(policy.get_delay(2, status=503), 2)
+        self.assertEqual(policy.get_delay(2, status=503, retry_after="10"), 3)
+        self.assertIsNone(policy.get_delay(3, status=503))
+        self.assertIsNone(policy.get_delay(1, status=400))
+        self.assertIsNone(policy.get_delay(1, status=503, idempotent=False))
+        self.assertEqual(policy.get_delay(1, status=429, idempotent=False), 1)
+        self.assertIsNone(policy.get_delay(1, idempotent=False))
+
+    def test_retry_get(self):
+        url = self.test_endpoint + "/v1/stamps"
+        self.responses.add(responses.GET, url, status=503)
+        self.responses.add(responses.GET, url, status=429, headers={"Retry-After": "0"})
+        self.responses.add(responses.GET, url, json={"stamps": []})
+        self.assertEqual(self.client._get("/v1/stamps"), {"stamps": []})
+        self.assertEqual(len(self.responses.calls), 3)
+
+    def test_retry_exhausted(self):
+        url = self.test_endpoint + "/v1/stamps"
+        self.responses.add(responses.GET, url, status=429)
+        with self.assertRaises(RateLimitError):
+            self.client._get("/v1/stamps")
+        self.assertEqual(len(self.responses.calls), 3)
+
+    def test_no_retry_post(self):
+        url = self.test_endpoint + "/v1/broadcast_messages"
+        self.responses.add(responses.POST, url, status=500)
+        with self.assertRaises(UnknownError):
+            self.client._post("/v1/broadcast_messages")
+        self.assertEqual(len(self.responses.calls), 1)
+
+    def test_retry_post_rate_limit(self):
+        url = self.test_endpoint + "/v1/broadcast_messages"
+        self.responses.add(responses.POST, url, status=429)
+        self.responses.add(responses.POST, url, json={})
+        self.assertEqual(self.client._post("/v1/broadcast_messages"), {})
+        self.assertEqual(len(self.responses.calls), 2)
+
+
+class TestSendToRooms(unittest.TestCase, TestBaseClass):
+    def setUp(self):
+        super().init()
+        super().set_tokens()
+        self.addCleanup(self.responses.stop)
+        self.addCleanup(self.responses.reset)
+        self.room_ids = [f"room_{i}" for i in range(10)]
+
+    def test_ordered(self):
+        client = Client(self.test_endpoint)
+        thread_ids = set()
+
+        def action(room):
+            thread_ids.add(threading.get_ident())
+            time.sleep(0.01)
+            if room.room_id == "room_3":
+                raise NoRoomError("no room")
+            return room.room_id
+
+        results = list(
+            client.send_to_rooms(self.room_ids, action, max_workers=3, ordered=True)
+        )
+        self.assertEqual([r.room_id for r in results], self.room_ids)
+        self.assertLessEqual(len(thread_ids), 3)
+        self.assertIsInstance(results[3].exception, NoRoomError)
+        self.assertEqual(
+            [r.result for r in results if r.ok],
+            [room_id for room_id in self.room_ids if room_id != "room_3"],
+        )
+
+    def test_completion_order(self):
+        client = Client(self.test_endpoint)
+
+        def action(room):
+            time.sleep(0.05 if room.room_id == "room_0" else 0)
+            return client._get_account_info()
+
+        results = list(client.send_to_rooms(self.room_ids, action, max_workers=5))
+        self.assertEqual(results[-1].room_id, "room_0")
+        self.assertTrue(all(r.result == self.test_account_info for r in results))
+
+
+class TestTimeout(unittest.TestCase, TestBaseClass):
+    def setUp(self):
+        super().init()
+        super().set_tokens()
+        self.addCleanup(self.responses.stop)
+        self.addCleanup(self.responses.reset)
+
+    def test_timeout(self):
+        client = Client(self.test_endpoint, connect_timeout=5, read_timeout=20)
+        with mock.patch.object(
+            client._session, "request", wraps=client._session.request
+        ) as request:
+            client.get_account_info()
+            self.assertEqual(request.call_args.kwargs["timeout"], (5, 20))
+            with client.deadline(1):
+                client.get_account_info()
+            connect_timeout, read_timeout = request.call_args.kwargs["timeout"]
+            self.assertLessEqual(connect_timeout, 1)
+            self.assertLessEqual(read_timeout, 1)
+
+    def test_deadline_before_retry(self):
+        client = Client(self.test_endpoint)
+        self.responses.add(
+            responses.GET,
+            self.test_endpoint + "/v1/stamps",
+            status=503,
+            headers={"Retry-After": "10"},
+        )
+        start = time.monotonic()
+        with self.assertRaises(DeadlineExceededError):
+            with client.deadline(1):
+                client._get("/v1/stamps")
+        self.assertLess(time.monotonic() - start, 1)
+        self.assertEqual(len(self.responses.calls), 1)
+
+    def test_deadline_with_rate_limiter(self):
+        rate_limiter = RateLimiter(requests_per_minute=1, burst=1)
+        client = Client(self.test_endpoint, rate_limiter=rate_limiter)
+        with client.deadline(1):
+            client.get_account_info()
+            with self.assertRaises(DeadlineExceededError):
+                client.get_account_info()
+        self.assertEqual(len(self.responses.calls), 1)
+
+
+class TestCircuitBreaker(unittest.TestCase, TestBaseClass):
+    def setUp(self):
+        super().init()
+        super().set_tokens()
+        self.addCleanup(self.responses.stop)
+        self.addCleanup(self.responses.reset)
+
+    def test_open_and_recover(self):
+        circuit_breaker = CircuitBreaker(failure_threshold=2, recovery_timeout=0.1)
+        client = Client(
+            self.test_endpoint,
+            retry_policy=RetryPolicy(max_attempts=1),
+            circuit_breaker=circuit_breaker,
+        )
+        url = self.test_endpoint + "/v1/stamps"
+        self.responses.add(responses.GET, url, status=503)
+        self.responses.add(responses.GET, url, status=503)
+        self.responses.add(responses.GET, url, status=503)
+        self.responses.add(responses.GET, url, json={"stamps": []})
+
+        for _ in range(2):
+            with self.assertRaises(UnknownError):
+                client._get("/v1/stamps")
+        self.assertEqual(circuit_breaker.state, CircuitBreaker.OPEN)
+        with self.assertRaises(CircuitOpenError):
+            client._get("/v1/stamps")
+        self.assertEqual(len(self.responses.calls), 2)
+
+        # the failed trial call opens the circuit again
+        time.sleep(0.1)
+        self.assertEqual(circuit_breaker.state, CircuitBreaker.HALF_OPEN)
+        with self.assertRaises(UnknownError):
+            client._get("/v1/stamps")
+        self.assertEqual(circuit_breaker.state, CircuitBreaker.OPEN)
+
+        time.sleep(0.1)
+        self.assertEqual(client._get("/v1/stamps"), {"stamps": []})
+        self.assertEqual(circuit_breaker.state, CircuitBreaker.CLOSED)
+
+    def test_half_open_max_calls(self):
+        circuit_breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=0.01)
+        circuit_breaker._record_failure()
+        time.sleep(0.01)
+        circuit_breaker._before_request()
+        with self.assertRaises(CircuitOpenError):
+            circuit_breaker._before_request()
+        circuit_breaker._release()
+        circuit_breaker._before_request()
+
+    def test_open_before_rate_limit(self):
+        circuit_breaker = CircuitBreaker(failure_threshold=1)
+        circuit_breaker._record_failure()
+        rate_limiter = RateLimiter(requests_per_minute=1, burst=1)
+        client = Client(
+            self.test_endpoint,
+            rate_limiter=rate_limiter,
+            circuit_breaker=circuit_breaker,
+        )
+        start = time.monotonic()
+        for _ in range(3):
+            with self.assertRaises(CircuitOpenError):
+                client._get("/v1/stamps")
+        self.assertLess(time.monotonic() - start, 1)
+        # the rejected calls have not used the rate limit
+        self.assertTrue(rate_limiter.acquire(None, 0))
+
+
+class TestResponseCache(unittest.TestCase, TestBaseClass):
+    def setUp(self):
+        super().init()
+        super().set_tokens()
+        self.addCleanup(self.responses.stop)
+        self.addCleanup(self.responses.reset)
+
+        self.webhook_info = {
+            "description": "",
+            "events": [],
+            "status": "",
+            "secret": "",
+            "url": "http://test_webhook.com",
+        }
+        self.responses.add(
+            responses.GET, self.test_endpoint + "/v1/webhook", json=self.webhook_info
+        )
+        self.responses.add(
+            responses.PUT, self.test_endpoint + "/v1/webhook", json=self.webhook_info
+        )
+
+    def count_calls(self, method, path):
+        return len(
+            [
+                call
+                for call in self.responses.calls
+                if call.request.method == method
+                and call.request.url == self.test_endpoint + path
+            ]
+        )
+
+    def test_cache_hit(self):
+        client = Client(self.test_endpoint, response_cache=ResponseCache())
+        for _ in range(3):
+            self.assertEqual(client.get_account_info(), self.test_account_info)
+        self.assertEqual(self.count_calls("GET", "/v1/me"), 1)
+
+    def test_ttl(self):
+        cache = ResponseCache(ttl=0.05, ttls={"webhook": 0})
+        client = Client(self.test_endpoint, response_cache=cache)
+        client.get_account_info()
+        client.get_webhook_setting()
+        client.get_webhook_setting()
+        self.assertEqual(self.count_calls("GET", "/v1/webhook"), 2)
+        time.sleep(0.05)
+        client.get_account_info()
+        self.assertEqual(self.count_calls("GET", "/v1/me"), 2)
+
+    def test_lru(self):
+        cache = ResponseCache(maxsize=1)
+        client = Client(self.test_endpoint, response_cache=cache)
+        client.get_account_info()
+        client.get_webhook_setting()
+        client.get_account_info()
+        self.assertEqual(self.count_calls("GET", "/v1/me"), 2)
+        self.assertEqual(len(cache), 1)
+
+    def test_invalidate(self):
+        cache = ResponseCache()
+        client = Client(self.test_endpoint, response_cache=cache)
+        client.get_webhook_setting()
+        client.change_webhook_setting(WebHook("http://test_webhook.com"))
+        client.get_webhook_setting()
+        self.assertEqual(self.count_calls("GET", "/v1/webhook"), 2)
+
+        client.get_account_info()
+        cache.invalidate("me")
+        client.get_account_info()
+        client.get_webhook_setting()
+        self.assertEqual(self.count_calls("GET", "/v1/me"), 2)
+        self.assertEqual(self.count_calls("GET", "/v1/webhook"), 2)
+
+    def test_api_key(self):
+        super().room_init()
+        client = BizAdvancedClient(self.test_endpoint, response_cache=ResponseCache())
+        client.get_rooms_list("API_KEY_1")
+        client.get_rooms_list("API_KEY_2")
+        client.get_rooms_list("API_KEY_1")
+        self.assertEqual(self.count_calls("GET", "/v1/rooms"), 2)
+
+
+class TestConditionalGet(unittest.TestCase, TestBaseClass):
+    def setUp(self):
+        super().init()
+        super().set_tokens()
+        self.addCleanup(self.responses.stop)
+        self.addCleanup(self.responses.reset)
+
+        self.stamps_info = {
+            "listing": {"offset": 0, "limit": 0, "total": 0},
+            "stamps": [],
+        }
+        self.etag = '"stamps_v1"'
+
+        def stamps_callback(request):
+            if self.etag is None:
+                return 200, {}, json.dumps(self.stamps_info)
+            if request.headers.get("If-None-Match") == self.etag:
+                return 304, {"ETag": self.etag}, ""
+            return 200, {"ETag": self.etag}, json.dumps(self.stamps_info)
+
+        self.responses.add_callback(
+            responses.GET,
+            self.test_endpoint + "/v1/stamps",
+            callback=stamps_callback,
+            content_type="application/json",
+        )
+
+    def test_not_modified(self):
+        client = Client(self.test_endpoint)
+        stamps_info = client.get_stamps_list()
+        self.assertNotIn("If-None-Match", self.responses.calls[-1].request.headers)
+        self.assertIs(client.get_stamps_list(), stamps_info)
+        self.assertEqual(
+            self.responses.calls[-1].request.headers["If-None-Match"], self.etag
+        )
+
+        self.etag = '"stamps_v2"'
+        self.assertIsNot(client.get_stamps_list(), stamps_info)
+
+    def test_no_validator(self):
+        self.etag = None
+        client = Client(self.test_endpoint)
+        client.get_stamps_list()
+        client.get_stamps_list()
+        self.assertNotIn("If-None-Match", self.responses.calls[-1].request.headers)
+
+
+class TestCoalesceRequests(unittest.TestCase, TestBaseClass):
+    def setUp(self):
+        super().init()
+        super().set_tokens()
+        self.addCleanup(self.responses.stop)
+        self.addCleanup(self.responses.reset)
+
+        self.timeouts = 0
+
+        def stamps_callback(request):
+            time.sleep(0.1)
+            if self.timeouts > 0:
+                self.timeouts -= 1
+                raise requests.ReadTimeout()
+            body = {"listing": {"offset": 0, "limit": 0, "total": 0}, "stamps": []}
+            return 200, {}, json.dumps(body)
+
+        self.responses.add_callback(
+            responses.GET,
+            self.test_endpoint + "/v1/stamps",
+            callback=stamps_callback,
+            content_type="application/json",
+        )
+
+    def test_coalesce(self):
+        client = Client(self.test_endpoint)
+        results = []
+
+        def get_stamps_list():
+            results.append(client.get_stamps_list())
+
+        threads = [Thread(target=get_stamps_list) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(self.responses.calls), 1)
+        self.assertEqual(len(results), 5)
+        self.assertTrue(all(result is results[0] for result in results))
+
+        # the next call after the previous one finished is sent again
+        client.get_stamps_list()
+        self.assertEqual(len(self.responses.calls), 2)
+
+    def test_follower_without_deadline(self):
+        client = Client(self.test_endpoint)
+        # the call with the deadline times out
+        self.timeouts = 1
+        errors = []
+
+        def get_stamps_list_with_deadline():
+            try:
+                with client.deadline(0.05):
+                    client.get_stamps_list()
+            except DeadlineExceededError as e:
+                errors.append(e)
+
+        thread = Thread(target=get_stamps_list_with_deadline)
+        thread.start()
+        time.sleep(0.02)
+        # joins the call with the deadline, and then calls again by itself
+        stamps_info = client.get_stamps_list()
+        thread.join()
+        self.assertEqual(len(errors), 1)
+        self.assertEqual(stamps_info.stamps, [])
+        self.assertEqual(len(self.responses.calls), 2)
+
+
+class TestIterMsgs(unittest.TestCase, TestBaseClass):
+    def setUp(self):
+        super().init()
+        super().set_tokens()
+        super().msgs_init(list(range(1, 11)))
+        self.addCleanup(self.responses.stop)
+        self.addCleanup(self.responses.reset)
+
+    def test_iter_all(self):
+        room = Client(self.test_endpoint).create_room_client(self.test_room_id)
+        sequences = [msg.sequence for msg in room.iter_msgs()]
+        self.assertEqual(sequences, list(range(10, 0, -1)))
+        self.assertEqual(self.msgs_requests, [None, "8", "5", "2", "1"])
+
+    def test_since_until(self):
+        room = Client(self.test_endpoint).create_room_client(self.test_room_id)
+        sequences = [msg.sequence for msg in room.iter_msgs(since=3, until=9)]
+        self.assertEqual(sequences, [8, 7, 6, 5, 4, 3])
+        self.assertEqual(self.msgs_requests, ["9", "6"])
+
+    def test_stop_early(self):
+        room = Client(self.test_endpoint).create_room_client(self.test_room_id)
+        msgs = room.iter_msgs()
+        self.assertEqual(next(msgs).sequence, 10)
+        msgs.close()
+        # at most the first page and the prefetched second page are requested
+        time.sleep(0.05)
+        self.assertLessEqual(len(self.msgs_requests), 2)
+
+    def test_tail_msgs(self):
+        room = Client(self.test_endpoint).create_room_client(self.test_room_id)
+        msgs = room.tail_msgs(min_interval=0.01, max_interval=0.02)
+        # starts from the latest message at the first request
+        threading.Timer(0.05, self.test_sequences.append, [11]).start()
+        self.assertEqual(next(msgs).sequence, 11)
+        msgs.close()
+
+    def test_tail_msgs_backfill(self):
+        room = Client(self.test_endpoint).create_room_client(self.test_room_id)
+        msgs = room.tail_msgs(after=3, min_interval=0.01, max_interval=0.02)
+        # all messages of the first page are new, so the older pages are fetched too
+        sequences = [next(msgs).sequence for _ in range(7)]
+        self.assertEqual(sequences, list(range(4, 11)))
+        self.test_sequences.extend([11, 12])
+        sequences = [next(msgs).sequence for _ in range(2)]
+        self.assertEqual(sequences, [11, 12])
+        msgs.close()
+
+
+class TestMessageArchive(unittest.TestCase, TestBaseClass):
+    def setUp(self):
+        super().init()
+        super().set_tokens()
+        super().msgs_init(list(range(1, 6)))
+        self.addCleanup(self.responses.stop)
+        self.addCleanup(self.responses.reset)
+
+    def test_sync(self):
+        room = Client(self.test_endpoint).create_room_client(self.test_room_id)
+        with MessageArchive(":memory:") as archive:
+            self.assertEqual(archive.sync(room), 5)
+            self.assertEqual(archive.latest_sequence(self.test_room_id), 5)
+
+            # only the messages newer than the stored ones are requested
+            self.test_sequences.extend([6, 7])
+            self.msgs_requests.clear()
+            self.assertEqual(archive.sync(room), 2)
+            self.assertEqual(self.msgs_requests, [None])
+
+            sequences = [msg.sequence for msg in archive.query(self.test_room_id)]
+            self.assertEqual(sequences, list(range(7, 0, -1)))
+
+    def test_query_while_syncing(self):
+        room = Client(self.test_endpoint).create_room_client(self.test_room_id)
+        with MessageArchive(":memory:") as archive:
+            queried = []
+            original_iter_msgs = room.iter_msgs
+
+            def iter_msgs(since):
+                # The archive is used by another thread while the pages are fetched.
+                thread = Thread(target=lambda: queried.append(archive.query("other")))
+                thread.start()
+                thread.join(timeout=1)
+                yield from original_iter_msgs(since=since)
+
+            with mock.patch.object(room, "iter_msgs", iter_msgs):
+                self.assertEqual(archive.sync(room), 5)
+            self.assertEqual(queried, [[]])
+
+    def test_query(self):
+        archive = MessageArchive(":memory:")
+        self.addCleanup(archive.close)
+        msgs = [
+            EmoMessageInfo(**self.make_msg(1)),
+            EmoMessageInfo(**self.make_msg(2, media="audio")),
+            EmoMessageInfo(**self.make_msg(3)),
+        ]
+        msgs[2].user.uuid = "other_user_uuid"
+        self.assertEqual(archive.store(self.test_room_id, msgs), 3)
+
+        def query(**kwargs):
+            msgs = archive.query(self.test_room_id, **kwargs)
+            return [msg.sequence for msg in msgs]
+
+        self.assertEqual(query(since=2), [3, 2])
+        self.assertEqual(query(until=3), [2, 1])
+        self.assertEqual(query(media="audio"), [2])
+        self.assertEqual(query(user_uuid="user_uuid"), [2, 1])
+        self.assertEqual(query(limit=1), [3])
+        self.assertEqual(archive.query("other_room"), [])
+
+
+class TestUploadMedia(unittest.TestCase, TestBaseClass):
+    def setUp(self):
+        super().init()
+        super().set_tokens()
+        self.addCleanup(self.responses.stop)
+        self.addCleanup(self.responses.reset)
+        self.test_room_id = "52b0e129-2512-4696-9d06-8ddb842ba6ce"
+        self.audio_body = b"ID3" + b"audio" * 100
+        self.upload_bodies = []
+
+        def audio_callback(request):
+            self.upload_bodies.append(request.body)
+            return 200, {}, json.dumps(self.make_msg(1, media="audio"))
+
+        self.responses.add_callback(
+            responses.POST,
+            self.test_endpoint + "/v1/rooms/" + self.test_room_id + "/messages/audio",
+            callback=audio_callback,
+            content_type="application/json",
+        )
+
+    def test_bytes_like(self):
+        room = Client(self.test_endpoint).create_room_client(self.test_room_id)
+        for audio_data in [
+            self.audio_body,
+            bytearray(self.audio_body),
+            memoryview(self.audio_body),
+        ]:
+            room.send_audio_msg(audio_data)
+        for body in self.upload_bodies:
+            self.assertIn(b'filename="audio.mp3"', body)
+            self.assertIn(self.audio_body, body)
+
+    def test_stream(self):
+        room = Client(self.test_endpoint).create_room_client(self.test_room_id)
+        stream = io.BytesIO(self.audio_body)
+        # the stream is sent from the beginning
+        stream.seek(0, io.SEEK_END)
+        room.send_audio_msg(stream)
+        self.assertIn(self.audio_body, self.upload_bodies[0])
+
+    def test_path(self):
+        room = Client(self.test_endpoint).create_room_client(self.test_room_id)
+        room.send_audio_msg(f"{EMO_PLATFORM_TEST_PATH}/../assets/sample_audio.mp3")
+        self.assertIn(b'filename="sample_audio.mp3"', self.upload_bodies[0])
+
+
+class TestValidation(unittest.TestCase, TestBaseClass):
+    def setUp(self):
+        super().init()
+        super().set_tokens()
+        self.addCleanup(self.responses.stop)
+        self.addCleanup(self.responses.reset)
+        self.test_room_id = "52b0e129-2512-4696-9d06-8ddb842ba6ce"
+        self.posted = []
+
+        def post_callback(request):
+            self.posted.append(request.url)
+            return 200, {}, json.dumps(self.make_msg(1))
+
+        for path in ["messages/audio", "messages/image", "motions"]:
+            self.responses.add_callback(
+                responses.POST,
+                f"{self.test_endpoint}/v1/rooms/{self.test_room_id}/{path}",
+                callback=post_callback,
+                content_type="application/json",
+            )
+        with open(f"{EMO_PLATFORM_TEST_PATH}/../assets/sample_motion.json") as f:
+            self.motion = json.load(f)
+
+    def test_media(self):
+        room = Client(self.test_endpoint).create_room_client(self.test_room_id)
+        with self.assertRaises(ValidationError):
+            room.send_audio_msg(b"ID3" + bytes(1024 * 1024))
+        with self.assertRaises(ValidationError):
+            room.send_image(io.BytesIO(b"GIF89a"))
+        with self.assertRaises(ValidationError):
+            room.send_image(f"{EMO_PLATFORM_TEST_PATH}/../assets/sample_audio.mp3")
+        self.assertEqual(self.posted, [])
+        room.send_image(f"{EMO_PLATFORM_TEST_PATH}/../assets/sample_image.jpg")
+        self.assertEqual(len(self.posted), 1)
+
+    def test_motion(self):
+        room = Client(self.test_endpoint).create_room_client(self.test_room_id)
+        room.send_original_motion(self.motion)
+        invalid_motions = [
+            {},
+            {"tail": self.motion["head"]},
+            {"head": [{"duration": 0, "p0": [None, None]}]},
+            {"antenna": [{"duration": 100, "start": {"amp": "1"}, "end": {}}]},
+            {"led_play": [{"duration": 100, "start": [0, 0, 0], "end": [0, 0, 0, 0]}]},
+        ]
+        for motion in invalid_motions:
+            with self.assertRaises(ValidationError):
+                room.send_original_motion(motion)
+        self.assertEqual(len(self.posted), 1)
+
+    def test_motion_template(self):
+        room = Client(self.test_endpoint).create_room_client(self.test_room_id)
+        # the template in examples/send_data_to_room.py
+        room.send_original_motion(
+            {
+                "head": [],
+                "antenna": [],
+                "led_cheek_l": [],
+                "led_cheek_r": [],
+                "led_play": [],
+                "led_rec": [],
+                "led_func": [],
+            }
+        )
+        # the keys other than duration are optional
+        room.send_original_motion({"head": [{"duration": 1000, "p3": [20, 0]}]})
+        self.assertEqual(len(self.posted), 2)
+
+    def test_text(self):
+        client = BizAdvancedClient(self.test_endpoint)
+        room = client.create_room_client("api_key", self.test_room_id)
+        for text in ["", "a" * 251]:
+            with self.assertRaises(ValidationError):
+                room.create_conversation_text("session_id", text, True)
+
+    def test_disabled(self):
+        client = Client(self.test_endpoint, validate=False)
+        room = client.create_room_client(self.test_room_id)
+        room.send_image(io.BytesIO(b"GIF89a"))
+        room.send_original_motion({"tail": []})
+        self.assertEqual(len(self.posted), 2)
+
+
+class TestMotionRegistry(unittest.TestCase, TestBaseClass):
+    def setUp(self):
+        super().init()
+        super().set_tokens()
+        self.addCleanup(self.responses.stop)
+        self.addCleanup(self.responses.reset)
+        self.test_room_id = "52b0e129-2512-4696-9d06-8ddb842ba6ce"
+        self.responses.add(
+            responses.POST,
+            f"{self.test_endpoint}/v1/rooms/{self.test_room_id}/motions",
+            json=self.make_msg(1),
+        )
+        with open(f"{EMO_PLATFORM_TEST_PATH}/../assets/sample_motion.json") as f:
+            self.motion = json.load(f)
+
+    def test_motion_registry(self):
+        registry = MotionRegistry()
+        client = Client(self.test_endpoint, motion_registry=registry)
+        room = client.create_room_client(self.test_room_id)
+        with tempfile.TemporaryDirectory() as directory:
+            motion_path = os.path.join(directory, "motion.json")
+            with open(motion_path, "w") as f:
+                json.dump(self.motion, f)
+            with mock.patch(
+                "emo_platform.motion._load_json", side_effect=_load_json
+            ) as load_json:
+                for _ in range(3):
+                    room.send_original_motion(motion_path)
+                self.assertEqual(load_json.call_count, 1)
+                self.assertEqual(len(registry), 1)
+
+                # the modified file is loaded again
+                with open(motion_path, "w") as f:
+                    json.dump({"head": self.motion["head"]}, f)
+                os.utime(motion_path, ns=(0, 0))
+                room.send_original_motion(motion_path)
+                self.assertEqual(load_json.call_count, 2)
+
+                with open(motion_path, "w") as f:
+                    json.dump({"tail": []}, f)
+                os.utime(motion_path, ns=(1, 1))
+                with self.assertRaises(ValidationError):
+                    room.send_original_motion(motion_path)
+        self.assertEqual(
+            [json.loads(call.request.body) for call in self.responses.calls[-2:]],
+            [self.motion, {"head": self.motion["head"]}],
+        )
+
+    def test_validate_disabled(self):
+        registry = MotionRegistry()
+        with tempfile.TemporaryDirectory() as directory:
+            motion_path = os.path.join(directory, "motion.json")
+            with open(motion_path, "w") as f:
+                json.dump({"tail": []}, f)
+            # validate=False of the client applies to the registry too
+            client = Client(
+                self.test_endpoint, validate=False, motion_registry=registry
+            )
+            client.create_room_client(self.test_room_id).send_original_motion(
+                motion_path
+            )
+            self.assertEqual(len(self.responses.calls), 1)
+
+            # the motion loaded without validation is validated for the other client
+            client = Client(self.test_endpoint, motion_registry=registry)
+            with self.assertRaises(ValidationError):
+                client.create_room_client(self.test_room_id).send_original_motion(
+                    motion_path
+                )
+            self.assertEqual(len(self.responses.calls), 1)
+
+
+class TestMotionTimeline(unittest.TestCase, TestBaseClass):
+    def setUp(self):
+        super().init()
+        super().set_tokens()
+        self.addCleanup(self.responses.stop)
+        self.addCleanup(self.responses.reset)
+        self.test_room_id = "52b0e129-2512-4696-9d06-8ddb842ba6ce"
+        self.responses.add(
+            responses.POST,
+            f"{self.test_endpoint}/v1/rooms/{self.test_room_id}/motions",
+            json=self.make_msg(1),
+        )
+
+    def test_motion_timeline(self):
+        timeline = (
+            MotionTimeline()
+            .add(0, 1000, Color(255, 0, 0))
+            .add(500, 1000, Head(angle=30))
+            .add(1500, 500, Color(0, 0, 255), track="led_cheek_l")
+        )
+        with self.assertRaises(ValueError):
+            timeline.add(1000, 500, Head(angle=-30))
+        self.assertEqual(timeline.duration, 2000)
+
+        room = Client(self.test_endpoint).create_room_client(self.test_room_id)
+        room.send_original_motion(timeline.compile())
+        motion = json.loads(self.responses.calls[-1].request.body)
+        self.assertEqual(list(motion), ["head", "led_cheek_l", "led_cheek_r"])
+        # the head keeps its position until the step starts
+        self.assertEqual([k["duration"] for k in motion["head"]], [500, 1000])
+        self.assertEqual(motion["head"][1]["p3"], [30, 0])
+        self.assertEqual(
+            [(k["start"], k["end"]) for k in motion["led_cheek_l"]],
+            [
+                ([0, 0, 0, 255], [255, 0, 0, 255]),
+                ([255, 0, 0, 255], [255, 0, 0, 255]),
+                ([255, 0, 0, 255], [0, 0, 255, 255]),
+            ],
+        )
+        self.assertEqual(len(motion["led_cheek_r"]), 1)
+
+
+@unittest.skipUnless(Image, "Pillow is not installed")
+class TestCompressImage(unittest.TestCase, TestBaseClass):
+    def setUp(self):
+        super().init()
+        super().set_tokens()
+        self.addCleanup(self.responses.stop)
+        self.addCleanup(self.responses.reset)
+        self.test_room_id = "52b0e129-2512-4696-9d06-8ddb842ba6ce"
+        self.upload_bodies = []
+
+        def image_callback(request):
+            self.upload_bodies.append(request.body)
+            return 200, {}, json.dumps(self.make_msg(1, media="image"))
+
+        self.responses.add_callback(
+            responses.POST,
+            self.test_endpoint + "/v1/rooms/" + self.test_room_id + "/messages/image",
+            callback=image_callback,
+            content_type="application/json",
+        )
+
+    def make_image(self, image_format, size):
+        # random noise is hardly compressed
+        image = Image.frombytes("RGB", size, os.urandom(size[0] * size[1] * 3))
+        output = io.BytesIO()
+        image.save(output, image_format, quality=95)
+        return output.getvalue()
+
+    def uploaded_image(self):
+        body = self.upload_bodies[-1]
+        data = body[body.index(b"\r\n\r\n") + 4 : body.rindex(b"\r\n--")]
+        self.assertLessEqual(len(data), 1024 * 1024)
+        return Image.open(io.BytesIO(data))
+
+    def test_compress(self):
+        room = Client(self.test_endpoint).create_room_client(self.test_room_id)
+        for image_format, size in [("JPEG", (1200, 900)), ("PNG", (800, 600))]:
+            data = self.make_image(image_format, size)
+            self.assertGreater(len(data), 1024 * 1024)
+            with self.assertRaises(ValidationError):
+                room.send_image(data)
+            room.send_image(data, compress=True)
+            image = self.uploaded_image()
+            self.assertEqual(image.format, image_format)
+            # the aspect ratio is kept
+            self.assertAlmostEqual(image.width / image.height, 4 / 3, places=2)
+
+    def test_small_image(self):
+        room = Client(self.test_endpoint).create_room_client(self.test_room_id)
+        data = self.make_image("JPEG", (100, 100))
+        room.send_image(data, compress=True)
+        self.assertIn(data, self.upload_bodies[0])
+
+
+class TestDownloadMedia(unittest.TestCase, TestBaseClass):
+    def setUp(self):
+        super().init()
+        super().set_tokens()
+        self.addCleanup(self.responses.stop)
+        self.addCleanup(self.responses.reset)
+        self.media_url = "https://media.test_api.com"
+        self.audio_body = b"audio" * 100000
+        for name in ["a.mp3", "b.mp3"]:
+            self.responses.add(
+                responses.GET, f"{self.media_url}/{name}", body=self.audio_body
+            )
+        self.responses.add(responses.GET, f"{self.media_url}/c.jpg", body=b"image")
+        self.responses.add(responses.GET, f"{self.media_url}/none.jpg", status=404)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def media_requests(self):
+        return [
+            call.request.url
+            for call in self.responses.calls
+            if call.request.url.startswith(self.media_url)
+        ]
+
+    def test_download(self):
+        client = Client(self.test_endpoint)
+        urls = [f"{self.media_url}/{name}" for name in ["a.mp3", "b.mp3", "c.jpg"]]
+        paths = client.download_media(urls + urls[:1], self.directory, max_workers=2)
+        self.assertEqual(list(paths), urls)
+        self.assertEqual(len(self.media_requests()), 3)
+        # the same content is saved only once
+        self.assertEqual(paths[urls[0]], paths[urls[1]])
+        self.assertTrue(paths[urls[2]].endswith(".jpg"))
+        with open(paths[urls[0]], "rb") as f:
+            self.assertEqual(f.read(), self.audio_body)
+
+        # the cached files are not downloaded again
+        self.assertEqual(client.download_media(urls, self.directory), paths)
+        self.assertEqual(len(self.media_requests()), 3)
+
+    def test_download_error(self):
+        client = Client(self.test_endpoint)
+        with self.assertRaises(NotFoundError):
+            client.download_media([f"{self.media_url}/none.jpg"], self.directory)
+        # the partial file is removed
+        self.assertEqual(os.listdir(self.directory), ["urls"])
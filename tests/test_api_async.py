@@ -1,16 +1,42 @@
 import asyncio
+import io
 import json
 import os
+import tempfile
+import threading
+import time
 import unittest
 from functools import partial
+from unittest import mock
 
 import responses
-from aiohttp import ClientSession, web
+from aiohttp import ClientConnectionError, ClientSession, web
 
 from emo_platform import AsyncClient as Client
-from emo_platform.exceptions import NoRoomError, TokenError, UnauthorizedError
+from emo_platform import (
+    CircuitBreaker,
+    MessageArchive,
+    MotionRegistry,
+    RateLimiter,
+    ResponseCache,
+    RetryPolicy,
+)
+from emo_platform.exceptions import (
+    CircuitOpenError,
+    DeadlineExceededError,
+    NoRoomError,
+    NotFoundError,
+    TokenError,
+    UnauthorizedError,
+    UnknownError,
+)
 from emo_platform.models import Tokens
 
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
 EMO_PLATFORM_TEST_PATH = os.path.abspath(os.path.dirname(__file__))
 TOKEN_FILE = f"{EMO_PLATFORM_TEST_PATH}/../emo_platform/tokens/emo-platform-api.json"
 PRE_TOKEN_FILE = (
@@ -151,6 +177,38 @@ class TestBaseClass(object):
     async def aiohttp_server_stop(self):
         await self.site.stop()
 
+    def init_msgs_server(self, sequences, page_size=3):
+        self.test_room_id = "52b0e129-2512-4696-9d06-8ddb842ba6ce"
+        self.test_sequences = sequences
+        self.msgs_requests = []
+
+        @self.routes.get("/v1/rooms/" + self.test_room_id + "/messages")
+        async def msgs_callback(request):
+            before = request.query.get("before")
+            self.msgs_requests.append(before)
+            sequences = sorted(self.test_sequences, reverse=True)
+            if before is not None:
+                sequences = [seq for seq in sequences if seq < int(before)]
+            messages = [self.make_msg(seq) for seq in sequences[:page_size]]
+            return web.json_response({"messages": messages})
+
+    def make_msg(self, sequence, media="text"):
+        return {
+            "sequence": sequence,
+            "unique_id": f"msg_{sequence}",
+            "user": {
+                "uuid": "user_uuid",
+                "user_type": "emo",
+                "nickname": "BOCCO emo",
+                "profile_image": "",
+            },
+            "message": {"ja": f"message {sequence}"},
+            "media": media,
+            "audio_url": "",
+            "image_url": "",
+            "lang": "ja",
+        }
+
     def set_tokens(self):
         os.environ["EMO_PLATFORM_API_REFRESH_TOKEN"] = self.right_refresh_token
         os.environ["EMO_PLATFORM_API_ACCESS_TOKEN"] = self.right_access_token
@@ -300,6 +358,17 @@ class TestGetTokens(unittest.IsolatedAsyncioTestCase, TestBaseClass):
         with self.assertRaises(TokenError):
             client = Client(self.test_endpoint, use_cached_credentials=True)
 
+    async def test_lazy_load_tokens(self):
+        os.environ["EMO_PLATFORM_API_ACCESS_TOKEN"] = self.wrong_access_token
+        os.environ["EMO_PLATFORM_API_REFRESH_TOKEN"] = self.right_refresh_token
+        client = Client(self.test_endpoint)
+        self.assertFalse(os.path.exists(TOKEN_FILE))
+        self.assertFalse(os.path.exists(PRE_TOKEN_FILE))
+
+        self.assertEqual(await client.get_account_info(), self.test_account_info)
+        with open(TOKEN_FILE) as f:
+            self.assertEqual(json.load(f)["access_token"], self.right_access_token)
+
 class TestCheckHttpError(unittest.IsolatedAsyncioTestCase, TestBaseClass):
     async def asyncSetUp(self):
         self.init_server()
@@ -345,16 +414,46 @@ class TestCheckHttpError(unittest.IsolatedAsyncioTestCase, TestBaseClass):
         os.environ["EMO_PLATFORM_API_REFRESH_TOKEN"] = self.right_refresh_token
         os.environ["EMO_PLATFORM_API_ACCESS_TOKEN"] = self.wrong_access_token
 
-        client = Client(self.test_endpoint)
-        async with ClientSession() as session:
-            request = partial(
-                session.get, self.test_endpoint + "/v1/me", headers=client._client._headers
-            )
+        async with Client(self.test_endpoint) as client:
+            request = partial(client._request, "GET", "/v1/me")
             self.assertEqual(
                 await client._check_http_error(request=request), self.test_account_info
             )
 
 
+class TestRefreshTokens(unittest.IsolatedAsyncioTestCase, TestBaseClass):
+    async def asyncSetUp(self):
+        self.init_server()
+        await self.aiohttp_server_start()
+        self.reset_tokens()
+
+        self.addCleanup(self.responses.stop)
+        self.addCleanup(self.responses.reset)
+
+    async def asyncTearDown(self):
+        await self.aiohttp_server_stop()
+
+    async def test_single_flight_refresh(self):
+        os.environ["EMO_PLATFORM_API_ACCESS_TOKEN"] = self.wrong_access_token
+        os.environ["EMO_PLATFORM_API_REFRESH_TOKEN"] = self.right_refresh_token
+        async with Client(self.test_endpoint) as client:
+            update_tokens = client._update_tokens
+            refresh_count = 0
+
+            async def count_update_tokens():
+                nonlocal refresh_count
+                refresh_count += 1
+                await update_tokens()
+
+            client._update_tokens = count_update_tokens
+            results = await asyncio.gather(
+                *[client.get_account_info() for _ in range(10)]
+            )
+
+        self.assertEqual(results, [self.test_account_info] * 10)
+        self.assertEqual(refresh_count, 1)
+
+
 class TestGetRoomsId(unittest.IsolatedAsyncioTestCase, TestBaseClass):
     async def asyncSetUp(self):
         self.init_server()
@@ -383,6 +482,657 @@ class TestGetRoomsId(unittest.IsolatedAsyncioTestCase, TestBaseClass):
             await client.get_rooms_id()
 
 
+class TestSession(unittest.IsolatedAsyncioTestCase, TestBaseClass):
+    async def asyncSetUp(self):
+        self.init_server()
+        await self.aiohttp_server_start()
+
+        self.reset_tokens()
+        self.set_tokens()
+
+        self.addCleanup(self.responses.stop)
+        self.addCleanup(self.responses.reset)
+
+    async def asyncTearDown(self):
+        await self.aiohttp_server_stop()
+
+    async def test_reuse_session(self):
+        async with Client(self.test_endpoint, connection_limit_per_host=5) as client:
+            self.assertEqual(await client.get_account_info(), self.test_account_info)
+            session = client._session
+            self.assertEqual(session.connector.limit_per_host, 5)
+            self.assertEqual(await client.get_account_info(), self.test_account_info)
+            self.assertIs(client._session, session)
+        self.assertTrue(session.closed)
+        self.assertIsNone(client._session)
+
+    async def test_new_event_loop(self):
+        client = Client(self.test_endpoint)
+
+        def run_twice():
+            # e.g. a module level client used by asyncio.run twice
+            results = [asyncio.run(client.get_account_info()) for _ in range(2)]
+            asyncio.run(client.close())
+            return results
+
+        # The test server keeps running on this event loop meanwhile.
+        results = await asyncio.get_event_loop().run_in_executor(None, run_twice)
+        self.assertEqual(results, [self.test_account_info] * 2)
+        self.assertIsNone(client._session)
+
+
+class TestRateLimiter(unittest.IsolatedAsyncioTestCase, TestBaseClass):
+    async def asyncSetUp(self):
+        self.init_server()
+        await self.aiohttp_server_start()
+
+        self.reset_tokens()
+        self.set_tokens()
+
+        self.addCleanup(self.responses.stop)
+        self.addCleanup(self.responses.reset)
+
+    async def asyncTearDown(self):
+        await self.aiohttp_server_stop()
+
+    async def test_throttle_requests(self):
+        rate_limiter = RateLimiter(requests_per_minute=600, burst=1)
+        async with Client(self.test_endpoint, rate_limiter=rate_limiter) as client:
+            start = time.monotonic()
+            results = await asyncio.gather(
+                *[client._get("/v1/me", params={"n": str(i)}) for i in range(3)]
+            )
+            self.assertGreaterEqual(time.monotonic() - start, 0.18)
+        self.assertEqual(results, [self.test_account_info] * 3)
+
+
+class TestResponseCache(unittest.IsolatedAsyncioTestCase, TestBaseClass):
+    async def asyncSetUp(self):
+        self.init_server()
+        await self.aiohttp_server_start()
+
+        self.reset_tokens()
+        self.set_tokens()
+
+        self.addCleanup(self.responses.stop)
+        self.addCleanup(self.responses.reset)
+
+    async def asyncTearDown(self):
+        await self.aiohttp_server_stop()
+
+    async def test_response_cache(self):
+        async with Client(self.test_endpoint, response_cache=ResponseCache()) as client:
+            with mock.patch.object(
+                client, "_request", wraps=client._request
+            ) as request:
+                for _ in range(3):
+                    self.assertEqual(
+                        await client.get_account_info(), self.test_account_info
+                    )
+                self.assertEqual(request.call_count, 1)
+
+
+class TestRetryPolicy(unittest.IsolatedAsyncioTestCase, TestBaseClass):
+    async def asyncSetUp(self):
+        self.init_server()
+        self.stamps_statuses = [503, 429]
+        self.broadcast_statuses = [500]
+
+        @self.routes.get("/v1/stamps")
+        async def stamps_callback(request):
+            if self.stamps_statuses:
+                return web.Response(
+                    status=self.stamps_statuses.pop(0), headers={"Retry-After": "0"}
+                )
+            return web.json_response({"stamps": []})
+
+        @self.routes.post("/v1/broadcast_messages")
+        async def broadcast_callback(request):
+            if self.broadcast_statuses:
+                return web.Response(status=self.broadcast_statuses.pop(0))
+            return web.json_response({})
+
+        await self.aiohttp_server_start()
+
+        self.reset_tokens()
+        self.set_tokens()
+
+        self.addCleanup(self.responses.stop)
+        self.addCleanup(self.responses.reset)
+
+    async def asyncTearDown(self):
+        await self.aiohttp_server_stop()
+
+    async def test_retry_get(self):
+        retry_policy = RetryPolicy(backoff_factor=0)
+        async with Client(self.test_endpoint, retry_policy=retry_policy) as client:
+            self.assertEqual(await client._get("/v1/stamps"), {"stamps": []})
+        self.assertEqual(self.stamps_statuses, [])
+
+    async def test_no_retry_post(self):
+        retry_policy = RetryPolicy(backoff_factor=0)
+        async with Client(self.test_endpoint, retry_policy=retry_policy) as client:
+            with self.assertRaises(UnknownError):
+                await client._post("/v1/broadcast_messages")
+
+
+class TestTimeout(unittest.IsolatedAsyncioTestCase, TestBaseClass):
+    async def asyncSetUp(self):
+        self.init_server()
+
+        @self.routes.get("/v1/stamps")
+        async def stamps_callback(request):
+            await asyncio.sleep(1)
+            return web.json_response({"stamps": []})
+
+        await self.aiohttp_server_start()
+
+        self.reset_tokens()
+        self.set_tokens()
+
+        self.addCleanup(self.responses.stop)
+        self.addCleanup(self.responses.reset)
+
+    async def asyncTearDown(self):
+        await self.aiohttp_server_stop()
+
+    async def test_deadline(self):
+        async with Client(self.test_endpoint) as client:
+            start = time.monotonic()
+            with self.assertRaises(DeadlineExceededError):
+                with client.deadline(0.2):
+                    await client._get("/v1/stamps")
+            self.assertLess(time.monotonic() - start, 0.5)
+
+    async def test_read_timeout(self):
+        retry_policy = RetryPolicy(max_attempts=1)
+        async with Client(
+            self.test_endpoint, read_timeout=0.2, retry_policy=retry_policy
+        ) as client:
+            with self.assertRaises(asyncio.TimeoutError):
+                await client._get("/v1/stamps")
+
+
+class TestCircuitBreaker(unittest.IsolatedAsyncioTestCase, TestBaseClass):
+    async def asyncSetUp(self):
+        self.init_server()
+        self.reset_tokens()
+        self.set_tokens()
+
+        self.addCleanup(self.responses.stop)
+        self.addCleanup(self.responses.reset)
+
+    async def test_open_on_connection_error(self):
+        circuit_breaker = CircuitBreaker(failure_threshold=1)
+        # no server is running on this endpoint
+        async with Client(
+            self.test_endpoint,
+            retry_policy=RetryPolicy(max_attempts=1),
+            circuit_breaker=circuit_breaker,
+        ) as client:
+            with self.assertRaises(ClientConnectionError):
+                await client._get("/v1/stamps")
+            with self.assertRaises(CircuitOpenError):
+                await client._get("/v1/stamps")
+
+    async def test_open_before_rate_limit(self):
+        circuit_breaker = CircuitBreaker(failure_threshold=1)
+        circuit_breaker._record_failure()
+        rate_limiter = RateLimiter(requests_per_minute=1, burst=1)
+        async with Client(
+            self.test_endpoint,
+            rate_limiter=rate_limiter,
+            circuit_breaker=circuit_breaker,
+        ) as client:
+            start = time.monotonic()
+            for _ in range(3):
+                with self.assertRaises(CircuitOpenError):
+                    await client._get("/v1/stamps")
+            self.assertLess(time.monotonic() - start, 1)
+        # the rejected calls have not used the rate limit
+        self.assertTrue(await rate_limiter.async_acquire(None, 0))
+
+
+class TestConditionalGet(unittest.IsolatedAsyncioTestCase, TestBaseClass):
+    async def asyncSetUp(self):
+        self.init_server()
+        self.etag = '"stamps_v1"'
+        self.if_none_match = []
+
+        @self.routes.get("/v1/stamps")
+        async def stamps_callback(request):
+            self.if_none_match.append(request.headers.get("If-None-Match"))
+            if request.headers.get("If-None-Match") == self.etag:
+                return web.Response(status=304, headers={"ETag": self.etag})
+            body = {"listing": {"offset": 0, "limit": 0, "total": 0}, "stamps": []}
+            return web.json_response(body, headers={"ETag": self.etag})
+
+        await self.aiohttp_server_start()
+
+        self.reset_tokens()
+        self.set_tokens()
+
+        self.addCleanup(self.responses.stop)
+        self.addCleanup(self.responses.reset)
+
+    async def asyncTearDown(self):
+        await self.aiohttp_server_stop()
+
+    async def test_not_modified(self):
+        async with Client(self.test_endpoint) as client:
+            stamps_info = await client.get_stamps_list()
+            self.assertIs(await client.get_stamps_list(), stamps_info)
+        self.assertEqual(self.if_none_match, [None, self.etag])
+
+
+class TestCoalesceRequests(unittest.IsolatedAsyncioTestCase, TestBaseClass):
+    async def asyncSetUp(self):
+        self.init_server()
+        self.stamps_requests = 0
+
+        @self.routes.get("/v1/stamps")
+        async def stamps_callback(request):
+            self.stamps_requests += 1
+            await asyncio.sleep(0.1)
+            body = {"listing": {"offset": 0, "limit": 0, "total": 0}, "stamps": []}
+            return web.json_response(body)
+
+        await self.aiohttp_server_start()
+
+        self.reset_tokens()
+        self.set_tokens()
+
+        self.addCleanup(self.responses.stop)
+        self.addCleanup(self.responses.reset)
+
+    async def asyncTearDown(self):
+        await self.aiohttp_server_stop()
+
+    async def test_coalesce(self):
+        async with Client(self.test_endpoint) as client:
+            results = await asyncio.gather(
+                *[client.get_stamps_list() for _ in range(5)]
+            )
+        self.assertEqual(self.stamps_requests, 1)
+        self.assertTrue(all(result is results[0] for result in results))
+
+    async def test_follower_without_deadline(self):
+        async def get_stamps_list_with_deadline():
+            with client.deadline(0.05):
+                return await client.get_stamps_list()
+
+        async with Client(self.test_endpoint) as client:
+            results = await asyncio.gather(
+                get_stamps_list_with_deadline(),
+                client.get_stamps_list(),
+                return_exceptions=True,
+            )
+        self.assertIsInstance(results[0], DeadlineExceededError)
+        self.assertEqual(results[1].stamps, [])
+        self.assertEqual(self.stamps_requests, 1)
+
+
+class TestIterMsgs(unittest.IsolatedAsyncioTestCase, TestBaseClass):
+    async def asyncSetUp(self):
+        self.init_server()
+        self.init_msgs_server(list(range(1, 11)))
+        await self.aiohttp_server_start()
+
+        self.reset_tokens()
+        self.set_tokens()
+
+        self.addCleanup(self.responses.stop)
+        self.addCleanup(self.responses.reset)
+
+    async def asyncTearDown(self):
+        await self.aiohttp_server_stop()
+
+    async def test_iter_msgs(self):
+        async with Client(self.test_endpoint) as client:
+            room = client.create_room_client(self.test_room_id)
+            sequences = [msg.sequence async for msg in room.iter_msgs(until=10)]
+        self.assertEqual(sequences, list(range(9, 0, -1)))
+        self.assertEqual(self.msgs_requests, ["10", "7", "4", "1"])
+
+    async def test_stop_early(self):
+        async with Client(self.test_endpoint) as client:
+            room = client.create_room_client(self.test_room_id)
+            msgs = room.iter_msgs()
+            async for msg in msgs:
+                break
+            await msgs.aclose()
+        self.assertEqual(msg.sequence, 10)
+        self.assertLessEqual(len(self.msgs_requests), 2)
+
+    async def test_tail_msgs(self):
+        async with Client(self.test_endpoint) as client:
+            room = client.create_room_client(self.test_room_id)
+            msgs = room.tail_msgs(after=3, min_interval=0.01, max_interval=0.02)
+            sequences = [(await msgs.__anext__()).sequence for _ in range(7)]
+            self.assertEqual(sequences, list(range(4, 11)))
+            self.test_sequences.append(11)
+            self.assertEqual((await msgs.__anext__()).sequence, 11)
+            await msgs.aclose()
+
+
+class TestMessageArchive(unittest.IsolatedAsyncioTestCase, TestBaseClass):
+    async def asyncSetUp(self):
+        self.init_server()
+        self.init_msgs_server(list(range(1, 11)))
+        await self.aiohttp_server_start()
+
+        self.reset_tokens()
+        self.set_tokens()
+
+        self.addCleanup(self.responses.stop)
+        self.addCleanup(self.responses.reset)
+
+    async def asyncTearDown(self):
+        await self.aiohttp_server_stop()
+
+    async def test_sync(self):
+        async with Client(self.test_endpoint) as client:
+            room = client.create_room_client(self.test_room_id)
+            with MessageArchive(":memory:") as archive:
+                self.assertEqual(await archive.async_sync(room), 10)
+                self.test_sequences.append(11)
+                self.msgs_requests.clear()
+                self.assertEqual(await archive.async_sync(room), 1)
+                self.assertEqual(self.msgs_requests, [None])
+                self.assertEqual(archive.latest_sequence(self.test_room_id), 11)
+
+    async def test_db_in_thread(self):
+        thread_ids = []
+
+        def recording(method):
+            def wrapper(*args):
+                thread_ids.append(threading.get_ident())
+                return method(*args)
+
+            return wrapper
+
+        async with Client(self.test_endpoint) as client:
+            room = client.create_room_client(self.test_room_id)
+            with MessageArchive(":memory:") as archive:
+                with mock.patch.object(
+                    archive, "_since", recording(archive._since)
+                ), mock.patch.object(archive, "store", recording(archive.store)):
+                    self.assertEqual(await archive.async_sync(room), 10)
+        self.assertEqual(len(thread_ids), 2)
+        self.assertNotIn(threading.get_ident(), thread_ids)
+
+
+class TestUploadMedia(unittest.IsolatedAsyncioTestCase, TestBaseClass):
+    async def asyncSetUp(self):
+        self.init_server()
+        self.test_room_id = "52b0e129-2512-4696-9d06-8ddb842ba6ce"
+        self.audio_body = b"ID3" + b"audio" * 100
+        self.uploads = []
+        self.rejected_uploads = 0
+
+        @self.routes.post("/v1/rooms/" + self.test_room_id + "/messages/audio")
+        async def audio_callback(request):
+            self.uploads.append(await request.read())
+            if self.rejected_uploads > 0:
+                self.rejected_uploads -= 1
+                return web.json_response({}, status=401)
+            return web.json_response(self.make_msg(1, media="audio"))
+
+        @self.routes.post("/v1/rooms/" + self.test_room_id + "/motions")
+        async def motion_callback(request):
+            self.uploads.append(await request.read())
+            return web.json_response(self.make_msg(2, media="motion"))
+
+        await self.aiohttp_server_start()
+        self.reset_tokens()
+        self.set_tokens()
+        self.addCleanup(self.responses.stop)
+        self.addCleanup(self.responses.reset)
+
+    async def asyncTearDown(self):
+        await self.aiohttp_server_stop()
+
+    async def test_upload(self):
+        async with Client(self.test_endpoint) as client:
+            room = client.create_room_client(self.test_room_id)
+            await room.send_audio_msg(memoryview(self.audio_body))
+            await room.send_audio_msg(io.BytesIO(self.audio_body))
+        self.assertEqual(len(self.uploads), 2)
+        for body in self.uploads:
+            self.assertIn(b'filename="audio.mp3"', body)
+            self.assertIn(self.audio_body, body)
+
+    async def test_replay_upload(self):
+        audio_path = f"{EMO_PLATFORM_TEST_PATH}/../assets/sample_audio.mp3"
+        with open(audio_path, "rb") as f:
+            audio_file_body = f.read()
+        async with Client(self.test_endpoint) as client:
+            room = client.create_room_client(self.test_room_id)
+            for audio_data, body in [
+                (self.audio_body, self.audio_body),
+                (io.BytesIO(self.audio_body), self.audio_body),
+                (audio_path, audio_file_body),
+            ]:
+                # 401 and then 200 after refreshing the access token
+                self.uploads.clear()
+                self.rejected_uploads = 1
+                await room.send_audio_msg(audio_data)
+                self.assertEqual(len(self.uploads), 2)
+                for upload in self.uploads:
+                    self.assertIn(body, upload)
+
+    async def test_read_file_in_thread(self):
+        thread_ids = []
+
+        def recording_open(*args, **kwargs):
+            thread_ids.append(threading.get_ident())
+            return open(*args, **kwargs)
+
+        assets_path = f"{EMO_PLATFORM_TEST_PATH}/../assets"
+        with mock.patch("emo_platform.upload.open", recording_open, create=True):
+            async with Client(self.test_endpoint) as client:
+                room = client.create_room_client(self.test_room_id)
+                await room.send_audio_msg(f"{assets_path}/sample_audio.mp3")
+                await room.send_original_motion(f"{assets_path}/sample_motion.json")
+        self.assertEqual(len(thread_ids), 2)
+        self.assertNotIn(threading.get_ident(), thread_ids)
+        self.assertIn(b'filename="sample_audio.mp3"', self.uploads[0])
+        with open(f"{assets_path}/sample_motion.json") as f:
+            self.assertEqual(json.loads(self.uploads[1]), json.load(f))
+
+
+@unittest.skipUnless(Image, "Pillow is not installed")
+class TestCompressImage(unittest.IsolatedAsyncioTestCase, TestBaseClass):
+    async def asyncSetUp(self):
+        self.init_server()
+        self.test_room_id = "52b0e129-2512-4696-9d06-8ddb842ba6ce"
+        self.uploads = []
+
+        @self.routes.post("/v1/rooms/" + self.test_room_id + "/messages/image")
+        async def image_callback(request):
+            self.uploads.append(await request.read())
+            return web.json_response(self.make_msg(1, media="image"))
+
+        await self.aiohttp_server_start()
+        self.reset_tokens()
+        self.set_tokens()
+        self.addCleanup(self.responses.stop)
+        self.addCleanup(self.responses.reset)
+
+    async def asyncTearDown(self):
+        await self.aiohttp_server_stop()
+
+    async def test_compress_image(self):
+        image = Image.frombytes("RGB", (1200, 900), os.urandom(1200 * 900 * 3))
+        output = io.BytesIO()
+        image.save(output, "JPEG", quality=95)
+        async with Client(self.test_endpoint) as client:
+            room = client.create_room_client(self.test_room_id)
+            await room.send_image(output, compress=True)
+        self.assertLess(len(self.uploads[0]), 1024 * 1024 + 1024)
+
+
+class TestMotionRegistry(unittest.IsolatedAsyncioTestCase, TestBaseClass):
+    async def asyncSetUp(self):
+        self.init_server()
+        self.test_room_id = "52b0e129-2512-4696-9d06-8ddb842ba6ce"
+        self.uploads = []
+
+        @self.routes.post("/v1/rooms/" + self.test_room_id + "/motions")
+        async def motion_callback(request):
+            self.uploads.append(await request.read())
+            return web.json_response(self.make_msg(2, media="motion"))
+
+        await self.aiohttp_server_start()
+        self.reset_tokens()
+        self.set_tokens()
+        self.addCleanup(self.responses.stop)
+        self.addCleanup(self.responses.reset)
+
+    async def asyncTearDown(self):
+        await self.aiohttp_server_stop()
+
+    async def test_motion_registry(self):
+        registry = MotionRegistry()
+        motion_path = f"{EMO_PLATFORM_TEST_PATH}/../assets/sample_motion.json"
+        async with Client(self.test_endpoint, motion_registry=registry) as client:
+            room = client.create_room_client(self.test_room_id)
+            await room.send_original_motion(motion_path)
+            await room.send_original_motion(motion_path)
+        self.assertEqual(len(registry), 1)
+        self.assertEqual(self.uploads[0], self.uploads[1])
+
+
+class TestDownloadMedia(unittest.IsolatedAsyncioTestCase, TestBaseClass):
+    async def asyncSetUp(self):
+        self.init_server()
+        self.media_requests = []
+        self.audio_body = b"audio" * 100000
+
+        @self.routes.get("/media/{name}")
+        async def media_callback(request):
+            self.media_requests.append(request.match_info["name"])
+            if request.match_info["name"] == "none.jpg":
+                return web.Response(status=404)
+            return web.Response(body=self.audio_body)
+
+        await self.aiohttp_server_start()
+        self.reset_tokens()
+        self.set_tokens()
+        self.addCleanup(self.responses.stop)
+        self.addCleanup(self.responses.reset)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    async def asyncTearDown(self):
+        await self.aiohttp_server_stop()
+
+    async def test_download(self):
+        urls = [self.test_endpoint + "/media/" + name for name in ["a.mp3", "b.mp3"]]
+        async with Client(self.test_endpoint) as client:
+            paths = await client.download_media(urls + urls, self.directory)
+            self.assertEqual(list(paths), urls)
+            self.assertEqual(sorted(self.media_requests), ["a.mp3", "b.mp3"])
+            # the same content is saved only once
+            self.assertEqual(paths[urls[0]], paths[urls[1]])
+            with open(paths[urls[0]], "rb") as f:
+                self.assertEqual(f.read(), self.audio_body)
+
+            # the cached files are not downloaded again
+            self.assertEqual(await client.download_media(urls, self.directory), paths)
+            self.assertEqual(len(self.media_requests), 2)
+
+            with self.assertRaises(NotFoundError):
+                await client.download_media(
+                    [self.test_endpoint + "/media/none.jpg"], self.directory
+                )
+
+    async def test_disk_in_thread(self):
+        thread_ids = {}
+
+        def recording(name, func):
+            def wrapper(*args, **kwargs):
+                thread_ids.setdefault(name, set()).add(threading.get_ident())
+                return func(*args, **kwargs)
+
+            return wrapper
+
+        urls = [self.test_endpoint + "/media/a.mp3"]
+        with mock.patch(
+            "emo_platform.download.open", recording("open", open), create=True
+        ), mock.patch.object(
+            os, "makedirs", recording("makedirs", os.makedirs)
+        ), mock.patch.object(
+            os, "replace", recording("replace", os.replace)
+        ):
+            async with Client(self.test_endpoint) as client:
+                await client.download_media(urls, self.directory)
+                await client.download_media(urls, self.directory)
+        self.assertEqual(set(thread_ids), {"open", "makedirs", "replace"})
+        for ids in thread_ids.values():
+            self.assertNotIn(threading.get_ident(), ids)
+
+
+class TestSendToRooms(unittest.IsolatedAsyncioTestCase, TestBaseClass):
+    async def asyncSetUp(self):
+        self.init_server()
+        self.reset_tokens()
+        self.set_tokens()
+
+        self.addCleanup(self.responses.stop)
+        self.addCleanup(self.responses.reset)
+
+    async def test_send_to_rooms(self):
+        client = Client(self.test_endpoint)
+        running = 0
+        max_running = 0
+
+        async def action(room):
+            nonlocal running, max_running
+            running += 1
+            max_running = max(max_running, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+            if room.room_id == "room_3":
+                raise NoRoomError("no room")
+            return room.room_id
+
+        room_ids = [f"room_{i}" for i in range(10)]
+        results = [
+            room_result
+            async for room_result in client.send_to_rooms(
+                room_ids, action, max_concurrency=3
+            )
+        ]
+        self.assertEqual(max_running, 3)
+        self.assertEqual(sorted(r.room_id for r in results), sorted(room_ids))
+        for room_result in results:
+            if room_result.room_id == "room_3":
+                self.assertFalse(room_result.ok)
+                self.assertIsInstance(room_result.exception, NoRoomError)
+            else:
+                self.assertTrue(room_result.ok)
+                self.assertEqual(room_result.result, room_result.room_id)
+
+    async def test_stop_iteration(self):
+        client = Client(self.test_endpoint)
+        started = []
+
+        async def action(room):
+            started.append(room.room_id)
+            await asyncio.sleep(0.01)
+
+        room_results = client.send_to_rooms(
+            [f"room_{i}" for i in range(10)], action, max_concurrency=2
+        )
+        async for _ in room_results:
+            break
+        await room_results.aclose()
+        await asyncio.sleep(0.05)
+        self.assertLess(len(started), 10)
+
+
 class TestWebhookRegister(unittest.IsolatedAsyncioTestCase, TestBaseClass):
     async def asyncSetUp(self):
         self.init_server()
@@ -402,7 +1152,7 @@ class TestWebhookRegister(unittest.IsolatedAsyncioTestCase, TestBaseClass):
         async def test_webhook_callback():
             return return_val
 
-        self.assertEqual(await client._client._webhook_events_cb["test_event"][""](), return_val)
+        self.assertEqual(await client._webhook_events_cb["test_event"][""](), return_val)
 
         return_val = "test_webhook_callback_new"
 
@@ -410,7 +1160,7 @@ class TestWebhookRegister(unittest.IsolatedAsyncioTestCase, TestBaseClass):
         async def test_webhook_callback_new():
             return return_val
 
-        self.assertEqual(await client._client._webhook_events_cb["test_event"][""](), return_val)
+        self.assertEqual(await client._webhook_events_cb["test_event"][""](), return_val)
 
     async def test_register_event_with_room_id(self):
         client = Client(self.test_endpoint)
@@ -431,9 +1181,9 @@ class TestWebhookRegister(unittest.IsolatedAsyncioTestCase, TestBaseClass):
             return return_val_new
 
         self.assertEqual(
-            await client._client._webhook_events_cb["test_event"][old_room_uuid](), return_val
+            await client._webhook_events_cb["test_event"][old_room_uuid](), return_val
         )
         self.assertEqual(
-            await client._client._webhook_events_cb["test_event"][new_room_uuid](),
+            await client._webhook_events_cb["test_event"][new_room_uuid](),
             return_val_new,
         )